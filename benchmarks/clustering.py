@@ -0,0 +1,106 @@
+"""
+Fits the clustering engine on synthetic Gaussian blobs and reports time and
+peak memory per stage. Each size runs in its own fresh process so peak RSS
+belongs to that size alone.
+
+    python -m benchmarks.clustering --sizes 10000,100000,1000000
+"""
+import argparse
+import json
+import os
+import resource
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+
+import clustering
+from metrics import peak_rss_mb
+
+# Rows generated per chunk, so building the input doesn't dominate peak memory
+CHUNK_ROWS = 50_000
+
+
+def make_blobs(path, n, dim, centers, seed):
+    """Writes an (n, dim) float32 .npy of Gaussian blobs without holding it twice."""
+    rng = np.random.default_rng(seed)
+    means = rng.standard_normal((centers, dim), dtype=np.float32) * 4.0
+    out = np.lib.format.open_memmap(path, mode='w+', dtype=np.float32, shape=(n, dim))
+    for start in range(0, n, CHUNK_ROWS):
+        stop = min(n, start + CHUNK_ROWS)
+        labels = rng.integers(0, centers, stop - start)
+        out[start:stop] = means[labels] + rng.standard_normal((stop - start, dim), dtype=np.float32)
+    out.flush()
+    del out
+
+
+def measure(path, k, k_range, max_workers, seed):
+    """Runs in a fresh process: one fixed-K fit, then K selection."""
+    embeddings = np.load(path, mmap_mode='r')
+    report = {"rows": len(embeddings), "dim": embeddings.shape[1],
+              "input_mb": round(embeddings.nbytes / 2 ** 20, 1)}
+
+    started = time.perf_counter()
+    clustering.fit_kmeans(embeddings, k, seed)
+    report["fit_s"] = round(time.perf_counter() - started, 2)
+    report["fit_peak_rss_mb"] = round(peak_rss_mb(), 1)
+
+    if k_range:
+        started = time.perf_counter()
+        best, scores = clustering.choose_k(embeddings, k_range, max_workers, seed)
+        report["choose_k_s"] = round(time.perf_counter() - started, 2)
+        report["chosen_k"] = best
+        report["silhouette"] = round(scores[best], 3)
+        report["peak_rss_mb"] = round(peak_rss_mb(), 1)
+        report["worker_peak_rss_mb"] = round(peak_rss_mb(resource.RUSAGE_CHILDREN), 1)
+    return report
+
+
+def run_size(workdir, n, args):
+    path = os.path.join(workdir, f"blobs_{n}.npy")
+    make_blobs(path, n, args.dim, args.centers, args.seed)
+    try:
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+            return executor.submit(measure, path, args.k, args.k_range, args.workers, args.seed).result()
+    finally:
+        os.remove(path)
+
+
+def print_row(r):
+    print(f"{r['rows']:>9} {r['input_mb']:>9.1f} {r['fit_s']:>8.2f} {r['fit_peak_rss_mb']:>9.1f} "
+          f"{r.get('choose_k_s', 0):>10.2f} {r.get('chosen_k', '-'):>6} {r.get('peak_rss_mb', 0):>9.1f} "
+          f"{r.get('worker_peak_rss_mb', 0):>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark clustering fit time and memory.")
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="Comma-separated row counts")
+    parser.add_argument("--dim", type=int, default=768, help="Vector dimension")
+    parser.add_argument("--centers", type=int, default=20, help="Blobs in the synthetic data")
+    parser.add_argument("--k", type=int, default=15, help="K for the fixed-K fit")
+    parser.add_argument("--k-range", default="8,12,16,20,24",
+                        help="Comma-separated candidate Ks for selection; empty to skip")
+    parser.add_argument("--workers", type=int, default=clustering.MAX_WORKERS, help="K-selection processes")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.sizes.split(",")]
+    args.k_range = [int(k) for k in args.k_range.split(",") if k]
+
+    print(f"{'rows':>9} {'input_mb':>9} {'fit_s':>8} {'fit_rss':>9} {'choose_k_s':>10} {'k':>6} "
+          f"{'peak_rss':>9} {'worker_rss':>10}")
+    reports = []
+    with tempfile.TemporaryDirectory(prefix="cluster_bench_") as workdir:
+        for n in sizes:
+            report = run_size(workdir, n, args)
+            reports.append(report)
+            print_row(report)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(reports, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
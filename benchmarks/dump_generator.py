@@ -0,0 +1,91 @@
+"""
+Writes synthetic Reddit dumps in the text format parse.py reads, with
+configurable post count, comments per post, reply nesting and body size.
+
+    python -m benchmarks.dump_generator out.txt --posts 5000 --comments 40 --depth 4
+"""
+import argparse
+import random
+
+WORDS = ("lease tenant landlord rent deposit repair leak mold eviction notice inspection late fee "
+         "roof heater lawyer court screening sublet utilities pest smoke detector broken lock "
+         "month-to-month renewal increase agreement walkthrough photos receipt small claims").split()
+SEPARATOR = "=" * 20
+
+
+def sentence(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def write_comment(f, rng, level, score_range, text_words):
+    indent = "\t" * level
+    f.write(f"{indent}--- Comment (Score: {rng.randint(*score_range)}) ---\n")
+    f.write(f"{indent}Author: user{rng.randint(0, 5000)}\n")
+    f.write(f"{indent}Timestamp: 2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} 12:00:00\n")
+    lines = [sentence(rng, rng.randint(3, text_words)) for _ in range(rng.choice((1, 1, 1, 2, 3)))]
+    f.write(f"{indent}Text: {lines[0]}\n")
+    for line in lines[1:]:
+        f.write(f"{indent}{line}\n")
+    f.write("\n")
+
+
+def generate_dump(path, posts=1000, comments=30, depth=3, body_words=120, subreddit="Landlord",
+                  seed=0, url_prefix=None, duplicate_rate=0.0):
+    """
+    Writes `posts` threads to `path`. Comment counts vary around `comments`,
+    replies nest up to `depth` levels below top-level comments, and bodies
+    average `body_words` words. `duplicate_rate` of the posts repeat an
+    earlier title and body (reposts, for dedup). Returns the post count.
+    """
+    rng = random.Random(seed)
+    url_prefix = url_prefix or f"https://www.reddit.com/r/{subreddit}/comments/"
+    written = []
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("==== STATS ====\n")
+        f.write(f"SUBREDDIT: r/{subreddit}\n")
+        f.write(f"Total posts: {posts}\n\n")
+        for number in range(1, posts + 1):
+            if written and rng.random() < duplicate_rate:
+                title, body_lines = rng.choice(written)
+            else:
+                title = sentence(rng, rng.randint(5, 14)).capitalize()
+                words = max(1, int(rng.gauss(body_words, body_words / 3)))
+                body_lines = [sentence(rng, min(words, 40)) for _ in range(max(1, words // 40))]
+                written.append((title, body_lines))
+            f.write(f"POST {number}: {title}\n")
+            f.write(f"Score (Upvotes): {rng.randint(0, 2000)}\n")
+            f.write(f"URL: {url_prefix}{seed}_{number}\n")
+            f.write("Post Content:\n")
+            for line in body_lines:
+                f.write(line + "\n")
+            f.write("\n--- Top 100 Comments ---\n")
+            level = 0
+            for _ in range(max(0, int(rng.gauss(comments, comments / 4)))):
+                write_comment(f, rng, level, (-20, 500), 30)
+                # Walk the reply tree: go deeper, stay, or climb back up
+                step = rng.random()
+                if step < 0.4 and level < depth:
+                    level += 1
+                elif step < 0.7 and level > 0:
+                    level = rng.randint(0, level - 1)
+            f.write(SEPARATOR + "\n\n")
+    return posts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic Reddit dump.")
+    parser.add_argument("output", help="Dump file to write (.txt)")
+    parser.add_argument("--posts", type=int, default=1000)
+    parser.add_argument("--comments", type=int, default=30, help="Average comments per post")
+    parser.add_argument("--depth", type=int, default=3, help="Maximum reply nesting below top level")
+    parser.add_argument("--body-words", type=int, default=120, help="Average words per post body")
+    parser.add_argument("--subreddit", default="Landlord")
+    parser.add_argument("--duplicate-rate", type=float, default=0.0, help="Fraction of reposted threads")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    generate_dump(args.output, args.posts, args.comments, args.depth, args.body_words, args.subreddit,
+                  args.seed, duplicate_rate=args.duplicate_rate)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""
+Runs the extract and synthesize stages end to end against the simulated LLM
+backend and reports throughput and latency as concurrency varies. Measures
+the pipeline's own overhead without spending API quota.
+
+    python -m benchmarks.llm_throughput --posts 2000 --concurrency 5,25,100
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import random
+import tempfile
+import time
+
+import extractor
+import synthesizer
+from llm_backend import SimulatedBackend
+from llm_cache import LLMCache
+from failure_journal import FailureJournal
+from rate_limiter import AdaptiveRateLimiter
+
+# Client-side quotas when none are given: effectively unlimited, so the
+# numbers reflect the pipeline and the simulated service only
+UNLIMITED = 10 ** 9
+
+WORDS = ("lease tenant landlord rent deposit repair leak mold eviction notice "
+         "inspection late fee roof heater lawyer court screening").split()
+
+
+class TimedBackend:
+    """Records caller-observed latency of every call to the wrapped backend."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.latencies = []
+
+    async def _timed(self, call):
+        started = time.perf_counter()
+        try:
+            return await call
+        finally:
+            self.latencies.append(time.perf_counter() - started)
+
+    async def generate(self, prompt, model=None, config=None):
+        return await self._timed(self.backend.generate(prompt, model=model, config=config))
+
+    async def embed(self, texts, model=None, task_type=None):
+        return await self._timed(self.backend.embed(texts, model=model, task_type=task_type))
+
+
+def synthetic_posts(count, seed=0):
+    rng = random.Random(seed)
+
+    def sentence(n):
+        return " ".join(rng.choice(WORDS) for _ in range(n))
+
+    return [
+        {
+            "subreddit": "Landlord",
+            "title": sentence(8),
+            "score": rng.randint(0, 500),
+            "url": f"https://reddit.com/r/Landlord/bench/{i}",
+            "body": sentence(rng.randint(20, 200)),
+            "comments": [
+                {"level": rng.randint(0, 3), "score": rng.randint(-5, 100),
+                 "author": f"user{rng.randint(0, 50)}", "text": sentence(rng.randint(5, 60))}
+                for _ in range(rng.randint(0, 30))
+            ],
+        }
+        for i in range(count)
+    ]
+
+
+def percentile(values, q):
+    """Nearest-rank percentile (q in 0-100) of an unsorted list."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered))) - 1))]
+
+
+def stage_report(name, concurrency, wall, timed, simulated):
+    calls = len(timed.latencies)
+    return {
+        "stage": name,
+        "concurrency": concurrency,
+        "wall_s": round(wall, 3),
+        "requests": calls,
+        "requests_per_s": round(calls / wall, 1) if wall else 0.0,
+        "p50_ms": round(percentile(timed.latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(timed.latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(timed.latencies, 99) * 1000, 1),
+        "rate_limited": simulated.stats["rate_limited"],
+        "errors": simulated.stats["errors"],
+        "tokens": simulated.stats["tokens"],
+    }
+
+
+def make_backend(args):
+    return SimulatedBackend(
+        latency=args.latency, latency_sigma=args.latency_sigma,
+        error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+        requests_per_minute=args.server_rpm, tokens_per_minute=args.server_tpm,
+        seed=args.seed,
+    )
+
+
+async def run_extract(workdir, input_file, concurrency, args):
+    simulated = make_backend(args)
+    timed = TimedBackend(simulated)
+    extractor.set_backend(timed)
+    extractor._response_cache = LLMCache(os.path.join(workdir, f"cache_extract_{concurrency}.sqlite"))
+    extractor.OUTPUT_FILE = os.path.join(workdir, f"extracted_{concurrency}.jsonl")
+    extractor._failure_journal = FailureJournal(os.path.join(workdir, f"failures_{concurrency}.jsonl"))
+    extractor.MAX_CONCURRENT_REQUESTS = concurrency
+    extractor.REQUESTS_PER_MINUTE = args.client_rpm
+    extractor.TOKENS_PER_MINUTE = args.client_tpm
+
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        await extractor.main_stream(input_file, args.pack)
+    wall = time.perf_counter() - started
+    extractor._response_cache.close()
+    return stage_report("extract", concurrency, wall, timed, simulated), extractor.OUTPUT_FILE
+
+
+async def run_synthesize(workdir, extracted_file, concurrency, args):
+    simulated = make_backend(args)
+    timed = TimedBackend(simulated)
+    synthesizer.set_backend(timed)
+    synthesizer._response_cache = LLMCache(os.path.join(workdir, f"cache_synth_{concurrency}.sqlite"))
+    synthesizer.OUTPUT_DIR = os.path.join(workdir, f"pedia_{concurrency}")
+    synthesizer.EMBEDDING_STORE = os.path.join(workdir, f"embeddings_{concurrency}")
+    synthesizer.VECTOR_INDEX_PREFIX = os.path.join(workdir, f"vector_index_{concurrency}")
+    synthesizer.MAX_CONCURRENT_REQUESTS = concurrency
+    synthesizer.generation_limiter = AdaptiveRateLimiter(args.client_rpm, args.client_tpm, concurrency, name="generate")
+    synthesizer.embedding_limiter = AdaptiveRateLimiter(args.client_rpm, args.client_tpm, concurrency, name="embed")
+
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        await synthesizer.main(input_file=extracted_file)
+    wall = time.perf_counter() - started
+    synthesizer._response_cache.close()
+    return stage_report("synthesize", concurrency, wall, timed, simulated)
+
+
+async def run(args):
+    reports = []
+    with tempfile.TemporaryDirectory(prefix="llm_bench_") as workdir:
+        input_file = os.path.join(workdir, "posts.jsonl")
+        with open(input_file, 'w', encoding='utf-8') as f:
+            for post in synthetic_posts(args.posts, args.seed):
+                f.write(json.dumps(post))
+                f.write('\n')
+
+        for concurrency in args.concurrency:
+            report, extracted_file = await run_extract(workdir, input_file, concurrency, args)
+            reports.append(report)
+            print_row(report)
+            if "synthesize" in args.stages:
+                report = await run_synthesize(workdir, extracted_file, concurrency, args)
+                reports.append(report)
+                print_row(report)
+    return reports
+
+
+def print_row(r):
+    print(f"{r['stage']:<11} {r['concurrency']:>5} {r['wall_s']:>9.2f} {r['requests']:>8} "
+          f"{r['requests_per_s']:>8.1f} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f} "
+          f"{r['rate_limited']:>6} {r['errors']:>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark extract + synthesize against a simulated LLM.")
+    parser.add_argument("--posts", type=int, default=2000, help="Synthetic posts to extract")
+    parser.add_argument("--concurrency", default="5,10,25,50,100",
+                        help="Comma-separated concurrency levels to sweep")
+    parser.add_argument("--stages", default="extract,synthesize", help="Stages to run")
+    parser.add_argument("--latency", type=float, default=0.2, help="Median simulated latency (s)")
+    parser.add_argument("--latency-sigma", type=float, default=0.3, help="Log-normal latency spread")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of calls failing with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of calls failing with 429")
+    parser.add_argument("--server-rpm", type=int, default=None, help="Simulated server request quota")
+    parser.add_argument("--server-tpm", type=int, default=None, help="Simulated server token quota")
+    parser.add_argument("--client-rpm", type=int, default=UNLIMITED, help="Client rate limiter RPM")
+    parser.add_argument("--client-tpm", type=int, default=UNLIMITED, help="Client rate limiter TPM")
+    parser.add_argument("--pack", action="store_true", help="Use the extractor's packing mode")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+    args.concurrency = [int(c) for c in args.concurrency.split(",")]
+    args.stages = args.stages.split(",")
+
+    print(f"{'stage':<11} {'conc':>5} {'wall_s':>9} {'requests':>8} {'req/s':>8} "
+          f"{'p50_ms':>8} {'p95_ms':>8} {'p99_ms':>8} {'429s':>6} {'errors':>6}")
+    reports = asyncio.run(run(args))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(reports, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
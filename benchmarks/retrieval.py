@@ -0,0 +1,105 @@
+"""
+Recall and latency of the IVF-PQ index against exact search on synthetic
+clustered unit vectors, sweeping the number of lists probed.
+
+    python -m benchmarks.retrieval --sizes 10000,100000,1000000 --nprobe 1,4,16,64
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+import retrieval
+from benchmarks.clustering import make_blobs
+from vector_index import normalize_rows
+
+
+def recall_at_k(found, truth):
+    k = truth.shape[1]
+    return float(np.mean([len(set(f[f >= 0]) & set(t)) / k for f, t in zip(found, truth)]))
+
+
+def make_queries(vectors, count, noise, seed):
+    """Perturbed copies of random rows: near neighbours exist but aren't exact hits."""
+    rng = np.random.default_rng(seed)
+    base = np.asarray(vectors[rng.choice(len(vectors), count, replace=False)])
+    return normalize_rows(base + noise * rng.standard_normal(base.shape, dtype=np.float32))
+
+
+def run_size(workdir, n, args):
+    path = os.path.join(workdir, f"vectors_{n}.npy")
+    make_blobs(path, n, args.dim, max(1, n // args.blob_size), args.seed)
+    raw = np.load(path, mmap_mode='r+')
+    # Normalize in place, chunk by chunk, as the exported index would be
+    for start in range(0, n, retrieval.ENCODE_CHUNK):
+        raw[start:start + retrieval.ENCODE_CHUNK] = normalize_rows(raw[start:start + retrieval.ENCODE_CHUNK])
+    raw.flush()
+    vectors = np.load(path, mmap_mode='r')
+    queries = make_queries(vectors, args.queries, args.noise, args.seed + 1)
+
+    started = time.perf_counter()
+    index = retrieval.IVFPQIndex.train(vectors, subvectors=args.subvectors, seed=args.seed)
+    build_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    truth, _ = retrieval.exact_search(vectors, queries, args.k)
+    exact_ms = (time.perf_counter() - started) * 1000 / len(queries)
+
+    rows = []
+    base = {"rows": n, "dim": args.dim, "nlist": index.nlist, "build_s": round(build_s, 2),
+            "exact_ms": round(exact_ms, 3), "codes_mb": round(index.codes.nbytes / 2 ** 20, 1)}
+    for nprobe in args.nprobe:
+        for rerank in (True, False):
+            started = time.perf_counter()
+            found, _ = index.search(queries, args.k, nprobe, vectors=vectors if rerank else None,
+                                    rerank=args.rerank)
+            ann_ms = (time.perf_counter() - started) * 1000 / len(queries)
+            rows.append({**base, "nprobe": nprobe, "rerank": rerank, "ann_ms": round(ann_ms, 3),
+                         "recall": round(recall_at_k(found, truth), 4),
+                         "speedup": round(exact_ms / ann_ms, 1) if ann_ms else 0.0})
+    del vectors, raw
+    os.remove(path)
+    return rows
+
+
+def print_row(r):
+    print(f"{r['rows']:>9} {r['nlist']:>6} {r['build_s']:>8.1f} {r['nprobe']:>6} {str(r['rerank']):>6} "
+          f"{r['recall']:>7.3f} {r['ann_ms']:>8.2f} {r['exact_ms']:>9.2f} {r['speedup']:>7.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark IVF-PQ recall and latency against exact search.")
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="Comma-separated vector counts")
+    parser.add_argument("--dim", type=int, default=768, help="Vector dimension")
+    parser.add_argument("--subvectors", type=int, default=retrieval.PQ_SUBVECTORS, help="PQ subvectors (divides dim)")
+    parser.add_argument("--blob-size", type=int, default=50,
+                        help="Average vectors per synthetic blob, so every point has close neighbours")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--noise", type=float, default=0.05, help="Query perturbation scale")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", default="1,4,16,64", help="Comma-separated lists probed")
+    parser.add_argument("--rerank", type=int, default=retrieval.RERANK_CANDIDATES, help="Candidates re-scored exactly")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.sizes.split(",")]
+    args.nprobe = [int(p) for p in args.nprobe.split(",")]
+
+    print(f"{'rows':>9} {'nlist':>6} {'build_s':>8} {'nprobe':>6} {'rerank':>6} {'recall':>7} "
+          f"{'ann_ms':>8} {'exact_ms':>9} {'speedup':>7}")
+    reports = []
+    with tempfile.TemporaryDirectory(prefix="retrieval_bench_") as workdir:
+        for n in sizes:
+            for row in run_size(workdir, n, args):
+                reports.append(row)
+                print_row(row)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(reports, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
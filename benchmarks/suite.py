@@ -0,0 +1,273 @@
+"""
+Regression suite over the hot paths: parsing a synthetic dump (line and
+mmap parsers), format_thread_for_llm, loading the extraction checkpoint of
+a large JSONL output, mini-batch cluster_data at scale, and extract + synthesize end
+to end against the simulated LLM backend.
+
+Results are compared with the stored baselines for the chosen profile; a
+metric regresses when it is worse than its baseline by more than its
+tolerance.
+
+    python -m benchmarks.suite --check             # exit 1 on a regression
+    python -m benchmarks.suite --profile full --update
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import extractor
+import parse
+import synthesizer
+from benchmarks.dump_generator import generate_dump
+from benchmarks.llm_throughput import UNLIMITED, run_extract, run_synthesize
+from checkpoint import CheckpointIndex
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+# Allowed relative slowdown before a metric counts as a regression
+DEFAULT_TOLERANCE = 0.25
+
+PROFILES = {
+    "quick": {
+        "dump_posts": 2000, "dump_comments": 30, "dump_depth": 4, "dump_body_words": 150,
+        "checkpoint_records": 50000, "cluster_rows": 10000, "cluster_dim": 768, "cluster_k": 20,
+        "llm_posts": 300, "llm_concurrency": 50, "llm_latency": 0.02, "repeat": 3,
+    },
+    "full": {
+        "dump_posts": 20000, "dump_comments": 60, "dump_depth": 6, "dump_body_words": 200,
+        "checkpoint_records": 1000000, "cluster_rows": 100000, "cluster_dim": 768, "cluster_k": 50,
+        "llm_posts": 2000, "llm_concurrency": 100, "llm_latency": 0.05, "repeat": 3,
+    },
+}
+
+# name -> (better direction, unit, tolerance). Simulated-LLM numbers depend
+# on event-loop scheduling as much as on the code, so they get more slack.
+METRICS = {
+    "parse.line.posts_per_s": ("higher", "posts/s", DEFAULT_TOLERANCE),
+    "parse.line.mb_per_s": ("higher", "MB/s", DEFAULT_TOLERANCE),
+    "parse.mmap.posts_per_s": ("higher", "posts/s", DEFAULT_TOLERANCE),
+    "parse.mmap.mb_per_s": ("higher", "MB/s", DEFAULT_TOLERANCE),
+    "format_thread.threads_per_s": ("higher", "threads/s", DEFAULT_TOLERANCE),
+    "checkpoint.indexed_load_ms": ("lower", "ms", 0.5),
+    "checkpoint.cold_scan_ms": ("lower", "ms", DEFAULT_TOLERANCE),
+    "cluster_data.seconds": ("lower", "s", DEFAULT_TOLERANCE),
+    "extract.requests_per_s": ("higher", "req/s", 0.5),
+    "extract.p95_ms": ("lower", "ms", 1.0),
+    "synthesize.wall_s": ("lower", "s", 0.4),
+}
+
+
+def best_of(repeat, fn):
+    """Fastest of `repeat` runs of fn(), as (seconds, last result)."""
+    best, result = None, None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def quiet(fn, *args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args)
+
+
+# ------------------------------------------
+# BENCHMARKS
+# ------------------------------------------
+def bench_parse(workdir, p):
+    dump = os.path.join(workdir, "dump.txt")
+    generate_dump(dump, p["dump_posts"], p["dump_comments"], p["dump_depth"], p["dump_body_words"])
+    mb = os.path.getsize(dump) / 2 ** 20
+    results = {}
+    posts = None
+    for name, fast in (("line", False), ("mmap", True)):
+        seconds, posts = best_of(p["repeat"], lambda: quiet(parse.parse_reddit_text_file, dump, fast))
+        results[f"parse.{name}.posts_per_s"] = len(posts) / seconds
+        results[f"parse.{name}.mb_per_s"] = mb / seconds
+    return results, posts
+
+
+def bench_format_thread(posts, p):
+    seconds, _ = best_of(p["repeat"], lambda: [extractor.format_thread_for_llm(post) for post in posts])
+    return {"format_thread.threads_per_s": len(posts) / seconds}
+
+
+def bench_checkpoint(workdir, p):
+    """
+    Resume cost of an extraction output with checkpoint_records cases: with
+    its sidecar index (the normal case) and without one (a cold scan that
+    decodes every record, as resuming did before the index existed).
+    """
+    output = os.path.join(workdir, "extracted.jsonl")
+    filler = "tenant withheld rent after the landlord ignored repeated repair requests " * 6
+    with open(output, 'w', encoding='utf-8') as f:
+        for i in range(p["checkpoint_records"]):
+            f.write(json.dumps({"source_url": f"https://www.reddit.com/r/Landlord/comments/{i}",
+                                "trigger_event": filler, "fatal_mistake": filler, "tags": ["repairs", "rent"]}))
+            f.write('\n')
+    index_file = output + ".idx"
+
+    def cold():
+        if os.path.exists(index_file):
+            os.remove(index_file)
+        return CheckpointIndex(output)
+
+    cold_s, checkpoint = best_of(p["repeat"], cold)
+    assert len(checkpoint.done) == p["checkpoint_records"]
+    indexed_s, checkpoint = best_of(p["repeat"], lambda: CheckpointIndex(output))
+    assert len(checkpoint.done) == p["checkpoint_records"]
+    return {"checkpoint.indexed_load_ms": indexed_s * 1000, "checkpoint.cold_scan_ms": cold_s * 1000}
+
+
+def bench_cluster_data(p):
+    rng = np.random.default_rng(0)
+    n, dim, k = p["cluster_rows"], p["cluster_dim"], p["cluster_k"]
+    centers = rng.standard_normal((k, dim), dtype=np.float32)
+    embeddings = centers[rng.integers(0, k, n)] + 0.5 * rng.standard_normal((n, dim), dtype=np.float32)
+    data = [{"source_url": f"case/{i}"} for i in range(n)]
+    seconds, clusters = best_of(1, lambda: quiet(synthesizer.cluster_data, data, embeddings, k, True))
+    assert sum(len(items) for items in clusters.values()) == n
+    return {"cluster_data.seconds": seconds}
+
+
+def bench_llm(workdir, posts, p):
+    input_file = os.path.join(workdir, "posts.jsonl")
+    with open(input_file, 'w', encoding='utf-8') as f:
+        for post in posts[:p["llm_posts"]]:
+            f.write(json.dumps(post, default=parse.encode_json))
+            f.write('\n')
+    args = argparse.Namespace(
+        latency=p["llm_latency"], latency_sigma=0.3, error_rate=0.0, rate_limit_rate=0.0,
+        server_rpm=None, server_tpm=None, client_rpm=UNLIMITED, client_tpm=UNLIMITED, pack=False, seed=0,
+    )
+    concurrency = p["llm_concurrency"]
+
+    async def run():
+        extracted, extracted_file = await run_extract(workdir, input_file, concurrency, args)
+        synthesized = await run_synthesize(workdir, extracted_file, concurrency, args)
+        return extracted, synthesized
+
+    extracted, synthesized = asyncio.run(run())
+    return {
+        "extract.requests_per_s": extracted["requests_per_s"],
+        "extract.p95_ms": extracted["p95_ms"],
+        "synthesize.wall_s": synthesized["wall_s"],
+    }
+
+
+def run_suite(profile):
+    p = PROFILES[profile]
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="bench_suite_") as workdir:
+        parsed, posts = bench_parse(workdir, p)
+        results.update(parsed)
+        results.update(bench_format_thread(posts, p))
+        results.update(bench_checkpoint(workdir, p))
+        results.update(bench_cluster_data(p))
+        results.update(bench_llm(workdir, posts, p))
+    return {name: round(value, 3) for name, value in results.items()}
+
+
+# ------------------------------------------
+# BASELINES
+# ------------------------------------------
+def environment():
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def load_baselines(path=BASELINE_FILE):
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_baselines(baselines, profile, results, path=BASELINE_FILE):
+    """Records `results` as the profile's baseline, keeping hand-tuned tolerances."""
+    previous = baselines.get(profile, {}).get("metrics", {})
+    metrics = {}
+    for name, value in results.items():
+        direction, unit, tolerance = METRICS[name]
+        metrics[name] = {
+            "value": value,
+            "unit": unit,
+            "direction": direction,
+            "tolerance": previous.get(name, {}).get("tolerance", tolerance),
+        }
+    baselines[profile] = {"environment": environment(), "settings": PROFILES[profile], "metrics": metrics}
+    with open(path + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump(baselines, f, indent=2)
+        f.write('\n')
+    os.replace(path + ".tmp", path)
+
+
+def compare(results, baseline_metrics):
+    """Rows of (name, baseline, current, relative change, status); positive change is better."""
+    rows = []
+    for name, value in results.items():
+        baseline = baseline_metrics.get(name)
+        if baseline is None or not baseline["value"]:
+            rows.append((name, None, value, None, "new"))
+            continue
+        change = (value - baseline["value"]) / baseline["value"]
+        if baseline["direction"] == "lower":
+            change = -change
+        status = "REGRESSED" if change < -baseline["tolerance"] else "ok"
+        rows.append((name, baseline["value"], value, change, status))
+    return rows
+
+
+def print_rows(rows):
+    print(f"\n{'metric':<30} {'baseline':>12} {'current':>12} {'change':>8}  status")
+    for name, baseline, value, change, status in rows:
+        base_text = f"{baseline:>12,.3f}" if baseline is not None else f"{'-':>12}"
+        change_text = f"{change:>+8.1%}" if change is not None else f"{'-':>8}"
+        print(f"{name:<30} {base_text} {value:>12,.3f} {change_text}  {status}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the benchmark suite and compare it with stored baselines.")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="quick")
+    parser.add_argument("--baselines", default=BASELINE_FILE, help="Baseline file to compare with or update")
+    parser.add_argument("--check", action="store_true", help="Exit with status 1 if any metric regressed")
+    parser.add_argument("--update", action="store_true", help="Store this run as the profile's baseline")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    results = run_suite(args.profile)
+    baselines = load_baselines(args.baselines)
+    stored = baselines.get(args.profile)
+    if stored is None:
+        print(f"No '{args.profile}' baseline in {args.baselines}; run with --update to record one.")
+    rows = compare(results, stored["metrics"] if stored else {})
+    print_rows(rows)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({"profile": args.profile, "environment": environment(), "results": results}, f, indent=2)
+    if args.update:
+        save_baselines(baselines, args.profile, results, args.baselines)
+        print(f"\nBaseline for '{args.profile}' written to {args.baselines}")
+    regressed = [row[0] for row in rows if row[4] == "REGRESSED"]
+    if regressed and args.check and not args.update:
+        print(f"\n{len(regressed)} metric(s) regressed: {', '.join(regressed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,389 @@
+import fcntl
+import hashlib
+import json
+import os
+from collections.abc import Sequence
+import numpy as np
+
+# ==========================================
+# COLUMNAR CASE STORE
+# ==========================================
+# A directory kept next to the extraction output (<output>.cases/) holding
+# the cases' fields as columns, so synthesis reads arrays instead of
+# decoding every JSON line into a dict:
+#   meta.json          source file, bytes of it consumed, row count, columns
+#   rows.i64           byte offset of each case's line in the source
+#   <field>.flags      uint8 per row: PRESENT / NULL / JSON / TRUTHY bits
+#   <field>.ends       text columns: int64 end offset of each value...
+#   <field>.utf8       ...into the concatenated UTF-8 values
+#   <field>.i64        int columns: the values
+# Text columns hold strings as-is and any other JSON value as JSON text.
+# Rows are only appended; meta.json is replaced last, so files longer than
+# its row count are leftovers of an interrupted sync and are cut by the next.
+#   sync.lock          held (flock) by whichever process is syncing
+STORE_SUFFIX = ".cases"
+FORMAT_VERSION = 1
+CASE_COLUMNS = {
+    "source_url": "text",
+    "subreddit": "text",
+    "original_score": "int",
+    "case_title": "text",
+    "trigger_event": "text",
+    "fatal_mistake": "text",
+    "escalation_timeline": "text",
+    "financial_cost": "text",
+    "emotional_state": "text",
+    "community_consensus": "text",
+    "brutal_reality_quote": "text",
+    "tags": "text",
+}
+# Source bytes decoded per step while syncing
+SYNC_CHUNK_BYTES = 16 * 1024 * 1024
+# The store is rebuilt if the first bytes of the source stop matching
+HEAD_BYTES = 4096
+LOCK_FILE = "sync.lock"
+
+PRESENT = 1
+NULL = 2
+# Text columns: the value is JSON text, not a plain string. Int columns:
+# the value isn't an int, so it is read back from the source line
+JSON = 4
+TRUTHY = 8
+
+
+def _encode(value):
+    """(flags, bytes) of one text-column value."""
+    if value is None:
+        return PRESENT | NULL, b""
+    flags = PRESENT | (TRUTHY if value else 0)
+    if isinstance(value, str):
+        return flags, value.encode('utf-8')
+    return flags | JSON, json.dumps(value, ensure_ascii=False).encode('utf-8')
+
+
+def _read_array(path, dtype, count):
+    if count == 0 or not os.path.exists(path):
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', shape=(count,))
+
+
+def _truncate(path, size):
+    if os.path.exists(path) and os.path.getsize(path) > size:
+        with open(path, 'r+b') as f:
+            f.truncate(size)
+
+
+class TextColumn:
+    def __init__(self, flags, ends, data):
+        self.flags = flags
+        self.ends = ends
+        self.data = data
+
+    def __len__(self):
+        return len(self.flags)
+
+    def nonempty(self):
+        return (self.flags & TRUTHY) != 0
+
+    def get(self, row, missing=None):
+        flags = int(self.flags[row])
+        if not flags & PRESENT:
+            return missing
+        if flags & NULL:
+            return None
+        start = int(self.ends[row - 1]) if row else 0
+        text = str(memoryview(self.data)[start:int(self.ends[row])], 'utf-8')
+        return json.loads(text) if flags & JSON else text
+
+    def take(self, rows=None, missing=None):
+        """Values of `rows` (all rows by default) as Python objects, `missing` where a case lacks the field."""
+        rows = np.arange(len(self)) if rows is None else np.asarray(rows, dtype=np.int64)
+        flags = self.flags[rows]
+        ends = np.asarray(self.ends[rows])
+        starts = np.where(rows > 0, self.ends[np.maximum(rows - 1, 0)], 0)
+        data = memoryview(self.data)
+        values = []
+        for flag, start, end in zip(flags.tolist(), starts.tolist(), ends.tolist()):
+            if not flag & PRESENT:
+                values.append(missing)
+            elif flag & NULL:
+                values.append(None)
+            elif flag & JSON:
+                values.append(json.loads(str(data[start:end], 'utf-8')))
+            else:
+                values.append(str(data[start:end], 'utf-8'))
+        return values
+
+
+class IntColumn:
+    def __init__(self, flags, values, store, field):
+        self.flags = flags
+        self.values = values
+        self.store = store
+        self.field = field
+
+    def __len__(self):
+        return len(self.flags)
+
+    def nonempty(self):
+        return (self.flags & TRUTHY) != 0
+
+    def get(self, row, missing=None):
+        flags = int(self.flags[row])
+        if not flags & PRESENT:
+            return missing
+        if flags & NULL:
+            return None
+        if flags & JSON:
+            return self.store.record(row)[self.field]
+        return int(self.values[row])
+
+    def take(self, rows=None, missing=None):
+        rows = range(len(self)) if rows is None else rows
+        return [self.get(int(row), missing) for row in rows]
+
+
+class CaseRows(Sequence):
+    """Read-only list-like view of some rows; each item is the case's dict of column fields."""
+
+    def __init__(self, store, rows, fields=None):
+        self.store = store
+        self.rows = np.asarray(rows, dtype=np.int64)
+        self.fields = fields
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return CaseRows(self.store, self.rows[index], self.fields)
+        return self.store.case(int(self.rows[index]), self.fields)
+
+
+class CaseStore:
+    """
+    Column files for the cases of one JSONL source. sync() appends whatever
+    the source gained since the last sync (rebuilding from scratch if the
+    source was replaced); columns are memory-mapped for reading.
+    """
+
+    def __init__(self, directory, source):
+        self.directory = directory
+        self.source = source
+        self.offset = 0
+        self.count = 0
+        self.head = None
+        self._columns = {}
+        self._rows = None
+        self._load_meta()
+
+    @classmethod
+    def for_output(cls, output_file):
+        return cls(output_file + STORE_SUFFIX, output_file)
+
+    def __len__(self):
+        return self.count
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _load_meta(self):
+        """Reads the committed state; without a usable meta.json the store is empty."""
+        offset, count, head = 0, 0, None
+        meta_file = self._path("meta.json")
+        if os.path.exists(meta_file):
+            with open(meta_file, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get("version") == FORMAT_VERSION and meta.get("columns") == CASE_COLUMNS:
+                offset, count, head = meta["offset"], meta["count"], meta["head"]
+        if count != self.count:
+            self._columns = {}
+            self._rows = None
+        self.offset, self.count, self.head = offset, count, head
+
+    def _trim(self):
+        """Cuts every file back to the committed row count."""
+        _truncate(self._path("rows.i64"), self.count * 8)
+        for field, kind in CASE_COLUMNS.items():
+            _truncate(self._path(f"{field}.flags"), self.count)
+            if kind == "int":
+                _truncate(self._path(f"{field}.i64"), self.count * 8)
+                continue
+            _truncate(self._path(f"{field}.ends"), self.count * 8)
+            ends = _read_array(self._path(f"{field}.ends"), np.int64, self.count)
+            _truncate(self._path(f"{field}.utf8"), int(ends[-1]) if self.count else 0)
+
+    def _reset(self):
+        os.makedirs(self.directory, exist_ok=True)
+        for filename in os.listdir(self.directory):
+            if filename != LOCK_FILE:
+                os.remove(self._path(filename))
+        self.offset = 0
+        self.count = 0
+        self.head = None
+        self._columns = {}
+        self._rows = None
+
+    def _source_head(self):
+        with open(self.source, 'rb') as f:
+            return hashlib.sha256(f.read(min(self.offset, HEAD_BYTES))).hexdigest()
+
+    def sync(self):
+        """
+        Brings the columns up to date with the source. Returns the number of
+        rows added. Syncs are serialized across processes by an exclusive
+        lock on LOCK_FILE; each starts from the state the last one committed.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._path(LOCK_FILE), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                self._load_meta()
+                if self.offset:
+                    self._trim()
+                return self._sync_locked()
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _sync_locked(self):
+        size = os.path.getsize(self.source) if os.path.exists(self.source) else 0
+        if size < self.offset or (self.offset and self._source_head() != self.head):
+            print(f"{self.source} was replaced since {self.directory} was built; rebuilding it.")
+            self._reset()
+        if self.offset == 0:
+            # A fresh build: clear files left by an older layout or a reset
+            self._reset()
+        if size == self.offset:
+            return 0
+
+        added = 0
+        with open(self.source, 'rb') as f:
+            f.seek(self.offset)
+            while True:
+                chunk = f.read(SYNC_CHUNK_BYTES)
+                if not chunk:
+                    break
+                # Only whole lines; a partial last line waits for the next sync
+                end = chunk.rfind(b'\n') + 1
+                if end == 0:
+                    if len(chunk) < SYNC_CHUNK_BYTES:
+                        break
+                    chunk += f.readline()
+                    end = chunk.rfind(b'\n') + 1
+                    if end == 0:
+                        break
+                added += self._append_lines(chunk[:end])
+                f.seek(self.offset)
+        if added or self.head is None:
+            self.head = self._source_head()
+            self._write_meta()
+        return added
+
+    def _append_lines(self, chunk):
+        positions = []
+        records = []
+        position = self.offset
+        for line in chunk.split(b'\n')[:-1]:
+            start = position
+            position += len(line) + 1
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(record, dict):
+                positions.append(start)
+                records.append(record)
+
+        with open(self._path("rows.i64"), 'ab') as f:
+            f.write(np.asarray(positions, dtype=np.int64).tobytes())
+        for field, kind in CASE_COLUMNS.items():
+            flags = np.zeros(len(records), dtype=np.uint8)
+            if kind == "int":
+                values = np.zeros(len(records), dtype=np.int64)
+                for row, record in enumerate(records):
+                    if field not in record:
+                        continue
+                    value = record[field]
+                    if value is None:
+                        flags[row] = PRESENT | NULL
+                    elif isinstance(value, int) and not isinstance(value, bool) and -2 ** 63 <= value < 2 ** 63:
+                        flags[row] = PRESENT | (TRUTHY if value else 0)
+                        values[row] = value
+                    else:
+                        flags[row] = PRESENT | JSON | (TRUTHY if value else 0)
+                with open(self._path(f"{field}.i64"), 'ab') as f:
+                    f.write(values.tobytes())
+            else:
+                ends = np.zeros(len(records), dtype=np.int64)
+                pieces = []
+                data_path = self._path(f"{field}.utf8")
+                written = os.path.getsize(data_path) if os.path.exists(data_path) else 0
+                for row, record in enumerate(records):
+                    if field in record:
+                        flags[row], encoded = _encode(record[field])
+                        pieces.append(encoded)
+                        written += len(encoded)
+                    ends[row] = written
+                with open(data_path, 'ab') as f:
+                    f.write(b"".join(pieces))
+                with open(self._path(f"{field}.ends"), 'ab') as f:
+                    f.write(ends.tobytes())
+            with open(self._path(f"{field}.flags"), 'ab') as f:
+                f.write(flags.tobytes())
+
+        self.offset = position
+        self.count += len(records)
+        self._columns = {}
+        self._rows = None
+        return len(records)
+
+    def _write_meta(self):
+        meta = {"version": FORMAT_VERSION, "source": os.path.basename(self.source), "offset": self.offset,
+                "count": self.count, "head": self.head, "columns": CASE_COLUMNS}
+        meta_file = self._path("meta.json")
+        with open(meta_file + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(meta_file + ".tmp", meta_file)
+
+    # ------------------------------------------
+    # READING
+    # ------------------------------------------
+    def column(self, field):
+        if field not in self._columns:
+            flags = _read_array(self._path(f"{field}.flags"), np.uint8, self.count)
+            if CASE_COLUMNS[field] == "int":
+                values = _read_array(self._path(f"{field}.i64"), np.int64, self.count)
+                self._columns[field] = IntColumn(flags, values, self, field)
+            else:
+                ends = _read_array(self._path(f"{field}.ends"), np.int64, self.count)
+                total = int(ends[-1]) if self.count else 0
+                data = _read_array(self._path(f"{field}.utf8"), np.uint8, total)
+                self._columns[field] = TextColumn(flags, ends, data)
+        return self._columns[field]
+
+    def nonempty(self, field):
+        """Bool per row: the case has a truthy value for `field`."""
+        return self.column(field).nonempty()
+
+    def texts(self, field, rows=None, missing=None):
+        return self.column(field).take(rows, missing)
+
+    def case(self, row, fields=None):
+        """The column fields of one case as a dict (missing fields left out)."""
+        case = {}
+        for field in fields or CASE_COLUMNS:
+            value = self.column(field).get(row, missing=self)
+            if value is not self:
+                case[field] = value
+        return case
+
+    def view(self, rows, fields=None):
+        return CaseRows(self, rows, fields)
+
+    def record(self, row):
+        """The full source record of a case, decoded from its line."""
+        if self._rows is None:
+            self._rows = _read_array(self._path("rows.i64"), np.int64, self.count)
+        with open(self.source, 'rb') as f:
+            f.seek(int(self._rows[row]))
+            return json.loads(f.readline())
@@ -0,0 +1,244 @@
+import asyncio
+import json
+import os
+import time
+
+# ==========================================
+# CHECKPOINTED JSONL OUTPUT
+# ==========================================
+# The sidecar index (<output>.idx) is append-only text: the keys of a
+# committed group, one per line, followed by a marker line holding the byte
+# size of the output file after that group ("\t<offset>"). A group without
+# its marker never fully committed and is ignored.
+INDEX_SUFFIX = ".idx"
+TRUNCATED_SUFFIX = ".truncated"
+COMMIT_EVERY_RECORDS = 50
+COMMIT_EVERY_SECONDS = 2.0
+# "never": leave it to the OS, "commit": fsync once per group commit,
+# "always": commit and fsync after every record
+FSYNC_POLICY = "commit"
+FSYNC_POLICIES = ("never", "commit", "always")
+
+
+class CheckpointIndex:
+    """
+    Done keys of a JSONL output file plus the offset of its last committed
+    record. Loading reads only the index and whatever the output gained past
+    that offset, instead of decoding every record. A partial trailing line
+    left by a crash is cut off (and saved next to the file) so the next
+    append starts on a clean line.
+    """
+
+    def __init__(self, output_file, key_field="source_url", index_file=None):
+        self.output_file = output_file
+        self.key_field = key_field
+        self.index_file = index_file or output_file + INDEX_SUFFIX
+        self.done = set()
+        self.offset = 0
+        self.recovered = 0
+        self.repaired_bytes = 0
+        self.invalid_lines = 0
+        self._load()
+
+    def _load(self):
+        if os.path.exists(self.index_file):
+            self._read_index()
+        output_size = os.path.getsize(self.output_file) if os.path.exists(self.output_file) else 0
+        if output_size < self.offset:
+            # The index got ahead of the data (e.g. the output was replaced): rebuild
+            print(f"Checkpoint index {self.index_file} is ahead of {self.output_file}; rebuilding it.")
+            self.done = set()
+            self.offset = 0
+            with open(self.index_file, 'w', encoding='utf-8'):
+                pass
+        if output_size > self.offset or not os.path.exists(self.index_file):
+            self._scan_tail()
+
+    def _read_index(self):
+        with open(self.index_file, 'rb') as f:
+            data = f.read()
+        pending = []
+        committed_end = 0
+        position = 0
+        # The last piece is whatever follows the final newline (normally empty)
+        for line in data.split(b'\n')[:-1]:
+            position += len(line) + 1
+            if line.startswith(b'\t'):
+                self.done.update(pending)
+                pending = []
+                self.offset = int(line)
+                committed_end = position
+            else:
+                pending.append(line.decode('utf-8'))
+        if committed_end != len(data):
+            # Drop an uncommitted group so later appends stay well-formed
+            with open(self.index_file, 'r+b') as f:
+                f.truncate(committed_end)
+
+    def _scan_tail(self):
+        """Indexes records past the committed offset and repairs a torn last line."""
+        if not os.path.exists(self.output_file):
+            self.append([], 0)
+            return
+        keys = []
+        with open(self.output_file, 'r+b') as f:
+            f.seek(self.offset)
+            position = self.offset
+            for line in f:
+                if not line.endswith(b'\n'):
+                    self._repair(f, position, line)
+                    break
+                position += len(line)
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    self.invalid_lines += 1
+                    continue
+                key = record.get(self.key_field) if isinstance(record, dict) else None
+                if key is not None:
+                    keys.append(key)
+        self.recovered = len(keys)
+        self.append(keys, position)
+
+    def _repair(self, f, position, fragment):
+        with open(self.output_file + TRUNCATED_SUFFIX, 'ab') as f_bad:
+            f_bad.write(fragment + b'\n')
+        f.truncate(position)
+        self.repaired_bytes = len(fragment)
+        print(f"Repaired {self.output_file}: cut a truncated {len(fragment)}-byte trailing record "
+              f"(saved to {self.output_file + TRUNCATED_SUFFIX}).")
+
+    def append(self, keys, offset, fsync=False):
+        """Commits a group: its keys, then the marker with the new output size."""
+        lines = [f"{key}\n" for key in keys if "\n" not in key and not key.startswith("\t")]
+        lines.append(f"\t{offset}\n")
+        with open(self.index_file, 'a', encoding='utf-8') as f:
+            f.write("".join(lines))
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        self.done.update(keys)
+        self.offset = offset
+
+    def summary(self):
+        text = f"{len(self.done)} done"
+        if self.recovered:
+            text += f", {self.recovered} recovered past the index"
+        if self.repaired_bytes:
+            text += f", repaired a {self.repaired_bytes}-byte truncated line"
+        if self.invalid_lines:
+            text += f", {self.invalid_lines} unreadable lines skipped"
+        return text
+
+
+class GroupCommitWriter:
+    """
+    Appends JSON records to the checkpointed output in groups. A group is
+    written and committed to the index once it holds `max_records` records
+    or the oldest one has waited `max_seconds`. Age is checked on each
+    write and, when the writer is entered with `async with`, by a timer
+    task as well, so a group still commits while no records arrive.
+    Records still buffered at a crash are simply redone on the next run.
+    `on_commit`, if given, is called after each group is committed. Under
+    `async with` it runs in a worker thread instead, one call at a time,
+    and once on entering so it catches up with what earlier runs wrote;
+    slow hook I/O then never stalls the event loop.
+    """
+
+    def __init__(self, checkpoint, max_records=COMMIT_EVERY_RECORDS,
+                 max_seconds=COMMIT_EVERY_SECONDS, fsync=FSYNC_POLICY, on_commit=None):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync must be one of {FSYNC_POLICIES}, got {fsync!r}")
+        self.checkpoint = checkpoint
+        self.max_records = 1 if fsync == "always" else max_records
+        self.max_seconds = max_seconds
+        self.fsync = fsync != "never"
+        self.on_commit = on_commit
+        self.f_out = open(checkpoint.output_file, 'ab')
+        self.lines = []
+        self.keys = []
+        self.oldest = None
+        self.written = 0
+        self.commits = 0
+        self._timer = None
+        self._hook_task = None
+        self._hook_due = False
+
+    def write(self, record):
+        self.lines.append(json.dumps(record))
+        self.lines.append('\n')
+        key = record.get(self.checkpoint.key_field)
+        if key is not None:
+            self.keys.append(key)
+        if self.oldest is None:
+            self.oldest = time.monotonic()
+        if len(self.lines) >= 2 * self.max_records or time.monotonic() - self.oldest >= self.max_seconds:
+            self.commit()
+
+    def commit(self):
+        if not self.lines:
+            return
+        self.f_out.write("".join(self.lines).encode('utf-8'))
+        self.f_out.flush()
+        if self.fsync:
+            os.fsync(self.f_out.fileno())
+        self.checkpoint.append(self.keys, self.f_out.tell(), fsync=self.fsync)
+        self.written += len(self.lines) // 2
+        self.commits += 1
+        self.lines = []
+        self.keys = []
+        self.oldest = None
+        if self.on_commit is None:
+            return
+        if self._timer is None:
+            self.on_commit()
+        else:
+            self._schedule_hook()
+
+    def _schedule_hook(self):
+        # A failed hook surfaces at the next commit rather than going unnoticed
+        if self._hook_task is not None and self._hook_task.done():
+            self._hook_task.result()
+        self._hook_due = True
+        if self._hook_task is None or self._hook_task.done():
+            self._hook_task = asyncio.create_task(self._run_hooks())
+
+    async def _run_hooks(self):
+        # Commits made while the hook runs are covered by one more call
+        while self._hook_due:
+            self._hook_due = False
+            await asyncio.to_thread(self.on_commit)
+
+    def commit_if_due(self):
+        """Commits the buffered group if its oldest record has waited `max_seconds`."""
+        if self.oldest is not None and time.monotonic() - self.oldest >= self.max_seconds:
+            self.commit()
+
+    async def commit_periodically(self):
+        """Runs until cancelled, committing each group once it is due."""
+        while True:
+            wait = self.max_seconds if self.oldest is None else self.oldest + self.max_seconds - time.monotonic()
+            await asyncio.sleep(max(wait, 0.0))
+            self.commit_if_due()
+
+    def close(self):
+        self.commit()
+        self.f_out.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    async def __aenter__(self):
+        self._timer = asyncio.create_task(self.commit_periodically())
+        if self.on_commit is not None:
+            self._schedule_hook()
+        return self
+
+    async def __aexit__(self, *exc):
+        self._timer.cancel()
+        self.close()
+        if self._hook_task is not None:
+            await self._hook_task
@@ -0,0 +1,161 @@
+import json
+import os
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from clustering import choose_k, fit_kmeans
+
+# ==========================================
+# PERSISTENT CLUSTER STATE
+# ==========================================
+# <dir>/centroids.npy  float32 (k, dim), row i belongs to cluster_ids[i]
+# <dir>/state.json     stable ids, current and last-synthesized membership
+#                      (case keys per cluster) and the fit-time baseline
+STATE_DIR = "cluster_state"
+# Refit once the mean squared distance to the assigned centroid has grown
+# this much (relative) over its value right after the last fit
+DRIFT_THRESHOLD = 0.15
+# Re-synthesize a cluster once this fraction of its membership has changed
+CHANGE_THRESHOLD = 0.10
+
+
+def nearest_centroids(embeddings, centroids):
+    """(index of the nearest centroid, squared distance to it) for every row."""
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    # |x - c|^2 = |x|^2 - 2 x.c + |c|^2, without materializing x - c
+    distances = (
+        np.einsum('ij,ij->i', embeddings, embeddings)[:, None]
+        - 2.0 * embeddings @ centroids.T
+        + np.einsum('ij,ij->i', centroids, centroids)[None, :]
+    )
+    nearest = distances.argmin(axis=1)
+    return nearest, np.maximum(distances[np.arange(len(nearest)), nearest], 0.0)
+
+
+class ClusterState:
+    """
+    Centroids with stable cluster ids. New cases are assigned to the nearest
+    existing centroid; a refit happens only when drift crosses the
+    threshold, and refitted clusters inherit the ids of the old clusters
+    they overlap most. Membership at the last synthesis is kept per cluster
+    so only clusters that changed meaningfully get new Pedia entries.
+    """
+
+    def __init__(self, state_dir=STATE_DIR):
+        self.state_dir = state_dir
+        self.centroids = None
+        self.cluster_ids = []
+        self.members = {}
+        self.synthesized = {}
+        self.baseline_mse = None
+        self.next_id = 0
+        self.drift = 0.0
+        self.refitted = False
+
+    @classmethod
+    def load(cls, state_dir=STATE_DIR):
+        state = cls(state_dir)
+        state_file = os.path.join(state_dir, "state.json")
+        if not os.path.exists(state_file):
+            return state
+        with open(state_file, 'r', encoding='utf-8') as f:
+            saved = json.load(f)
+        state.centroids = np.load(os.path.join(state_dir, "centroids.npy"))
+        state.cluster_ids = saved["cluster_ids"]
+        state.members = {int(k): v for k, v in saved["members"].items()}
+        state.synthesized = {int(k): v for k, v in saved["synthesized"].items()}
+        state.baseline_mse = saved["baseline_mse"]
+        state.next_id = saved["next_id"]
+        return state
+
+    def save(self):
+        os.makedirs(self.state_dir, exist_ok=True)
+        np.save(os.path.join(self.state_dir, "centroids.npy"), self.centroids)
+        state_file = os.path.join(self.state_dir, "state.json")
+        with open(state_file + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump({
+                "cluster_ids": self.cluster_ids,
+                "members": self.members,
+                "synthesized": self.synthesized,
+                "baseline_mse": self.baseline_mse,
+                "next_id": self.next_id,
+            }, f)
+        os.replace(state_file + ".tmp", state_file)
+
+    def update(self, keys, embeddings, n_clusters, minibatch=False):
+        """
+        Assigns every case (identified by `keys`) to a cluster, refitting
+        first if there is no usable state or drift is over the threshold.
+        With n_clusters=None a refit chooses K itself. A fixed-K refit is
+        exact k-means unless `minibatch`.
+        Returns {cluster_id: [row numbers]}.
+        """
+        usable = self.centroids is not None and self.centroids.shape[1] == embeddings.shape[1]
+        if usable:
+            nearest, sq_distances = nearest_centroids(embeddings, self.centroids)
+            self.drift = float(sq_distances.mean()) / self.baseline_mse - 1.0 if self.baseline_mse else 0.0
+        if not usable or self.drift > DRIFT_THRESHOLD:
+            nearest, sq_distances = self._refit(keys, embeddings, n_clusters, minibatch)
+
+        rows_by_cluster = {}
+        for row, index in enumerate(nearest):
+            rows_by_cluster.setdefault(self.cluster_ids[index], []).append(row)
+        self.members = {cid: [keys[row] for row in rows] for cid, rows in rows_by_cluster.items()}
+        return rows_by_cluster
+
+    def _refit(self, keys, embeddings, n_clusters, minibatch=False):
+        if n_clusters is None:
+            n_clusters, _ = choose_k(embeddings)
+            minibatch = True
+        labels, centroids = fit_kmeans(embeddings, n_clusters, minibatch=minibatch)
+
+        # Give each new cluster the id of the old cluster it shares most cases with
+        old_ids = list(self.members)
+        owner = {key: cid for cid, member_keys in self.members.items() for key in member_keys}
+        overlap = np.zeros((n_clusters, len(old_ids)), dtype=np.int64)
+        column = {cid: j for j, cid in enumerate(old_ids)}
+        for key, label in zip(keys, labels):
+            cid = owner.get(key)
+            if cid is not None:
+                overlap[label, column[cid]] += 1
+        cluster_ids = [None] * n_clusters
+        if old_ids:
+            for label, j in zip(*linear_sum_assignment(-overlap)):
+                if overlap[label, j] > 0:
+                    cluster_ids[label] = old_ids[j]
+        for label in range(n_clusters):
+            if cluster_ids[label] is None:
+                cluster_ids[label] = self.next_id
+                self.next_id += 1
+        self.next_id = max([self.next_id] + [cid + 1 for cid in cluster_ids])
+
+        self.centroids = centroids
+        self.cluster_ids = cluster_ids
+        nearest, sq_distances = nearest_centroids(embeddings, centroids)
+        self.baseline_mse = float(sq_distances.mean()) or None
+        self.drift = 0.0
+        self.refitted = True
+        return nearest, sq_distances
+
+    def changed_clusters(self, threshold=CHANGE_THRESHOLD):
+        """Cluster ids whose membership moved by more than `threshold` since their last entry."""
+        changed = []
+        for cid, member_keys in self.members.items():
+            previous = self.synthesized.get(cid)
+            if previous is None:
+                changed.append(cid)
+                continue
+            previous = set(previous)
+            difference = len(previous.symmetric_difference(member_keys))
+            if difference / max(len(previous), 1) > threshold:
+                changed.append(cid)
+        return changed
+
+    def retired_clusters(self):
+        """Ids that had an entry but no longer exist after a refit."""
+        return [cid for cid in self.synthesized if cid not in self.members]
+
+    def mark_synthesized(self, cluster_id):
+        self.synthesized[cluster_id] = list(self.members[cluster_id])
+
+    def forget(self, cluster_id):
+        self.synthesized.pop(cluster_id, None)
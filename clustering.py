@@ -0,0 +1,149 @@
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.metrics import silhouette_score
+
+# ==========================================
+# CLUSTERING ENGINE
+# ==========================================
+# Everything runs on float32. K selection and the taxonomy fit mini-batch
+# k-means, so cost grows with batches seen rather than with n_init full
+# passes over the matrix. Fixed-K clustering keeps the exact k-means fit
+# unless mini-batch is asked for, so its memberships don't change.
+# K is chosen by silhouette on a sample, with candidates fitted in parallel
+# worker processes that memory-map the sample rather than receive a copy.
+BATCH_SIZE = 4096
+N_INIT = 3
+# Restarts of the exact (full-batch) k-means fit
+KMEANS_N_INIT = 10
+SEED = 42
+# Candidate fits for K selection use at most this many points...
+SELECTION_FIT_SAMPLE = 50_000
+# ...and silhouette is scored on at most this many of them
+SILHOUETTE_SAMPLE = 5_000
+MAX_WORKERS = os.cpu_count() or 1
+
+# Default search ranges for the two taxonomy levels
+K_RANGE = range(8, 41, 4)
+CATEGORY_K_RANGE = range(4, 13, 2)
+SUBCLUSTER_K_RANGE = range(2, 9)
+# Categories smaller than this aren't split further
+MIN_SUBCLUSTER_SIZE = 40
+
+
+def as_float32(embeddings):
+    """float32 view of the input, copying only if it isn't float32 already."""
+    return np.asarray(embeddings, dtype=np.float32)
+
+
+def fit_kmeans(embeddings, k, seed=SEED, minibatch=True):
+    """
+    k-means fit, mini-batch or (minibatch=False) exact with KMEANS_N_INIT
+    restarts. Returns (labels, float32 centroids).
+    """
+    embeddings = as_float32(embeddings)
+    if minibatch:
+        model = MiniBatchKMeans(
+            n_clusters=k, batch_size=min(BATCH_SIZE, len(embeddings)), n_init=N_INIT,
+            random_state=seed
+        )
+    else:
+        model = KMeans(n_clusters=k, random_state=seed, n_init=KMEANS_N_INIT)
+    labels = model.fit_predict(embeddings)
+    return labels, model.cluster_centers_.astype(np.float32)
+
+
+def _score_k(sample_file, k, seed):
+    """Worker: fit k on the memory-mapped sample and score a silhouette subsample."""
+    sample = np.load(sample_file, mmap_mode='r')
+    if k >= len(sample):
+        return k, -1.0
+    labels, _ = fit_kmeans(sample, k, seed)
+    if len(set(labels.tolist())) < 2:
+        return k, -1.0
+    score = silhouette_score(
+        sample, labels, sample_size=min(SILHOUETTE_SAMPLE, len(sample)), random_state=seed
+    )
+    return k, float(score)
+
+
+def choose_k(embeddings, k_range=K_RANGE, max_workers=MAX_WORKERS, seed=SEED):
+    """
+    Picks K by silhouette. Each candidate is fitted on a random sample of up
+    to SELECTION_FIT_SAMPLE points and scored on SILHOUETTE_SAMPLE of them;
+    candidates run in parallel. Returns (best k, {k: score}).
+    """
+    embeddings = as_float32(embeddings)
+    rng = np.random.default_rng(seed)
+    if len(embeddings) > SELECTION_FIT_SAMPLE:
+        rows = np.sort(rng.choice(len(embeddings), SELECTION_FIT_SAMPLE, replace=False))
+        sample = embeddings[rows]
+    else:
+        sample = np.ascontiguousarray(embeddings)
+    candidates = [k for k in k_range if 2 <= k < len(sample)] or [min(2, len(sample))]
+
+    with tempfile.TemporaryDirectory(prefix="choose_k_") as tmp:
+        sample_file = os.path.join(tmp, "sample.npy")
+        np.save(sample_file, sample)
+        if max_workers > 1 and len(candidates) > 1:
+            with ProcessPoolExecutor(max_workers=min(max_workers, len(candidates))) as executor:
+                results = list(executor.map(_score_k, [sample_file] * len(candidates), candidates,
+                                            [seed] * len(candidates)))
+        else:
+            results = [_score_k(sample_file, k, seed) for k in candidates]
+
+    scores = dict(results)
+    # Highest silhouette wins; ties go to the smaller K
+    best = max(candidates, key=lambda k: (scores[k], -k))
+    return best, scores
+
+
+def cluster_auto(embeddings, k_range=K_RANGE, max_workers=MAX_WORKERS, seed=SEED):
+    """Chooses K, then fits it on the full matrix. Returns (labels, centroids, scores)."""
+    k, scores = choose_k(embeddings, k_range, max_workers, seed)
+    labels, centroids = fit_kmeans(embeddings, k, seed)
+    return labels, centroids, scores
+
+
+class Taxonomy:
+    """
+    Two-level clustering: broad categories, each split into specific
+    failure modes. `category_labels` and `mode_labels` give both levels per
+    row; mode ids are global, and `mode_parent[mode]` is its category.
+    """
+
+    def __init__(self, category_labels, mode_labels, mode_parent, category_scores):
+        self.category_labels = category_labels
+        self.mode_labels = mode_labels
+        self.mode_parent = mode_parent
+        self.category_scores = category_scores
+
+    def categories(self):
+        return sorted(set(self.mode_parent.values()))
+
+    def modes_of(self, category):
+        return [mode for mode, parent in sorted(self.mode_parent.items()) if parent == category]
+
+
+def build_taxonomy(embeddings, category_k_range=CATEGORY_K_RANGE, subcluster_k_range=SUBCLUSTER_K_RANGE,
+                   max_workers=MAX_WORKERS, seed=SEED):
+    """Clusters into categories, then clusters each large enough category into failure modes."""
+    embeddings = as_float32(embeddings)
+    category_labels, _, category_scores = cluster_auto(embeddings, category_k_range, max_workers, seed)
+
+    mode_labels = np.empty(len(embeddings), dtype=np.int64)
+    mode_parent = {}
+    next_mode = 0
+    for category in np.unique(category_labels):
+        rows = np.flatnonzero(category_labels == category)
+        if len(rows) < MIN_SUBCLUSTER_SIZE:
+            sub_labels = np.zeros(len(rows), dtype=np.int64)
+        else:
+            sub_labels, _, _ = cluster_auto(embeddings[rows], subcluster_k_range, max_workers, seed)
+        for sub in np.unique(sub_labels):
+            mode_labels[rows[sub_labels == sub]] = next_mode
+            mode_parent[next_mode] = int(category)
+            next_mode += 1
+    return Taxonomy(category_labels, mode_labels, mode_parent, category_scores)
@@ -0,0 +1,137 @@
+import heapq
+from array import array
+
+# ==========================================
+# COMPACT COMMENT STORAGE
+# ==========================================
+class StringPool:
+    """Interns repeated strings (comment authors) as small integer ids."""
+    __slots__ = ("ids", "strings")
+
+    def __init__(self):
+        self.ids = {}
+        self.strings = []
+
+    def intern(self, value):
+        string_id = self.ids.get(value)
+        if string_id is None:
+            string_id = len(self.strings)
+            self.ids[value] = string_id
+            self.strings.append(value)
+        return string_id
+
+    def __getitem__(self, string_id):
+        return self.strings[string_id]
+
+    def __len__(self):
+        return len(self.strings)
+
+
+class CommentTree:
+    """
+    Array-backed comments of one post. Level, score, parent index and author
+    id live in typed arrays, text in a plain list, and authors in a pool
+    shared across posts. Parent/child links are built once at construction:
+    a comment's parent is the nearest earlier comment with a lower level.
+    Children are stored in CSR form, best score first.
+    """
+    __slots__ = ("levels", "scores", "parents", "author_ids", "texts", "pool",
+                 "child_offsets", "children")
+
+    def __init__(self, pool=None):
+        self.levels = array('i')
+        self.scores = array('q')
+        self.parents = array('i')
+        self.author_ids = array('i')
+        self.texts = []
+        self.pool = pool if pool is not None else StringPool()
+        self.child_offsets = None
+        self.children = None
+
+    @classmethod
+    def from_comments(cls, comments, pool=None):
+        """Builds a tree from the parser's flat list of comment dicts."""
+        tree = cls(pool)
+        stack = []  # Indices of the open ancestors, innermost last
+        for comment in comments:
+            level = comment.get('level', 0)
+            while stack and tree.levels[stack[-1]] >= level:
+                stack.pop()
+            index = len(tree.texts)
+            tree.levels.append(level)
+            tree.scores.append(comment.get('score', 0))
+            tree.parents.append(stack[-1] if stack else -1)
+            tree.author_ids.append(tree.pool.intern(comment.get('author', 'Unknown')))
+            tree.texts.append(comment.get('text', ''))
+            stack.append(index)
+        tree._link()
+        return tree
+
+    def _link(self):
+        """CSR child lists; slot 0 holds the roots (parent -1)."""
+        count = len(self.texts)
+        buckets = [[] for _ in range(count + 1)]
+        for index, parent in enumerate(self.parents):
+            buckets[parent + 1].append(index)
+        scores = self.scores
+        self.child_offsets = array('i', [0])
+        self.children = array('i')
+        for bucket in buckets:
+            if len(bucket) > 1:
+                bucket.sort(key=scores.__getitem__, reverse=True)
+            self.children.extend(bucket)
+            self.child_offsets.append(len(self.children))
+
+    def __len__(self):
+        return len(self.texts)
+
+    def children_of(self, index):
+        """Child indices of a comment (-1 for the roots), best score first."""
+        return self.children[self.child_offsets[index + 1]:self.child_offsets[index + 2]]
+
+    def comment(self, index):
+        return {
+            "level": self.levels[index],
+            "score": self.scores[index],
+            "author": self.pool[self.author_ids[index]],
+            "text": self.texts[index],
+        }
+
+    def to_dicts(self):
+        """The parser's original flat list of comment dicts."""
+        return [self.comment(index) for index in range(len(self.texts))]
+
+    def top_indices(self, k):
+        """
+        The k highest-scored comments, ties in document order. Same result
+        as sorting the flat list by score and slicing, without a full sort.
+        """
+        return heapq.nlargest(k, range(len(self.texts)), key=self.scores.__getitem__)
+
+    def walk_best(self, k):
+        """
+        Best-first walk of up to k comments. The highest-scored comment on
+        the frontier is taken next, and its children join the frontier, so
+        every comment is preceded by its parent and strong subtrees are
+        explored before weak ones.
+        """
+        scores = self.scores
+        # Entries are (-score, order, index); order keeps ties stable
+        frontier = [(-scores[index], order, index) for order, index in enumerate(self.children_of(-1))]
+        heapq.heapify(frontier)
+        order = len(frontier)
+        picked = []
+        while frontier and len(picked) < k:
+            _, _, index = heapq.heappop(frontier)
+            picked.append(index)
+            for child in self.children_of(index):
+                heapq.heappush(frontier, (-scores[child], order, child))
+                order += 1
+        return picked
+
+
+def encode_json(obj):
+    """`default=` hook for json.dump so posts holding a CommentTree serialize."""
+    if isinstance(obj, CommentTree):
+        return obj.to_dicts()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
@@ -0,0 +1,213 @@
+import json
+import re
+from collections import Counter
+import numpy as np
+from rate_limiter import estimate_tokens
+
+# ==========================================
+# PEDIA CONTEXT BUILDER
+# ==========================================
+# The source data for an entry is packed to a fixed token budget whatever
+# the cluster size: a sampled summary of the whole cluster first, then
+# representative cases, most central first and diversified with MMR, until
+# the budget is spent.
+CONTEXT_TOKEN_BUDGET = 2500
+# MMR trade-off: 1.0 ranks purely by closeness to the centroid, lower
+# values favour cases unlike the ones already picked
+MMR_LAMBDA = 0.7
+# MMR only considers this many of the most central cases
+CANDIDATE_POOL = 200
+MAX_REPRESENTATIVES = 40
+# Longer field values are cut to this many characters
+MAX_FIELD_CHARS = 400
+# Clusters bigger than this also get a distribution summary...
+SUMMARY_MIN_CASES = 25
+# ...computed over at most this many sampled cases
+SUMMARY_SAMPLE = 1000
+SUMMARY_TERMS = 12
+SEED = 42
+
+# Case field -> context list it feeds, in the order the prompt has always used
+CONTEXT_FIELDS = {
+    "trigger_event": "common_triggers",
+    "fatal_mistake": "common_fatal_mistakes",
+    "escalation_timeline": "escalation_patterns",
+    "financial_cost": "financial_examples",
+    "brutal_reality_quote": "operator_quotes",
+}
+# Hard-signal fields and what filling each in is worth
+SIGNAL_FIELDS = {
+    "financial_cost": 4,
+    "fatal_mistake": 4,
+    "escalation_timeline": 3,
+    "brutal_reality_quote": 2,
+}
+# Field completeness only breaks near-ties in closeness to the centroid
+SIGNAL_WEIGHT = 0.05
+MAX_SIGNAL = sum(SIGNAL_FIELDS.values())
+
+MONEY_PATTERN = re.compile(r"\$\s?(\d[\d,]*(?:\.\d+)?)\s*([kKmM])?\b")
+WORD_PATTERN = re.compile(r"[a-z][a-z']{2,}")
+STOPWORDS = frozenset(
+    "the and for that with was were this from have has had not but they their them then than "
+    "into out over after before when while who what which would could should about there been "
+    "being are his her him she you your our its it's did didn't don't does any all can just "
+    "also only more most very such some because without".split()
+)
+
+
+def score_case(item):
+    """How many of the hard-signal fields a case fills in, weighted."""
+    return sum(weight for field, weight in SIGNAL_FIELDS.items() if item.get(field))
+
+
+def score_columns(nonempty):
+    """score_case for whole columns: `nonempty` maps each signal field to a bool array."""
+    return sum(weight * np.asarray(nonempty[field], dtype=np.float32) for field, weight in SIGNAL_FIELDS.items())
+
+
+def mmr_order(embeddings, bonus=None, lambda_=MMR_LAMBDA, pool=CANDIDATE_POOL, limit=MAX_REPRESENTATIVES):
+    """
+    Row order for representatives: the case closest to the cluster centroid,
+    then repeatedly the case that best balances closeness to the centroid
+    against similarity to the cases already chosen (maximal marginal
+    relevance). Cosine similarity throughout; `bonus` is added to relevance.
+    """
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = vectors / np.maximum(norms, 1e-12)
+    centroid = vectors.mean(axis=0)
+    centroid /= max(float(np.linalg.norm(centroid)), 1e-12)
+
+    relevance = vectors @ centroid
+    if bonus is not None:
+        relevance = relevance + bonus
+    if len(relevance) > pool:
+        candidates = np.argpartition(-relevance, pool - 1)[:pool]
+    else:
+        candidates = np.arange(len(relevance))
+    candidates = candidates[np.argsort(-relevance[candidates], kind='stable')]
+
+    pool_vectors = vectors[candidates]
+    pool_relevance = relevance[candidates]
+    # Highest similarity of each candidate to anything already chosen
+    redundancy = np.full(len(candidates), -np.inf, dtype=np.float32)
+    available = np.ones(len(candidates), dtype=bool)
+    order = []
+    for _ in range(min(limit, len(candidates))):
+        if order:
+            score = lambda_ * pool_relevance - (1.0 - lambda_) * redundancy
+        else:
+            score = pool_relevance.copy()
+        score[~available] = -np.inf
+        pick = int(score.argmax())
+        order.append(int(candidates[pick]))
+        available[pick] = False
+        redundancy = np.maximum(redundancy, pool_vectors @ pool_vectors[pick])
+    return order
+
+
+def parse_amounts(text):
+    """Dollar amounts mentioned in free text, e.g. "$4,500" or "$12k"."""
+    amounts = []
+    for number, suffix in MONEY_PATTERN.findall(text):
+        value = float(number.replace(",", ""))
+        if suffix in ("k", "K"):
+            value *= 1_000
+        elif suffix in ("m", "M"):
+            value *= 1_000_000
+        amounts.append(value)
+    return amounts
+
+
+def distribution_summary(items, sample_size=SUMMARY_SAMPLE, seed=SEED):
+    """
+    Compact statistics over a random sample of the cluster: how often each
+    field is filled in, the spread of dollar amounts, and the terms that
+    recur across triggers and mistakes (with the share of cases using them).
+    """
+    if len(items) > sample_size:
+        rows = np.random.default_rng(seed).choice(len(items), sample_size, replace=False)
+        sample = [items[row] for row in np.sort(rows)]
+    else:
+        sample = items
+
+    coverage = {
+        field: round(sum(1 for item in sample if item.get(field)) / len(sample), 2)
+        for field in CONTEXT_FIELDS
+    }
+    summary = {"sampled_cases": len(sample), "field_coverage": coverage}
+
+    amounts = []
+    cases_with_amount = 0
+    for item in sample:
+        found = parse_amounts(str(item.get("financial_cost") or ""))
+        if found:
+            amounts.extend(found)
+            cases_with_amount += 1
+    if amounts:
+        values = np.array(amounts)
+        summary["financial_cost_usd"] = {
+            "cases_with_amount": cases_with_amount,
+            "median": round(float(np.median(values))),
+            "p90": round(float(np.percentile(values, 90))),
+            "max": round(float(values.max())),
+        }
+
+    term_cases = Counter()
+    for item in sample:
+        text = f"{item.get('trigger_event') or ''} {item.get('fatal_mistake') or ''}".lower()
+        term_cases.update(set(WORD_PATTERN.findall(text)) - STOPWORDS)
+    summary["recurring_terms"] = {
+        term: round(count / len(sample), 2) for term, count in term_cases.most_common(SUMMARY_TERMS)
+    }
+    return summary
+
+
+def clip(value):
+    text = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+    return text if len(text) <= MAX_FIELD_CHARS else text[:MAX_FIELD_CHARS - 3] + "..."
+
+
+def build_context(cluster_id, items, embeddings=None, extra=None, token_budget=CONTEXT_TOKEN_BUDGET, signal=None):
+    """
+    The SOURCE DATA packet for one entry, at most about `token_budget`
+    tokens as JSON. `embeddings` are the cases' vectors in item order;
+    without them representatives are taken by field completeness.
+    `extra` fields (e.g. failure_modes) go in before any case. `signal`
+    (score_case per item, e.g. from score_columns) saves scoring every item,
+    so only the sampled and chosen items are ever read.
+    """
+    context = {"cluster_id": cluster_id, "case_count": len(items)}
+    if len(items) > SUMMARY_MIN_CASES:
+        context["distribution"] = distribution_summary(items, seed=SEED + int(cluster_id))
+    if extra:
+        context.update(extra)
+    for key in CONTEXT_FIELDS.values():
+        context[key] = []
+
+    if signal is None:
+        signal = np.array([score_case(item) for item in items], dtype=np.float32)
+    signal = np.asarray(signal, dtype=np.float32)
+    if embeddings is not None and len(embeddings) == len(items) and len(items):
+        order = mmr_order(embeddings, bonus=SIGNAL_WEIGHT * signal / MAX_SIGNAL)
+    else:
+        order = [int(row) for row in np.argsort(-signal, kind='stable')[:MAX_REPRESENTATIVES]]
+
+    used = estimate_tokens(json.dumps(context, indent=2))
+    representatives = 0
+    for row in order:
+        item = items[row]
+        additions = [(key, clip(item[field])) for field, key in CONTEXT_FIELDS.items() if item.get(field)]
+        if not additions:
+            continue
+        # Each value costs its text plus quoting, indentation and a comma
+        cost = sum(estimate_tokens(value) + 3 for _, value in additions)
+        if used + cost > token_budget:
+            break
+        for key, value in additions:
+            context[key].append(value)
+        used += cost
+        representatives += 1
+    context["representative_cases"] = representatives
+    return context
@@ -0,0 +1,216 @@
+import re
+import json
+import time
+import zlib
+import argparse
+from collections import defaultdict
+import numpy as np
+from parse import iter_posts
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+INPUT_FILE = "all_rental_data.json"
+OUTPUT_FILE = "deduped_rental_data.jsonl"
+
+# MinHash / LSH tuning. With 32 bands of 4 rows, pairs above ~0.42 Jaccard
+# are likely to share a bucket; candidates are then checked against
+# SIMILARITY_THRESHOLD using the full signatures.
+NUM_PERMUTATIONS = 128
+NUM_BANDS = 32
+SHINGLE_WORDS = 3
+SIMILARITY_THRESHOLD = 0.8
+SEED = 42
+# ==========================================
+
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+word_pattern = re.compile(r"\w+")
+
+
+def shingle_hashes(text):
+    """32-bit hashes of the word n-grams of a text (lower-cased)."""
+    words = word_pattern.findall(text.lower())
+    if not words:
+        return np.empty(0, dtype=np.uint64)
+    if len(words) <= SHINGLE_WORDS:
+        grams = [" ".join(words)]
+    else:
+        grams = [" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)]
+    return np.unique(np.fromiter((zlib.crc32(g.encode('utf-8')) for g in grams), dtype=np.uint64, count=len(grams)))
+
+
+class MinHasher:
+    """Vectorized MinHash over universal hash functions (a*x + b) mod p."""
+
+    def __init__(self, num_permutations=NUM_PERMUTATIONS, seed=SEED):
+        rng = np.random.default_rng(seed)
+        # a, b < 2^32 keep a*x + b inside uint64 for 32-bit shingle hashes
+        self.a = rng.integers(1, 1 << 32, size=num_permutations, dtype=np.uint64)
+        self.b = rng.integers(0, 1 << 32, size=num_permutations, dtype=np.uint64)
+
+    def signature(self, hashes):
+        """MinHash signature, or None when the text has no words."""
+        if hashes.size == 0:
+            return None
+        permuted = (np.outer(hashes, self.a) + self.b) % MERSENNE_PRIME & MAX_HASH
+        return permuted.min(axis=0).astype(np.uint32)
+
+
+class UnionFind:
+    def __init__(self):
+        self.parent = []
+
+    def add(self):
+        self.parent.append(len(self.parent))
+
+    def find(self, i):
+        parent = self.parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(self, i, j):
+        root_i, root_j = self.find(i), self.find(j)
+        if root_i != root_j:
+            self.parent[max(root_i, root_j)] = min(root_i, root_j)
+
+
+def post_text(post):
+    return f"{post.get('title', '')}\n{post.get('body', '')}"
+
+
+class DuplicateIndex:
+    """
+    Incremental LSH index. Each added post is signed and linked to any
+    earlier near-duplicate through the band buckets; a bucket member is
+    verified only against the bucket's first member, so the cost grows with
+    the number of posts, not the number of pairs.
+    """
+
+    def __init__(self, threshold=SIMILARITY_THRESHOLD, num_bands=NUM_BANDS):
+        self.threshold = threshold
+        self.hasher = MinHasher()
+        self.rows = NUM_PERMUTATIONS // num_bands
+        self.buckets = [dict() for _ in range(num_bands)]
+        self.signatures = []
+        self.groups = UnionFind()
+
+    def __len__(self):
+        return len(self.signatures)
+
+    def add(self, post):
+        """Indexes the post. Returns its group root: its own index unless it duplicates an earlier post."""
+        index = len(self.signatures)
+        groups = self.groups
+        groups.add()
+        signature = self.hasher.signature(shingle_hashes(post_text(post)))
+        self.signatures.append(signature)
+        if signature is None:
+            return index
+        for band, table in enumerate(self.buckets):
+            key = signature[band * self.rows:(band + 1) * self.rows].tobytes()
+            first = table.setdefault(key, index)
+            if first == index or groups.find(first) == groups.find(index):
+                continue
+            if np.mean(self.signatures[first] == signature) >= self.threshold:
+                groups.union(first, index)
+        return groups.find(index)
+
+    def roots(self):
+        return [self.groups.find(i) for i in range(len(self.signatures))]
+
+
+def find_duplicate_groups(posts, threshold=SIMILARITY_THRESHOLD, num_bands=NUM_BANDS):
+    """
+    Pass 1. Signs every post and links near-duplicates through LSH buckets.
+    Returns (group root per post index, number of posts).
+    """
+    index = DuplicateIndex(threshold, num_bands)
+    for post in posts:
+        index.add(post)
+    return index.roots(), len(index)
+
+
+def merge_group(posts):
+    """
+    Collapses duplicate posts into the highest-scored one (earliest on ties).
+    Comments from the others are appended unless the same author already
+    said the same thing; their URLs are kept in `duplicate_urls`.
+    """
+    canonical = max(posts, key=lambda p: p.get('score', 0))
+    merged = dict(canonical)
+    comments = list(canonical.get('comments', []))
+    seen = {(c.get('author'), c.get('text')) for c in comments}
+    for post in posts:
+        if post is canonical:
+            continue
+        for comment in post.get('comments', []):
+            key = (comment.get('author'), comment.get('text'))
+            if key not in seen:
+                seen.add(key)
+                comments.append(comment)
+    merged['comments'] = comments
+    merged['duplicate_urls'] = [p.get('url') for p in posts if p is not canonical]
+    return merged
+
+
+def iter_deduped(posts, roots):
+    """
+    Pass 2. Yields the posts in order with each duplicate group collapsed
+    by merge_group: unique posts go straight through and a group is held
+    until its last member arrives.
+    """
+    last_member = {}
+    sizes = defaultdict(int)
+    for index, root in enumerate(roots):
+        last_member[root] = index
+        sizes[root] += 1
+
+    pending = defaultdict(list)
+    for index, post in enumerate(posts):
+        root = roots[index]
+        if sizes[root] == 1:
+            yield post
+            continue
+        pending[root].append(post)
+        if last_member[root] == index:
+            yield merge_group(pending.pop(root))
+
+
+def write_deduped(input_file, output_file, roots):
+    """Streams the posts again through iter_deduped into output_file."""
+    written = 0
+    with open(output_file, 'w', encoding='utf-8') as f_out:
+        for record in iter_deduped(iter_posts(input_file), roots):
+            f_out.write(json.dumps(record))
+            f_out.write('\n')
+            written += 1
+    sizes = defaultdict(int)
+    for root in roots:
+        sizes[root] += 1
+    return written, sum(1 for size in sizes.values() if size > 1)
+
+
+def main(input_file=INPUT_FILE, output_file=OUTPUT_FILE, threshold=SIMILARITY_THRESHOLD):
+    started = time.perf_counter()
+    print(f"Signing posts in {input_file}...")
+    roots, total = find_duplicate_groups(iter_posts(input_file), threshold)
+
+    print(f"Writing canonical threads to {output_file}...")
+    written, merged_groups = write_deduped(input_file, output_file, roots)
+
+    saved = total - written
+    print(f"\nSUCCESS: {total} posts -> {written} threads in {time.perf_counter() - started:.1f}s")
+    print(f"  -> {merged_groups} duplicate groups collapsed, {saved} LLM calls saved ({saved / max(total, 1):.1%})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Collapse near-duplicate threads before extraction.")
+    parser.add_argument("--input", default=INPUT_FILE, help="Parsed posts (.json array or .jsonl)")
+    parser.add_argument("--output", default=OUTPUT_FILE, help="Deduplicated posts (.jsonl)")
+    parser.add_argument("--threshold", type=float, default=SIMILARITY_THRESHOLD,
+                        help="Estimated Jaccard similarity at which two posts are duplicates")
+    args = parser.parse_args()
+    main(args.input, args.output, args.threshold)
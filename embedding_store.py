@@ -0,0 +1,110 @@
+import hashlib
+import json
+import os
+import numpy as np
+
+# ==========================================
+# PERSISTENT EMBEDDING STORE
+# ==========================================
+# Three files share a path prefix:
+#   <prefix>.f32   row-major float32 matrix, one row per embedded text
+#   <prefix>.keys  one key per line; line i names row i
+#   <prefix>.json  {"dim": ...}
+# Rows are only ever appended, and the matrix is written before its keys,
+# so a crash can leave at most unnamed trailing rows, which are cut on open.
+STORE_PREFIX = "embedding_store"
+DTYPE = np.float32
+
+
+def make_embedding_key(model, task_type, text):
+    payload = json.dumps([model, task_type, text], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class EmbeddingStore:
+    """
+    Append-only float32 embedding matrix, memory-mapped for reading and
+    addressed by make_embedding_key. Lookups return row numbers; `rows()`
+    returns the matching matrix view, without copying when the rows are a
+    contiguous run (the usual case when cases are embedded in file order).
+    """
+
+    def __init__(self, prefix=STORE_PREFIX):
+        self.matrix_file = prefix + ".f32"
+        self.keys_file = prefix + ".keys"
+        self.meta_file = prefix + ".json"
+        self.dim = None
+        self.keys = []
+        self.index = {}
+        self._matrix = None
+
+        if os.path.exists(self.meta_file):
+            with open(self.meta_file, 'r', encoding='utf-8') as f:
+                self.dim = json.load(f)["dim"]
+        if self.dim is not None and os.path.exists(self.keys_file):
+            with open(self.keys_file, 'r', encoding='utf-8') as f:
+                keys = f.read().split('\n')[:-1]
+            row_bytes = self.dim * np.dtype(DTYPE).itemsize
+            matrix_rows = os.path.getsize(self.matrix_file) // row_bytes if os.path.exists(self.matrix_file) else 0
+            count = min(len(keys), matrix_rows)
+            if count != len(keys):
+                # Keys without their row: the matrix write didn't finish
+                with open(self.keys_file, 'w', encoding='utf-8') as f:
+                    f.write("".join(f"{key}\n" for key in keys[:count]))
+            if os.path.exists(self.matrix_file) and os.path.getsize(self.matrix_file) != count * row_bytes:
+                with open(self.matrix_file, 'r+b') as f:
+                    f.truncate(count * row_bytes)
+            self.keys = keys[:count]
+            self.index = {key: row for row, key in enumerate(self.keys)}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def lookup(self, keys):
+        """Row number per key, -1 where the key isn't stored."""
+        return np.fromiter((self.index.get(key, -1) for key in keys), dtype=np.int64, count=len(keys))
+
+    def add(self, keys, vectors):
+        """Appends new rows. Keys already stored are skipped."""
+        vectors = np.asarray(vectors, dtype=DTYPE)
+        if vectors.ndim != 2 or len(vectors) != len(keys):
+            raise ValueError(f"Expected {len(keys)} vectors, got array of shape {vectors.shape}")
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+            with open(self.meta_file, 'w', encoding='utf-8') as f:
+                json.dump({"dim": self.dim}, f)
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Store holds {self.dim}-d vectors, got {vectors.shape[1]}-d")
+
+        fresh = [i for i, key in enumerate(keys) if key not in self.index]
+        if not fresh:
+            return
+        with open(self.matrix_file, 'ab') as f:
+            f.write(vectors[fresh].tobytes())
+        with open(self.keys_file, 'a', encoding='utf-8') as f:
+            f.write("".join(f"{keys[i]}\n" for i in fresh))
+        for i in fresh:
+            self.index[keys[i]] = len(self.keys)
+            self.keys.append(keys[i])
+        self._matrix = None
+
+    def matrix(self):
+        """The whole store as a read-only memory-mapped (rows, dim) float32 array."""
+        if not self.keys:
+            return np.empty((0, self.dim or 0), dtype=DTYPE)
+        if self._matrix is None or len(self._matrix) != len(self.keys):
+            self._matrix = np.memmap(self.matrix_file, dtype=DTYPE, mode='r', shape=(len(self.keys), self.dim))
+        return self._matrix
+
+    def rows(self, row_numbers):
+        """Matrix rows in the given order: a zero-copy slice if they are consecutive."""
+        row_numbers = np.asarray(row_numbers, dtype=np.int64)
+        matrix = self.matrix()
+        if len(row_numbers) and (row_numbers >= 0).all():
+            start = row_numbers[0]
+            if np.array_equal(row_numbers, np.arange(start, start + len(row_numbers))):
+                return matrix[start:start + len(row_numbers)]
+        return matrix[row_numbers]
@@ -0,0 +1,151 @@
+import asyncio
+import json
+import time
+from rate_limiter import is_rate_limit_error
+from llm_backend import SafetyBlockError
+
+# ==========================================
+# FAILURE JOURNAL
+# ==========================================
+JOURNAL_FILE = "extraction_failures.jsonl"
+MAX_MESSAGE_CHARS = 500
+
+# How often and how patiently each class of failure is retried. The wait
+# before attempt n+1 is backoff * 2**(n-1) seconds after the n-th failure.
+RETRY_POLICIES = {
+    "rate_limit": {"max_attempts": 8, "backoff": 30.0},
+    "timeout": {"max_attempts": 5, "backoff": 10.0},
+    "server_error": {"max_attempts": 5, "backoff": 10.0},
+    "invalid_json": {"max_attempts": 3, "backoff": 0.0},
+    # Blocked content comes back blocked; it is journaled but never retried
+    "safety_block": {"max_attempts": 1, "backoff": 0.0},
+    "other": {"max_attempts": 3, "backoff": 60.0},
+}
+
+
+def error_code(exc):
+    """HTTP status the exception carries (`code` or `status_code`), else None."""
+    for attribute in ("code", "status_code"):
+        code = getattr(exc, attribute, None)
+        if isinstance(code, int):
+            return code
+    return None
+
+
+def classify_error(exc):
+    """
+    Maps an exception from an LLM call to one of the RETRY_POLICIES classes,
+    judged by its type and the status it carries, never by its message: a
+    transient error whose text happens to say "blocked" must stay retryable.
+    """
+    if is_rate_limit_error(exc):
+        return "rate_limit"
+    if isinstance(exc, json.JSONDecodeError):
+        return "invalid_json"
+    if isinstance(exc, (asyncio.TimeoutError, TimeoutError)):
+        return "timeout"
+    name = type(exc).__name__
+    code = error_code(exc)
+    # google.genai errors also carry the RPC status name
+    status = getattr(exc, "status", None)
+    if isinstance(exc, SafetyBlockError) or name in ("BlockedPromptException", "StopCandidateException"):
+        return "safety_block"
+    if name == "DeadlineExceeded" or code == 504 or status == "DEADLINE_EXCEEDED":
+        return "timeout"
+    if (code is not None and 500 <= code < 600) or status in ("INTERNAL", "UNAVAILABLE") \
+            or name in ("InternalServerError", "ServiceUnavailable"):
+        return "server_error"
+    return "other"
+
+
+class FailureJournal:
+    """
+    Append-only JSONL of failed items. Each failure line records the key,
+    error class, message, attempt number and latency; a later line with
+    "resolved": true clears the key. Loading folds the lines into the
+    current state per key, so the journal tells which items are still
+    failing, why, and when each may be retried under its class policy.
+    """
+
+    def __init__(self, path=JOURNAL_FILE, policies=RETRY_POLICIES):
+        self.path = path
+        self.policies = policies
+        self.pending = {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self._apply(entry)
+        except FileNotFoundError:
+            pass
+        self.f_out = open(path, 'a', encoding='utf-8')
+
+    def _apply(self, entry):
+        if entry.get("resolved"):
+            self.pending.pop(entry["key"], None)
+        else:
+            self.pending[entry["key"]] = entry
+
+    def _append(self, entry):
+        self.f_out.write(json.dumps(entry))
+        self.f_out.write('\n')
+        self.f_out.flush()
+        self._apply(entry)
+
+    def record_failure(self, key, exc, latency):
+        previous = self.pending.get(key)
+        error_class = classify_error(exc)
+        self._append({
+            "key": key,
+            "error_class": error_class,
+            "error_type": type(exc).__name__,
+            "error": str(exc)[:MAX_MESSAGE_CHARS],
+            "attempt": previous["attempt"] + 1 if previous else 1,
+            "latency_s": round(latency, 3),
+            "time": time.time(),
+        })
+        return error_class
+
+    def record_success(self, key):
+        if key in self.pending:
+            self._append({"key": key, "resolved": True, "time": time.time()})
+
+    def policy(self, entry):
+        return self.policies.get(entry["error_class"], self.policies["other"])
+
+    def retry_at(self, entry):
+        """When the key may be retried, or None once its class policy is exhausted."""
+        policy = self.policy(entry)
+        if entry["attempt"] >= policy["max_attempts"]:
+            return None
+        return entry["time"] + policy["backoff"] * 2 ** (entry["attempt"] - 1)
+
+    def due(self, now=None):
+        """Keys whose backoff has elapsed."""
+        now = time.time() if now is None else now
+        return {
+            key for key, entry in self.pending.items()
+            if (at := self.retry_at(entry)) is not None and at <= now
+        }
+
+    def next_retry_at(self):
+        times = [at for entry in self.pending.values() if (at := self.retry_at(entry)) is not None]
+        return min(times) if times else None
+
+    def exhausted(self):
+        return {key for key, entry in self.pending.items() if self.retry_at(entry) is None}
+
+    def summary(self):
+        counts = {}
+        for entry in self.pending.values():
+            counts[entry["error_class"]] = counts.get(entry["error_class"], 0) + 1
+        if not counts:
+            return "no outstanding failures"
+        by_class = ", ".join(f"{name} {count}" for name, count in sorted(counts.items()))
+        return f"{len(self.pending)} outstanding ({by_class}); {len(self.exhausted())} out of retries"
+
+    def close(self):
+        self.f_out.close()
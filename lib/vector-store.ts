@@ -1,10 +1,20 @@
-
 import fs from 'fs';
 import path from 'path';
 import { google } from '@ai-sdk/google';
 import { embed } from 'ai';
 
+// Binary index exported by synthesizer.py (see vector_index.py): unit-length
+// float32 rows (optionally int8 + per-row scales) and a JSON sidecar.
+const INDEX_PREFIX = path.join(process.cwd(), 'data', 'vector_index');
+// Legacy pretty-printed store from scripts/generate-embeddings.ts, used only
+// when no binary index has been exported
 const VECTOR_STORE_PATH = path.join(process.cwd(), 'data', 'vector_store.json');
+// Set VECTOR_INDEX_PRECISION=int8 to search the quantized copy (4x less memory)
+const PRECISION = process.env.VECTOR_INDEX_PRECISION === 'int8' ? 'int8' : 'f32';
+// What the legacy store was embedded with; the binary index records its own
+const DEFAULT_EMBEDDING_MODEL = 'text-embedding-004';
+// Queries against a RETRIEVAL_DOCUMENT index from a sidecar that predates query_task_type
+const DEFAULT_QUERY_TASK_TYPE = 'RETRIEVAL_QUERY';
 
 export interface PediaEntry {
     title: string;
@@ -18,78 +28,181 @@ export interface PediaEntry {
     [key: string]: any;
 }
 
+export type RecordKind = 'entry' | 'case';
+
 interface VectorEntry {
     id: string;
+    kind: RecordKind;
     content: string;
-    embedding: number[];
     metadata: PediaEntry;
 }
 
-// Simple cosine similarity
-function cosineSimilarity(a: number[], b: number[]) {
-    if (a.length !== b.length) return 0;
-    let dotProduct = 0;
-    let magnitudeA = 0;
-    let magnitudeB = 0;
-    for (let i = 0; i < a.length; i++) {
-        dotProduct += a[i] * b[i];
-        magnitudeA += a[i] * a[i];
-        magnitudeB += b[i] * b[i];
+interface IndexFile {
+    path: string;
+    bytes: number;
+}
+
+interface IndexSidecar {
+    version: number;
+    dim: number;
+    count: number;
+    normalized: boolean;
+    embedding_model?: string | null;
+    task_type?: string | null;
+    query_task_type?: string | null;
+    files: { f32: IndexFile; i8?: IndexFile; scale?: IndexFile };
+    records: { id: string; kind: RecordKind; content?: string; metadata: PediaEntry }[];
+}
+
+type QueryTaskType = 'RETRIEVAL_QUERY' | 'SEMANTIC_SIMILARITY' | 'CLASSIFICATION' | 'CLUSTERING' |
+    'QUESTION_ANSWERING' | 'FACT_VERIFICATION';
+
+interface LoadedIndex {
+    dim: number;
+    // Queries must be embedded the way the index expects to be searched
+    embeddingModel: string;
+    queryTaskType?: QueryTaskType;
+    entries: VectorEntry[];
+    // Row-major, every row unit length: similarity is a dot product
+    vectors: Float32Array | Int8Array;
+    // Per-row dequantization scales when vectors is int8
+    scales: Float32Array | null;
+}
+
+const EMPTY_INDEX: LoadedIndex = {
+    dim: 0, embeddingModel: DEFAULT_EMBEDDING_MODEL, entries: [], vectors: new Float32Array(0), scales: null,
+};
+
+let indexCache: LoadedIndex | null = null;
+
+// Typed-array view of a file; copies only if Node handed back an unaligned buffer
+function readTyped<T>(file: string, bytesPerElement: number, make: (buffer: ArrayBuffer, offset: number, length: number) => T): T {
+    let buffer = fs.readFileSync(file);
+    if (buffer.byteOffset % bytesPerElement !== 0) {
+        buffer = Buffer.from(buffer);
     }
-    const mag = Math.sqrt(magnitudeA) * Math.sqrt(magnitudeB);
-    return mag === 0 ? 0 : dotProduct / mag;
+    return make(buffer.buffer as ArrayBuffer, buffer.byteOffset, buffer.byteLength / bytesPerElement);
 }
 
-let vectorStoreCache: VectorEntry[] | null = null;
-let lastLoadTime = 0;
+function loadBinaryIndex(): LoadedIndex | null {
+    const sidecarPath = `${INDEX_PREFIX}.json`;
+    if (!fs.existsSync(sidecarPath)) return null;
+
+    const sidecar: IndexSidecar = JSON.parse(fs.readFileSync(sidecarPath, 'utf-8'));
+    const dir = path.dirname(INDEX_PREFIX);
+    const useInt8 = PRECISION === 'int8' && sidecar.files.i8 && sidecar.files.scale;
+    const matrixFile = useInt8 ? sidecar.files.i8! : sidecar.files.f32;
+    const matrixPath = path.join(dir, matrixFile.path);
+    if (!fs.existsSync(matrixPath) || fs.statSync(matrixPath).size !== matrixFile.bytes) {
+        console.warn(`Vector index ${matrixPath} does not match its sidecar; re-run the synthesizer export.`);
+        return null;
+    }
+
+    const vectors = useInt8
+        ? readTyped(matrixPath, 1, (b, o, n) => new Int8Array(b, o, n))
+        : readTyped(matrixPath, 4, (b, o, n) => new Float32Array(b, o, n));
+    const scales = useInt8
+        ? readTyped(path.join(dir, sidecar.files.scale!.path), 4, (b, o, n) => new Float32Array(b, o, n))
+        : null;
+    const entries = sidecar.records.map(record => ({
+        id: record.id,
+        kind: record.kind,
+        content: record.content || '',
+        metadata: record.metadata,
+    }));
+    const queryTaskType = sidecar.query_task_type
+        || (sidecar.task_type === 'RETRIEVAL_DOCUMENT' ? DEFAULT_QUERY_TASK_TYPE : undefined);
+    return {
+        dim: sidecar.dim,
+        embeddingModel: sidecar.embedding_model || DEFAULT_EMBEDDING_MODEL,
+        queryTaskType: queryTaskType as QueryTaskType | undefined,
+        entries,
+        vectors,
+        scales,
+    };
+}
 
-function getVectorStore(): VectorEntry[] {
-    // Check if file has changed since last load (reload if needed, simple approach)
-    // Or just load if cache is null.
+// Normalizes the legacy JSON store once at load, so search is the same dot product
+function loadLegacyStore(): LoadedIndex {
     if (!fs.existsSync(VECTOR_STORE_PATH)) {
-        console.warn(`Vector store not found at ${VECTOR_STORE_PATH}. Returning empty store.`);
-        return [];
+        console.warn(`No vector index at ${INDEX_PREFIX}.json or ${VECTOR_STORE_PATH}. Returning empty store.`);
+        return EMPTY_INDEX;
     }
+    const store: { id: string; content: string; embedding: number[]; metadata: PediaEntry }[] =
+        JSON.parse(fs.readFileSync(VECTOR_STORE_PATH, 'utf-8'));
+    if (store.length === 0) return EMPTY_INDEX;
 
-    // Reload cache if file changed? For now, simple caching is fine, but let's make it safe.
-    if (vectorStoreCache) return vectorStoreCache;
+    const dim = store[0].embedding.length;
+    const vectors = new Float32Array(store.length * dim);
+    store.forEach((entry, row) => vectors.set(normalize(entry.embedding), row * dim));
+    const entries = store.map(entry => ({
+        id: entry.id,
+        kind: 'entry' as RecordKind,
+        content: entry.content,
+        metadata: entry.metadata,
+    }));
+    return { dim, embeddingModel: DEFAULT_EMBEDDING_MODEL, entries, vectors, scales: null };
+}
 
+function getIndex(): LoadedIndex {
+    if (indexCache) return indexCache;
     try {
-        const content = fs.readFileSync(VECTOR_STORE_PATH, 'utf-8');
-        vectorStoreCache = JSON.parse(content);
-        // console.log(`Loaded ${vectorStoreCache?.length} entries from vector store.`);
-        return vectorStoreCache!;
+        indexCache = loadBinaryIndex() || loadLegacyStore();
     } catch (error) {
-        console.error('Failed to parse vector store:', error);
-        return [];
+        console.error('Failed to load vector index:', error);
+        return EMPTY_INDEX;
     }
+    return indexCache;
+}
+
+function normalize(vector: number[]): Float32Array {
+    let norm = 0;
+    for (let i = 0; i < vector.length; i++) norm += vector[i] * vector[i];
+    norm = Math.sqrt(norm);
+    const unit = new Float32Array(vector.length);
+    if (norm === 0) return unit;
+    for (let i = 0; i < vector.length; i++) unit[i] = vector[i] / norm;
+    return unit;
 }
 
-export async function searchVectorStore(query: string, topK = 5, threshold = 0.3) {
-    const store = getVectorStore();
-    if (store.length === 0) return [];
+export async function searchVectorStore(query: string, topK = 5, threshold = 0.3, kinds: RecordKind[] = ['entry']) {
+    const index = getIndex();
+    if (index.entries.length === 0) return [];
 
-    let queryEmbedding: number[] = [];
+    let queryVector: Float32Array;
 
     try {
         const { embedding } = await embed({
-            model: google.textEmbeddingModel('text-embedding-004'),
+            model: google.textEmbeddingModel(index.embeddingModel, { taskType: index.queryTaskType }),
             value: query,
         });
-        queryEmbedding = embedding;
+        if (embedding.length !== index.dim) {
+            console.error(`Query embedding has ${embedding.length} dimensions, index has ${index.dim}`);
+            return [];
+        }
+        queryVector = normalize(embedding);
     } catch (error) {
         console.error('Embedding generation failed:', error);
         return [];
     }
 
-    const scoredEntries = store.map(entry => ({
-        ...entry,
-        score: cosineSimilarity(queryEmbedding, entry.embedding),
-    }));
+    // Rows are pre-normalized, so cosine similarity is one dot product per row.
+    // Keep the best topK in a small array sorted by descending score.
+    const { dim, vectors, scales, entries } = index;
+    const best: { row: number; score: number }[] = [];
+    for (let row = 0; row < entries.length; row++) {
+        if (kinds.indexOf(entries[row].kind) === -1) continue;
+        const base = row * dim;
+        let dot = 0;
+        for (let i = 0; i < dim; i++) dot += vectors[base + i] * queryVector[i];
+        const score = scales ? dot * scales[row] : dot;
+        if (score < threshold) continue;
+        if (best.length === topK && score <= best[best.length - 1].score) continue;
+        let at = best.length;
+        while (at > 0 && best[at - 1].score < score) at--;
+        best.splice(at, 0, { row, score });
+        if (best.length > topK) best.pop();
+    }
 
-    // Sort by score descending and filter by threshold
-    return scoredEntries
-        .filter(entry => entry.score >= threshold)
-        .sort((a, b) => b.score - a.score)
-        .slice(0, topK);
+    return best.map(({ row, score }) => ({ ...entries[row], score }));
 }
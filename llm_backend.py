@@ -0,0 +1,217 @@
+import asyncio
+import json
+import random
+import time
+import zlib
+from rate_limiter import CHARS_PER_TOKEN, TokenBucket
+
+# ==========================================
+# LLM BACKENDS
+# ==========================================
+# Every backend exposes the same two coroutines:
+#   generate(prompt, model=None, config=None) -> response with .text and
+#       .usage_metadata.total_token_count
+#   embed(texts, model=None, task_type=None)  -> list of vectors
+# The Google clients are imported when a Gemini backend is created, so the
+# simulated backend runs without them (and without spending quota).
+# A generate() whose prompt or answer the API blocked raises SafetyBlockError.
+
+# Finish reasons meaning the content itself was refused, so asking again
+# gets the same answer
+BLOCKING_FINISH_REASONS = ("SAFETY", "BLOCKLIST", "PROHIBITED_CONTENT", "SPII", "IMAGE_SAFETY")
+
+
+class SafetyBlockError(Exception):
+    """The API blocked the prompt or the response; `reason` is the block or finish reason it gave."""
+
+    def __init__(self, reason):
+        super().__init__(f"Content blocked by the API ({reason})")
+        self.reason = reason
+
+
+def _reason_name(value):
+    """Name of a block/finish reason enum from either client; None when unset."""
+    if not value:
+        return None
+    name = getattr(value, "name", None) or str(value)
+    return None if name.endswith("UNSPECIFIED") else name
+
+
+def check_blocked(response):
+    """Raises SafetyBlockError if prompt_feedback or the first candidate reports a block."""
+    feedback = getattr(response, "prompt_feedback", None)
+    reason = _reason_name(getattr(feedback, "block_reason", None))
+    if reason:
+        raise SafetyBlockError(reason)
+    candidates = getattr(response, "candidates", None)
+    if candidates:
+        reason = _reason_name(getattr(candidates[0], "finish_reason", None))
+        if reason in BLOCKING_FINISH_REASONS:
+            raise SafetyBlockError(reason)
+    return response
+
+
+class GeminiLegacyBackend:
+    """google.generativeai, the client the extractor was written against."""
+
+    def __init__(self, api_key, model_name, generation_config=None):
+        import google.generativeai as genai
+        genai.configure(api_key=api_key)
+        self.genai = genai
+        self.model = genai.GenerativeModel(model_name, generation_config=generation_config)
+
+    async def generate(self, prompt, model=None, config=None):
+        # Model and config are fixed when the GenerativeModel is built
+        return check_blocked(await self.model.generate_content_async(prompt))
+
+    async def embed(self, texts, model=None, task_type=None):
+        # A list of contents comes back as one vector per text under "embedding"
+        result = await self.genai.embed_content_async(model=model, content=list(texts), task_type=task_type)
+        return result["embedding"]
+
+
+class GeminiBackend:
+    """google.genai, used by the synthesizer for generation and embeddings."""
+
+    def __init__(self, api_key):
+        from google import genai
+        from google.genai import types
+        self.client = genai.Client(api_key=api_key)
+        self.types = types
+
+    async def generate(self, prompt, model=None, config=None):
+        return check_blocked(await self.client.aio.models.generate_content(
+            model=model,
+            contents=prompt,
+            config=self.types.GenerateContentConfig(**config) if config else None
+        ))
+
+    async def embed(self, texts, model=None, task_type=None):
+        result = await self.client.aio.models.embed_content(
+            model=model,
+            contents=texts,
+            config=self.types.EmbedContentConfig(task_type=task_type) if task_type else None
+        )
+        return [e.values for e in result.embeddings]
+
+
+# ==========================================
+# SIMULATED BACKEND
+# ==========================================
+class SimulatedError(Exception):
+    """A fake API error; `code` mirrors the HTTP status the real client reports."""
+
+    def __init__(self, code, message):
+        super().__init__(f"{code} {message}")
+        self.code = code
+
+
+class SimulatedUsage:
+    __slots__ = ("prompt_token_count", "candidates_token_count", "total_token_count")
+
+    def __init__(self, prompt_tokens, output_tokens):
+        self.prompt_token_count = prompt_tokens
+        self.candidates_token_count = output_tokens
+        self.total_token_count = prompt_tokens + output_tokens
+
+
+class SimulatedResponse:
+    __slots__ = ("text", "usage_metadata")
+
+    def __init__(self, text, usage_metadata):
+        self.text = text
+        self.usage_metadata = usage_metadata
+
+
+def canned_response(prompt):
+    """
+    Default responder: one JSON object carrying the extraction and Pedia
+    fields. Trigger and mistake vary with the prompt, so downstream
+    embeddings and clusters aren't all identical.
+    """
+    variant = zlib.crc32(prompt.encode('utf-8'))
+    return json.dumps({
+        "case_title": "Simulated case",
+        "trigger_event": f"Simulated trigger {variant % 97}",
+        "fatal_mistake": f"Simulated mistake {variant % 89}",
+        "escalation_timeline": ["Step 1", "Step 2", "Step 3"],
+        "financial_cost": "$1k-$2k",
+        "emotional_state": "frustration",
+        "community_consensus": "Simulated consensus",
+        "brutal_reality_quote": "Simulated quote",
+        "tags": ["ProcessFailure"],
+        "title": "Simulated entry",
+        "severity_score": 5,
+        "summary": "Simulated summary.",
+    })
+
+
+class SimulatedBackend:
+    """
+    In-process stand-in for the Gemini API. Each call sleeps for a latency
+    drawn from a log-normal distribution (median `latency`, spread
+    `latency_sigma`), then fails with a 429 or 500 at the configured rates,
+    or answers via `responder(prompt)`. Optional per-minute quotas make it
+    push back with 429s the way the real service does, so the rate limiter
+    can be tuned against it. Token usage is reported like the real API.
+    """
+
+    def __init__(self, latency=0.5, latency_sigma=0.3, error_rate=0.0, rate_limit_rate=0.0,
+                 requests_per_minute=None, tokens_per_minute=None, output_tokens=300,
+                 embedding_dim=768, responder=canned_response, seed=None):
+        self.latency = latency
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.output_tokens = output_tokens
+        self.embedding_dim = embedding_dim
+        self.responder = responder
+        self.random = random.Random(seed)
+
+        self.latencies = []
+        self.stats = {"calls": 0, "ok": 0, "rate_limited": 0, "errors": 0, "tokens": 0}
+
+    async def _serve(self, tokens):
+        """Applies latency, quotas and injected failures to one call."""
+        self.stats["calls"] += 1
+        started = time.perf_counter()
+        await asyncio.sleep(self.random.lognormvariate(0, self.latency_sigma) * self.latency)
+        self.latencies.append(time.perf_counter() - started)
+
+        over_quota = False
+        for bucket, amount in ((self.requests, 1), (self.tokens, tokens)):
+            if bucket is not None:
+                if bucket.wait_time(amount) > 0:
+                    over_quota = True
+                else:
+                    bucket.take(amount)
+        roll = self.random.random()
+        if over_quota or roll < self.rate_limit_rate:
+            self.stats["rate_limited"] += 1
+            raise SimulatedError(429, "RESOURCE_EXHAUSTED (simulated)")
+        if roll < self.rate_limit_rate + self.error_rate:
+            self.stats["errors"] += 1
+            raise SimulatedError(500, "INTERNAL (simulated)")
+        self.stats["ok"] += 1
+        self.stats["tokens"] += tokens
+
+    async def generate(self, prompt, model=None, config=None):
+        prompt_tokens = len(prompt) // CHARS_PER_TOKEN + 1
+        await self._serve(prompt_tokens + self.output_tokens)
+        return SimulatedResponse(self.responder(prompt), SimulatedUsage(prompt_tokens, self.output_tokens))
+
+    async def embed(self, texts, model=None, task_type=None):
+        await self._serve(sum(len(text) // CHARS_PER_TOKEN + 1 for text in texts))
+        import numpy as np
+        # Deterministic per text, so identical texts embed identically
+        return [
+            np.random.default_rng(zlib.crc32(text.encode('utf-8'))).standard_normal(self.embedding_dim).tolist()
+            for text in texts
+        ]
+
+    def summary(self):
+        return (f"{self.stats['calls']} calls, {self.stats['ok']} ok, "
+                f"{self.stats['rate_limited']} rate-limited, {self.stats['errors']} errors, "
+                f"~{self.stats['tokens']:,} tokens")
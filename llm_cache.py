@@ -0,0 +1,89 @@
+import hashlib
+import json
+import sqlite3
+import time
+from metrics import registry
+
+# ==========================================
+# CONTENT-ADDRESSED LLM RESPONSE CACHE
+# ==========================================
+CACHE_FILE = "llm_cache.sqlite"
+MAX_CACHE_BYTES = 512 * 1024 * 1024
+# Eviction trims down to this fraction of the limit so it doesn't run on every put
+EVICT_TO_FRACTION = 0.9
+
+
+def make_cache_key(model, config, template_version, text):
+    """
+    Hash of everything that determines a response: the model, its generation
+    config, the prompt template version and the variable prompt content.
+    """
+    payload = json.dumps([model, config, template_version, text], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class LLMCache:
+    """
+    SQLite-backed response cache with least-recently-used eviction once the
+    stored responses exceed `max_bytes`. Safe to share between the extractor
+    and synthesizer; keys never collide across models or templates.
+    """
+
+    def __init__(self, path=CACHE_FILE, max_bytes=MAX_CACHE_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.conn = sqlite3.connect(path, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        row = self.conn.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            registry.record_cache("llm_response", misses=1)
+            return None
+        self.hits += 1
+        registry.record_cache("llm_response", hits=1)
+        self.conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+        return row[0]
+
+    def put(self, key, value):
+        size = len(value.encode('utf-8'))
+        old = self.conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO responses (key, value, size, last_used) VALUES (?, ?, ?, ?)",
+            (key, value, size, time.time()),
+        )
+        self.total_bytes += size - (old[0] if old else 0)
+        if self.total_bytes > self.max_bytes:
+            self._evict()
+
+    def _evict(self):
+        target = self.max_bytes * EVICT_TO_FRACTION
+        rows = self.conn.execute("SELECT key, size FROM responses ORDER BY last_used").fetchall()
+        doomed = []
+        for key, size in rows:
+            if self.total_bytes <= target:
+                break
+            doomed.append((key,))
+            self.total_bytes -= size
+        self.conn.executemany("DELETE FROM responses WHERE key = ?", doomed)
+        self.evictions += len(doomed)
+
+    def summary(self):
+        lookups = self.hits + self.misses
+        rate = self.hits / lookups if lookups else 0.0
+        return (f"{self.hits} hits, {self.misses} misses ({rate:.0%} hit rate), "
+                f"{self.evictions} evicted, {self.total_bytes / 1024 / 1024:.1f} MB stored")
+
+    def close(self):
+        self.conn.close()
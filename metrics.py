@@ -0,0 +1,365 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# ==========================================
+# RUN METRICS
+# ==========================================
+# One registry per process, fed by parse.py, extractor.py, synthesizer.py
+# and pipeline.py, and written at the end of a run with --metrics-file:
+# Prometheus text format for a .prom path, JSON otherwise.
+#   stage_seconds / stage_items / stage_bytes   per-stage wall time and volume
+#   llm_call_seconds (histogram)                latency of every LLM attempt
+#   llm_calls, llm_prompt_tokens, llm_response_tokens
+#   llm_retries                                 attempts retried, by reason
+#   failures                                    errors caught and journaled
+#   cache_lookups                               hits and misses per cache
+METRIC_PREFIX = "rentlease_"
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+# --profile: "cpu" runs cProfile, "memory" runs tracemalloc, "all" both
+PROFILE_MODES = ("cpu", "memory", "all")
+PROFILE_TOP_FUNCTIONS = 40
+TRACEMALLOC_FRAMES = 10
+TRACEMALLOC_TOP_LINES = 40
+# ==========================================
+
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(who).ru_maxrss * scale / 2 ** 20
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Histogram:
+    """Cumulative-bucket histogram, as Prometheus exposes it."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile (0-1); the maximum past the last bound."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return round(min(bound, self.max), 6)
+        return round(self.max, 6)
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "mean": round(self.sum / self.count, 6) if self.count else 0.0,
+            "max": round(self.max, 6),
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "buckets": {str(bound): count for bound, count in zip(self.buckets + ("+Inf",), self.counts)},
+        }
+
+
+class StageTimer:
+    """Handed out by Registry.stage(); set `items` (and `bytes`) to what the stage processed."""
+
+    def __init__(self, items=0, bytes=0):
+        self.items = items
+        self.bytes = bytes
+        self.started = time.perf_counter()
+
+
+class Registry:
+    """
+    Counters, gauges and histograms keyed by (name, labels). Updates take a
+    lock: the pipeline's parse thread reports alongside the event loop.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.script = os.path.basename(sys.argv[0]) if sys.argv and sys.argv[0] else "python"
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name, amount=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def set_gauge(self, name, value, **labels):
+        with self._lock:
+            self.gauges[self._key(name, labels)] = value
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].observe(value)
+
+    def counter(self, name, **labels):
+        return self.counters.get(self._key(name, labels), 0)
+
+    # ------------------------------------------
+    # RECORDING HELPERS
+    # ------------------------------------------
+    def record_stage(self, stage, items, seconds, bytes=0):
+        self.inc("stage_seconds", seconds, stage=stage)
+        self.inc("stage_items", items, stage=stage)
+        if bytes:
+            self.inc("stage_bytes", bytes, stage=stage)
+
+    @contextmanager
+    def stage(self, stage, items=0, bytes=0):
+        """Times the block as `stage`, counting the timer's items/bytes when it exits."""
+        timer = StageTimer(items, bytes)
+        try:
+            yield timer
+        finally:
+            self.record_stage(stage, timer.items, time.perf_counter() - timer.started, timer.bytes)
+
+    def record_llm_call(self, name, seconds, outcome, prompt_tokens=0, response_tokens=0):
+        """One attempt at an LLM call; outcome is "ok", "rate_limited" or "error"."""
+        self.observe("llm_call_seconds", seconds, limiter=name)
+        self.inc("llm_calls", limiter=name, outcome=outcome)
+        if prompt_tokens:
+            self.inc("llm_prompt_tokens", prompt_tokens, limiter=name)
+        if response_tokens:
+            self.inc("llm_response_tokens", response_tokens, limiter=name)
+
+    def record_retry(self, name, reason):
+        self.inc("llm_retries", limiter=name, reason=reason)
+
+    def record_failure(self, stage, error_class):
+        self.inc("failures", stage=stage, error_class=error_class)
+
+    def record_cache(self, cache, hits=0, misses=0):
+        if hits:
+            self.inc("cache_lookups", hits, cache=cache, result="hit")
+        if misses:
+            self.inc("cache_lookups", misses, cache=cache, result="miss")
+
+    # ------------------------------------------
+    # OUTPUT
+    # ------------------------------------------
+    def _by_label(self, name, label):
+        values = {}
+        for (metric, labels), value in self.counters.items():
+            if metric == name:
+                key = dict(labels).get(label)
+                values[key] = values.get(key, 0) + value
+        return values
+
+    def summary(self):
+        """Derived per-stage rates, LLM usage and cache hit rates."""
+        stages = {}
+        seconds = self._by_label("stage_seconds", "stage")
+        items = self._by_label("stage_items", "stage")
+        volume = self._by_label("stage_bytes", "stage")
+        for stage, spent in seconds.items():
+            stages[stage] = {"seconds": round(spent, 3), "items": items.get(stage, 0),
+                             "items_per_s": round(items.get(stage, 0) / spent, 1) if spent > 0 else 0.0}
+            if stage in volume:
+                stages[stage]["mb_per_s"] = round(volume[stage] / 2 ** 20 / spent, 2) if spent > 0 else 0.0
+
+        llm = {}
+        for (metric, labels), histogram in self.histograms.items():
+            if metric != "llm_call_seconds":
+                continue
+            name = dict(labels)["limiter"]
+            llm[name] = {
+                "calls": histogram.count,
+                "p50_s": histogram.quantile(0.5),
+                "p95_s": histogram.quantile(0.95),
+                "max_s": round(histogram.max, 3),
+                "prompt_tokens": self.counter("llm_prompt_tokens", limiter=name),
+                "response_tokens": self.counter("llm_response_tokens", limiter=name),
+                "retries": sum(value for (m, l), value in self.counters.items()
+                               if m == "llm_retries" and dict(l)["limiter"] == name),
+            }
+
+        caches = {}
+        for (metric, labels), value in self.counters.items():
+            if metric == "cache_lookups":
+                labels = dict(labels)
+                caches.setdefault(labels["cache"], {"hit": 0, "miss": 0})[labels["result"]] += value
+        for counts in caches.values():
+            lookups = counts["hit"] + counts["miss"]
+            counts["hit_rate"] = round(counts["hit"] / lookups, 4) if lookups else 0.0
+
+        failures = {}
+        for (metric, labels), value in self.counters.items():
+            if metric == "failures":
+                labels = dict(labels)
+                failures.setdefault(labels["stage"], {})[labels["error_class"]] = value
+
+        return {"stages": stages, "llm": llm, "caches": caches, "failures": failures}
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "script": self.script,
+                "started_at": self.started,
+                "elapsed_s": round(time.time() - self.started, 3),
+                "peak_rss_mb": round(peak_rss_mb(), 1),
+                "summary": self.summary(),
+                "counters": [{"name": n, "labels": dict(l), "value": v} for (n, l), v in sorted(self.counters.items())],
+                "gauges": [{"name": n, "labels": dict(l), "value": v} for (n, l), v in sorted(self.gauges.items())],
+                "histograms": [{"name": n, "labels": dict(l), **h.to_dict()}
+                               for (n, l), h in sorted(self.histograms.items())],
+            }
+
+    def to_prometheus(self):
+        def series(name, labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return METRIC_PREFIX + name
+            text = ",".join(f'{k}="{_escape_label(v)}"' for k, v in pairs)
+            return f"{METRIC_PREFIX}{name}{{{text}}}"
+
+        lines = []
+        with self._lock:
+            self.gauges[("process_peak_rss_bytes", ())] = int(peak_rss_mb() * 2 ** 20)
+            self.gauges[("run_elapsed_seconds", ())] = round(time.time() - self.started, 3)
+            typed = set()
+            for (name, labels), value in sorted(self.counters.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {METRIC_PREFIX}{name}_total counter")
+                    typed.add(name)
+                lines.append(f"{series(name + '_total', labels)} {value}")
+            for (name, labels), value in sorted(self.gauges.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {METRIC_PREFIX}{name} gauge")
+                    typed.add(name)
+                lines.append(f"{series(name, labels)} {value}")
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {METRIC_PREFIX}{name} histogram")
+                    typed.add(name)
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+                    cumulative += count
+                    lines.append(f"{series(name + '_bucket', labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{series(name + '_sum', labels)} {histogram.sum}")
+                lines.append(f"{series(name + '_count', labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Writes Prometheus text for a .prom path, JSON otherwise (atomically)."""
+        if path.endswith(".prom"):
+            text = self.to_prometheus()
+        else:
+            text = json.dumps(self.snapshot(), indent=2)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path + ".tmp", 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(path + ".tmp", path)
+
+
+registry = Registry()
+
+
+# ==========================================
+# PROFILING
+# ==========================================
+@contextmanager
+def profiling(mode, prefix):
+    """
+    With mode "cpu" or "all", cProfile runs for the block and its stats go
+    to <prefix>.prof (for snakeviz/pstats) plus a readable <prefix>.prof.txt.
+    cProfile sees only the calling thread, so work handed to asyncio.to_thread
+    shows up as time waiting on it. With "memory" or "all", tracemalloc's
+    top allocation sites go to <prefix>.tracemalloc.txt and its peak into
+    the tracemalloc_peak_bytes gauge.
+    """
+    profiler = cProfile.Profile() if mode in ("cpu", "all") else None
+    trace = mode in ("memory", "all")
+    if trace:
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        # Snapshot before writing the CPU report, so its allocations stay out of it
+        if trace:
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            registry.set_gauge("tracemalloc_peak_bytes", peak)
+            with open(prefix + ".tracemalloc.txt", 'w', encoding='utf-8') as f:
+                f.write(f"Peak traced memory: {peak / 2 ** 20:.1f} MB\n\n")
+                for stat in snapshot.statistics("lineno")[:TRACEMALLOC_TOP_LINES]:
+                    f.write(f"{stat}\n")
+            print(f"Memory profile written to {prefix}.tracemalloc.txt (peak {peak / 2 ** 20:.1f} MB traced)")
+        if profiler is not None:
+            profiler.dump_stats(prefix + ".prof")
+            text = io.StringIO()
+            pstats.Stats(profiler, stream=text).sort_stats("cumulative").print_stats(PROFILE_TOP_FUNCTIONS)
+            with open(prefix + ".prof.txt", 'w', encoding='utf-8') as f:
+                f.write(text.getvalue())
+            print(f"CPU profile written to {prefix}.prof ({prefix}.prof.txt for the top functions)")
+
+
+# ==========================================
+# SCRIPT INTEGRATION
+# ==========================================
+def add_arguments(parser):
+    parser.add_argument("--metrics-file",
+                        help="Write run metrics here at exit: Prometheus text for a .prom path, JSON otherwise")
+    parser.add_argument("--profile", choices=PROFILE_MODES,
+                        help="Capture a cProfile (cpu) and/or tracemalloc (memory) profile next to the metrics file")
+
+
+@contextmanager
+def session(name, metrics_file=None, profile=None):
+    """
+    Wraps a script run: profiles it if asked and writes the metrics file
+    when it ends, even when it ends in an error.
+    """
+    registry.script = name
+    prefix = os.path.splitext(metrics_file)[0] if metrics_file else f"{name}_profile"
+    if os.path.dirname(prefix):
+        os.makedirs(os.path.dirname(prefix), exist_ok=True)
+    try:
+        with profiling(profile, prefix):
+            yield registry
+    finally:
+        if metrics_file:
+            registry.write(metrics_file)
+            print(f"Metrics written to {metrics_file} (peak RSS {peak_rss_mb():,.0f} MB)")
@@ -1,65 +1,150 @@
 import os
 import re
 import json
+import io
+import mmap
+import time
+import shutil
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from comment_tree import CommentTree, StringPool, encode_json
+import metrics
 
-def parse_reddit_text_file(file_path):
-    with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
-        lines = f.readlines()
+# ==========================================
+# CONFIGURATION
+# ==========================================
+# Directory containing your txt files
+INPUT_DIR = "data"
+OUTPUT_FILE = "all_rental_data.json"
+OUTPUT_JSONL_FILE = "all_rental_data.jsonl"
 
-    filename = os.path.basename(file_path)
-    print(f"Processing: {filename}...")
+# Parallel ingestion: files larger than this are split at POST boundaries
+PARALLEL_CHUNK_BYTES = 64 * 1024 * 1024
+MAX_WORKERS = os.cpu_count() or 1
 
-    # Regex patterns based on your file structure
-    subreddit_pattern = re.compile(r"SUBREDDIT: (r/\w+)")
-    post_start_pattern = re.compile(r"^POST \d+: (.*)")
-    comment_start_pattern = re.compile(r"^(\t*)--- Comment \(Score: (-?\d+)\) ---")
-    
-    # Data containers
-    subreddit_name = "Unknown"
-    posts = []
-    current_post = None
-    current_comment = None
-    
-    # State flags
-    in_comments_section = False
-    reading_comment_text = False
-    reading_post_content = False
-
-    for i, line in enumerate(lines):
+# Incremental mode: per-file content hashes and cached parsed output
+MANIFEST_FILE = "parse_manifest.json"
+CACHE_DIR = ".parse_cache"
+# Modules whose code decides what a dump parses to; the manifest records a
+# hash of them, and cached output from any other version is re-parsed
+PARSER_MODULES = ("parse.py", "comment_tree.py")
+# ==========================================
+
+# Regex patterns based on your file structure
+subreddit_pattern = re.compile(r"SUBREDDIT: (r/\w+)")
+post_start_pattern = re.compile(r"^POST \d+: (.*)")
+comment_start_pattern = re.compile(r"^(\t*)--- Comment \(Score: (-?\d+)\) ---")
+
+# mmap fast path: any line that can change parser state starts with one of
+# these markers. Leading whitespace before Author/Text/Timestamp covers every
+# character str.strip() removes, as UTF-8 bytes.
+_strip_ws = rb"(?:[ \t\f\v\x1c-\x1f]|\xc2[\x85\xa0]|\xe1\x9a\x80|\xe2\x80[\x80-\x8a\xa8\xa9\xaf]|\xe2\x81\x9f|\xe3\x80\x80)*"
+_markers = (
+    rb"POST \d+: |Score \(Upvotes\):|URL:|Post Content:|--- Top|\t*--- Comment \(Score: |"
+    + _strip_ws + rb"(?:Author:|Text:|Timestamp:)"
+)
+marker_pattern = re.compile(rb"(?:" + _markers + rb")")
+# Searching for the newline first lets the regex engine skip ahead quickly
+next_marker_pattern = re.compile(rb"\n(?:" + _markers + rb")")
+# A whole well-formed comment: header, Author/Timestamp lines, the Text line
+# and every following line up to the next marker
+comment_block_pattern = re.compile(
+    rb"(\t*)--- Comment \(Score: (-?\d+)\) ---[^\n]*\n"
+    rb"(?:" + _strip_ws + rb"(?:Author:([^\n]*)|Timestamp:[^\n]*)\n)*"
+    + _strip_ws + rb"Text:([^\n]*)\n"
+    # Continuation lines that rstrip() would leave untouched; lines ending in
+    # whitespace or a non-ASCII character stop the block and take the slow path
+    rb"((?:(?!" + _markers + rb")(?:[^\n]*[^\s\x1c-\x1f\x80-\xbf])?\n)*)"
+)
+# The layout the dumper writes: tab indents, Author then Timestamp, and
+# continuation lines whose first byte after the indent is ASCII and starts
+# no marker.
+# Tried before comment_block_pattern, which it is a strict subset of and
+# which costs several times as much per match.
+canonical_comment_pattern = re.compile(
+    rb"(\t*)--- Comment \(Score: (-?\d+)\) ---\n\t*Author:([^\n]*)\n\t*Timestamp:[^\n]*\n\t*Text:([^\n]*)\n"
+    rb"((?:(?:\t*[^PSUAT\-\s\x1c-\x1f\x80-\xff](?:[^\n]*[^\s\x1c-\x1f\x80-\xbf])?)?\n)*)"
+)
+trailing_ws_pattern = re.compile(r"[^\S\n]\n")
+# Each time this many bytes have gone through the line state machine,
+# feed_buffer checks whether they were most of what it consumed since the
+# last check. On such (malformed) input failed block matches cost more than
+# they save, so the next FALLBACK_WINDOW_BYTES are fed line by line.
+FALLBACK_SAMPLE_BYTES = 256 * 1024
+FALLBACK_WINDOW_BYTES = 4 * 1024 * 1024
+
+class RedditDumpParser:
+    """
+    Line-at-a-time state machine for the dump format. Finished posts are
+    appended to `ready`, which the caller drains.
+
+    Body and comment text are collected in list buffers and joined once, so
+    long threads do not pay for repeated string concatenation.
+    """
+
+    def __init__(self, subreddit_name="Unknown"):
+        self.subreddit_name = subreddit_name
+        self.ready = []
+
+        # Data containers
+        self.current_post = None
+        self.body_parts = None
+        self.current_comment = None
+        self.comment_parts = None
+        # Finished posts that still own `current_comment`. Lines that follow a
+        # comment keep appending to it until the next comment header, even
+        # across a POST boundary, so those posts are released only once it
+        # is replaced.
+        self.held_posts = []
+
+        # State flags
+        self.in_comments_section = False
+        self.reading_comment_text = False
+        self.reading_post_content = False
+
+    def feed(self, line):
         line = line.rstrip()
 
         # 1. Extract Subreddit Name (Global)
-        if not subreddit_name or subreddit_name == "Unknown":
+        if not self.subreddit_name or self.subreddit_name == "Unknown":
             sub_match = subreddit_pattern.search(line)
             if sub_match:
-                subreddit_name = sub_match.group(1)
+                self.subreddit_name = sub_match.group(1)
 
         # 2. Detect New Post Start
         post_match = post_start_pattern.match(line)
         if post_match:
-            # Save previous post if exists
+            # Release previous post if exists
+            current_post = self.current_post
             if current_post:
-                posts.append(current_post)
-            
+                current_post["body"] = "".join(self.body_parts)
+                if self.current_comment is None:
+                    self.ready.append(current_post)
+                else:
+                    self.held_posts.append(current_post)
+
             # Initialize new post
-            current_post = {
-                "subreddit": subreddit_name,
+            self.current_post = {
+                "subreddit": self.subreddit_name,
                 "title": post_match.group(1).strip(),
                 "body": "",
                 "url": "",
                 "score": 0,
                 "comments": []
             }
-            in_comments_section = False
-            reading_post_content = False
-            continue
+            self.body_parts = []
+            self.in_comments_section = False
+            self.reading_post_content = False
+            return
 
+        current_post = self.current_post
         # If we haven't found a post yet, skip (skips header stats/rules)
         if not current_post:
-            continue
+            return
 
         # 3. Post Metadata Extraction
-        if not in_comments_section:
+        if not self.in_comments_section:
             if line.startswith("Score (Upvotes):"):
                 try:
                     current_post["score"] = int(line.split(":")[1].strip())
@@ -68,70 +153,714 @@ def parse_reddit_text_file(file_path):
             elif line.startswith("URL:"):
                 current_post["url"] = line.split("URL:", 1)[1].strip()
             elif line.startswith("Post Content:"):
-                reading_post_content = True
-                continue
+                self.reading_post_content = True
+                return
             elif line.startswith("--- Top 100 Comments ---"):
-                in_comments_section = True
-                reading_post_content = False
-                continue
-            
+                self.in_comments_section = True
+                self.reading_post_content = False
+                return
+
             # Capture Post Body
-            if reading_post_content and not line.startswith("URL:") and not line.startswith("--- Top"):
-                current_post["body"] += line + "\n"
+            if self.reading_post_content and not line.startswith("URL:") and not line.startswith("--- Top"):
+                self.body_parts.append(line + "\n")
 
         # 4. Comment Extraction
-        if in_comments_section:
+        if self.in_comments_section:
             comment_match = comment_start_pattern.match(line)
-            
+
             if comment_match:
-                # Start a new comment
                 tabs = comment_match.group(1)
                 score = comment_match.group(2)
-                indent_level = len(tabs)
-                
-                current_comment = {
-                    "level": indent_level,
-                    "score": int(score),
-                    "author": "Unknown",
-                    "text": ""
-                }
-                current_post["comments"].append(current_comment)
-                reading_comment_text = False
-                continue
+                self.start_comment(len(tabs), int(score))
+                return
 
+            current_comment = self.current_comment
             if current_comment:
                 clean_line = line.strip()
                 if clean_line.startswith("Author:"):
                     current_comment["author"] = clean_line.split("Author:", 1)[1].strip()
                 elif clean_line.startswith("Text:"):
-                    current_comment["text"] = clean_line.split("Text:", 1)[1].strip() + "\n"
-                    reading_comment_text = True
-                elif reading_comment_text:
+                    self.comment_parts = [clean_line.split("Text:", 1)[1].strip() + "\n"]
+                    self.reading_comment_text = True
+                elif self.reading_comment_text:
                     # Append multi-line comment text
                     # We check if the line looks like a metadata tag to stop reading
                     if not (clean_line.startswith("Author:") or clean_line.startswith("Timestamp:")):
-                        current_comment["text"] += line + "\n"
+                        self.comment_parts.append(line + "\n")
+
+    def start_comment(self, indent_level, score):
+        """Opens a new comment on the current post."""
+        if self.current_comment is not None:
+            self._close_comment()
+
+        self.current_comment = {
+            "level": indent_level,
+            "score": score,
+            "author": "Unknown",
+            "text": ""
+        }
+        self.comment_parts = []
+        self.current_post["comments"].append(self.current_comment)
+        self.reading_comment_text = False
+        return self.current_comment
+
+    def feed_span(self, text):
+        """
+        Feeds a run of whole lines that contain no markers. Such lines can
+        only be body or comment text, so they are appended in one piece.
+        """
+        if not self.current_post:
+            return
+        if not self.in_comments_section:
+            if not self.reading_post_content:
+                return
+            parts = self.body_parts
+        else:
+            if not self.current_comment or not self.reading_comment_text:
+                return
+            parts = self.comment_parts
+        if not text.endswith("\n"):
+            text += "\n"
+        if trailing_ws_pattern.search(text):
+            text = "".join(line.rstrip() + "\n" for line in text[:-1].split("\n"))
+        parts.append(text)
 
-    # Append the final post
-    if current_post:
-        posts.append(current_post)
+    def _close_comment(self):
+        """Finalizes the current comment and releases posts waiting on it."""
+        self.current_comment["text"] = "".join(self.comment_parts)
+        if self.held_posts:
+            self.ready.extend(self.held_posts)
+            self.held_posts.clear()
 
-    return posts
+    def close(self):
+        """Flushes the final comment and post into `ready`."""
+        if self.current_comment is not None:
+            self._close_comment()
+        if self.current_post:
+            self.current_post["body"] = "".join(self.body_parts)
+            self.ready.append(self.current_post)
+            self.current_post = None
+
+def iter_reddit_posts(lines, subreddit_name="Unknown"):
+    """Streaming parser. Consumes lines lazily and yields posts one at a time."""
+    parser = RedditDumpParser(subreddit_name)
+    ready = parser.ready
+    feed = parser.feed
+    for line in lines:
+        feed(line)
+        if ready:
+            yield from ready
+            ready.clear()
+    parser.close()
+    yield from ready
+
+def find_subreddit_line(buf, start=0, end=None):
+    """Start offset of the first line in buf[start:end] the subreddit pattern matches."""
+    end = len(buf) if end is None else end
+    while True:
+        found = buf.find(b"SUBREDDIT: r/", start, end)
+        if found == -1:
+            return -1
+        line_start = buf.rfind(b"\n", start, found) + 1 or start
+        line_end = buf.find(b"\n", found, end)
+        line_end = end if line_end == -1 else line_end
+        if subreddit_pattern.search(buf[line_start:line_end].decode('utf-8', errors='replace')):
+            return line_start
+        start = line_end
+
+def feed_buffer(parser, buf, start=0, end=None):
+    """
+    mmap fast path. Jumps between marker lines in buf[start:end] with one
+    combined regex; text between markers goes to feed_span in one slice, and
+    well-formed comments are applied from a single block match. Anything
+    else goes through the line state machine, and stretches where that is
+    most of the input are fed by feed_lines. The buffer must not contain CR
+    characters. Yields posts as they finish; does not close the
+    parser.
+    """
+    end = len(buf) if end is None else end
+    ready = parser.ready
+    subreddit_at = -1
+    if not parser.subreddit_name or parser.subreddit_name == "Unknown":
+        subreddit_at = find_subreddit_line(buf, start, end)
+    match_marker = marker_pattern.match
+    search_marker = next_marker_pattern.search
+    match_canonical = canonical_comment_pattern.match
+    match_comment = comment_block_pattern.match
+
+    fed_bytes = 0
+    position = sample_start = start
+    while position < end:
+        if fed_bytes > FALLBACK_SAMPLE_BYTES:
+            if 2 * fed_bytes > position - sample_start:
+                stop = buf.find(b"\n", min(position + FALLBACK_WINDOW_BYTES, end) - 1, end) + 1 or end
+                yield from feed_lines(parser, buf, position, stop)
+                position = stop
+            fed_bytes = 0
+            sample_start = position
+            continue
+
+        # Most lines in a comments section belong to well-formed comments.
+        # A run of them is applied in one loop, the same as start_comment
+        # followed by feeding each line.
+        if parser.in_comments_section and parser.current_post:
+            comments = parser.current_post["comments"]
+            comment = None
+            while True:
+                block = match_canonical(buf, position, end) or match_comment(buf, position, end)
+                # The subreddit line must reach the state machine, never a block
+                if block is None or position <= subreddit_at < block.end():
+                    break
+                if comment is None and parser.current_comment is not None:
+                    parser._close_comment()
+                tabs, score, author, text, continuation = block.groups()
+                text = text.decode('utf-8', errors='replace').strip() + "\n"
+                if continuation:
+                    text += continuation.decode('utf-8', errors='replace')
+                comment = {
+                    "level": len(tabs),
+                    "score": int(score),
+                    "author": "Unknown" if author is None else author.decode('utf-8', errors='replace').strip(),
+                    "text": text,
+                }
+                comments.append(comment)
+                position = block.end()
+            if comment is not None:
+                parser.current_comment = comment
+                parser.comment_parts = [comment["text"]]
+                parser.reading_comment_text = True
+                if ready:
+                    yield from ready
+                    ready.clear()
+                continue
+
+        line_start = position
+        match = match_marker(buf, position, end)
+        if match is None:
+            found = search_marker(buf, position, end)
+            line_start = found.start() + 1 if found else end
+        if position <= subreddit_at < line_start:
+            # The subreddit line is fed through the state machine like a marker
+            line_start = subreddit_at
+        if line_start > position:
+            parser.feed_span(buf[position:line_start].decode('utf-8', errors='replace'))
+        if line_start == end:
+            break
+
+        position = buf.find(b"\n", line_start, end) + 1 or end
+        parser.feed(buf[line_start:position].decode('utf-8', errors='replace'))
+        fed_bytes += position - line_start
+        if ready:
+            yield from ready
+            ready.clear()
+
+    if ready:
+        yield from ready
+        ready.clear()
+
+def feed_lines(parser, buf, start, end, chunk_bytes=1024 * 1024):
+    """
+    Feeds buf[start:end] through the line state machine, decoding it in
+    chunks cut after a newline. Yields posts as they finish.
+    """
+    ready = parser.ready
+    feed = parser.feed
+    while start < end:
+        stop = buf.find(b"\n", min(start + chunk_bytes, end) - 1, end) + 1 or end
+        text = buf[start:stop].decode('utf-8', errors='replace')
+        lines = text.split("\n")
+        if text.endswith("\n"):
+            lines.pop()
+        # feed() strips the line ending itself
+        for line in lines:
+            feed(line)
+            if ready:
+                yield from ready
+                ready.clear()
+        start = stop
+
+def iter_reddit_posts_mmap(file_path):
+    """
+    Memory-maps a dump and yields its posts via feed_buffer. Files with CR
+    line endings fall back to the line parser, which applies universal
+    newline translation.
+    """
+    with open(file_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            if buf.find(b"\r") != -1:
+                with open(file_path, 'r', encoding='utf-8', errors='replace') as text_file:
+                    yield from iter_reddit_posts(text_file)
+                return
+            parser = RedditDumpParser()
+            yield from feed_buffer(parser, buf)
+            parser.close()
+            yield from parser.ready
+
+def compact_posts(posts, pool=None):
+    """
+    Replaces each post's comment list with a CommentTree as it streams by.
+    One author pool is shared across all posts.
+    """
+    pool = pool if pool is not None else StringPool()
+    for post in posts:
+        post["comments"] = CommentTree.from_comments(post["comments"], pool)
+        yield post
+
+def iter_reddit_text_file(file_path, fast=False, compact=False):
+    """
+    Yields the posts of one dump file without loading it into memory.
+    `fast` selects the mmap tokenizer, which gives identical output at
+    about twice the speed on well-formed dumps.
+    `compact` yields comments as a CommentTree instead of a list of dicts.
+    """
+    filename = os.path.basename(file_path)
+    print(f"Processing: {filename}...")
+    if fast:
+        posts = iter_reddit_posts_mmap(file_path)
+    else:
+        posts = _iter_text_file(file_path)
+    if compact:
+        posts = compact_posts(posts)
+    # Timed until the caller stops pulling, so slow consumers count too
+    with metrics.registry.stage("parse", bytes=os.path.getsize(file_path)) as timer:
+        for post in posts:
+            timer.items += 1
+            yield post
+
+def _iter_text_file(file_path):
+    with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+        yield from iter_reddit_posts(f)
+
+def parse_reddit_text_file(file_path, fast=False, compact=False):
+    return list(iter_reddit_text_file(file_path, fast, compact))
+
+def write_posts_jsonl(posts, f_out):
+    """Writes posts as JSONL records as they arrive. Returns the count."""
+    count = 0
+    for post in posts:
+        f_out.write(json.dumps(post, default=encode_json))
+        f_out.write('\n')
+        count += 1
+    return count
+
+# ==========================================
+# READING PARSED OUTPUT
+# ==========================================
+def iter_json_array(f, chunk_size=1024 * 1024):
+    """Yields the elements of a top-level JSON array without loading the whole file."""
+    decoder = json.JSONDecoder()
+    buffer = f.read(chunk_size)
+    pos = buffer.find('[') + 1
+    if pos == 0:
+        raise ValueError("Input is not a JSON array")
+    eof = False
+    while True:
+        # Skip separators between elements
+        while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+            pos += 1
+        if pos < len(buffer) and buffer[pos] == ']':
+            return
+        try:
+            if pos >= len(buffer):
+                raise json.JSONDecodeError("Need more data", buffer, pos)
+            item, pos = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+        yield item
 
-def main():
-    # Directory containing your txt files
-    input_dir = "/home/cybernovas/Desktop/2025/RentLease/data" 
-    output_file = "all_rental_data.json"
-    
+def iter_posts(input_file):
+    """Yields posts from a JSONL file or a JSON array, one at a time."""
+    with open(input_file, 'r', encoding='utf-8') as f:
+        if input_file.endswith('.jsonl'):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from iter_json_array(f)
+
+# ==========================================
+# PARALLEL INGESTION
+# ==========================================
+post_boundary_pattern = re.compile(rb"^POST \d+: ")
+
+def find_subreddit_offset(file_path):
+    """Byte offset of the line where the global subreddit name is first found."""
+    offset = 0
+    with open(file_path, 'rb') as f:
+        for raw_line in f:
+            sub_match = subreddit_pattern.search(raw_line.decode('utf-8', errors='replace'))
+            if sub_match:
+                return sub_match.group(1), offset
+            offset += len(raw_line)
+    return "Unknown", offset
+
+def split_file_chunks(file_path, chunk_bytes=PARALLEL_CHUNK_BYTES):
+    """
+    Splits a dump into (start, end) byte ranges that each begin on a
+    `POST N:` line. Every such line starts a new post in the sequential
+    parser, so parsing the ranges independently gives the same posts.
+    """
+    size = os.path.getsize(file_path)
+    boundaries = [0]
+    with open(file_path, 'rb') as f:
+        target = chunk_bytes
+        while target < size:
+            f.seek(target)
+            f.readline()  # Skip the partial line we landed in
+            position = f.tell()
+            for raw_line in iter(f.readline, b""):
+                if post_boundary_pattern.match(raw_line):
+                    break
+                position += len(raw_line)
+            if position >= size:
+                break
+            boundaries.append(position)
+            target = position + chunk_bytes
+    boundaries.append(size)
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+class _ChunkParser(RedditDumpParser):
+    """
+    Parses a chunk that starts mid-file. The comment left open by the
+    previous chunk is stood in for by a placeholder, and whatever the chunk
+    does to it is recorded in `carry` as (author, text_was_reset, text), to
+    be replayed onto the real comment once the previous chunk is merged.
+    """
+
+    def __init__(self, subreddit_name):
+        super().__init__(subreddit_name)
+        self.incoming = {"author": None}
+        self.incoming_parts = []
+        self.current_comment = self.incoming
+        self.comment_parts = self.incoming_parts
+        # Assume the open comment was reading text; if it wasn't, the
+        # appended text is discarded during the merge
+        self.reading_comment_text = True
+        self.carry = None
+
+    def _close_comment(self):
+        if self.current_comment is self.incoming:
+            text_was_reset = self.comment_parts is not self.incoming_parts
+            self.carry = (self.incoming["author"], text_was_reset, "".join(self.comment_parts))
+        else:
+            self.current_comment["text"] = "".join(self.comment_parts)
+        if self.held_posts:
+            self.ready.extend(self.held_posts)
+            self.held_posts.clear()
+
+def _parse_chunk(file_path, start, end, subreddit_name, fast=False):
+    """
+    Worker: parses one byte range of a dump. Returns the posts, the carry
+    for the previous chunk's open comment, the position of this chunk's
+    last comment, whether it was still reading text, and the elapsed time.
+    """
+    started = time.perf_counter()
+    parser = RedditDumpParser(subreddit_name) if start == 0 else _ChunkParser(subreddit_name)
+    posts = []
+    with open(file_path, 'rb') as f:
+        if fast and end > start:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                if buf.find(b"\r", start, end) == -1:
+                    posts.extend(feed_buffer(parser, buf, start, end))
+                else:
+                    fast = False
+        if not fast:
+            f.seek(start)
+            data = f.read(end - start)
+            lines = io.StringIO(data.decode('utf-8', errors='replace'), newline=None)
+            del data
+            for line in lines:
+                parser.feed(line)
+    tail_comment = parser.current_comment
+    parser.close()
+    posts.extend(parser.ready)
+
+    tail_position = None
+    if tail_comment is not None and tail_comment is not getattr(parser, "incoming", None):
+        for post_index in range(len(posts) - 1, -1, -1):
+            if posts[post_index]["comments"]:
+                tail_position = (post_index, len(posts[post_index]["comments"]) - 1)
+                break
+    carry = getattr(parser, "carry", None)
+    return posts, carry, tail_position, parser.reading_comment_text, time.perf_counter() - started
+
+def _merge_chunks(chunk_results):
+    """Concatenates chunk results, replaying each carry onto the open comment."""
+    posts = []
+    seconds = 0.0
+    open_comment = None
+    open_reading = False
+    for chunk_posts, carry, tail_position, tail_reading, elapsed in chunk_results:
+        if carry is not None and open_comment is not None:
+            author, text_was_reset, text = carry
+            if author is not None:
+                open_comment["author"] = author
+            if text_was_reset:
+                open_comment["text"] = text
+            elif open_reading:
+                open_comment["text"] += text
+            open_reading = text_was_reset or open_reading
+        if tail_position is not None:
+            post_index, comment_index = tail_position
+            open_comment = chunk_posts[post_index]["comments"][comment_index]
+            open_reading = tail_reading
+        posts.extend(chunk_posts)
+        seconds += elapsed
+    return posts, seconds
+
+def iter_files_parallel(file_paths, max_workers=MAX_WORKERS, chunk_bytes=PARALLEL_CHUNK_BYTES, fast=False):
+    """
+    Parses files across a process pool. Yields (file_path, posts, seconds)
+    in input order, regardless of which worker finishes first. `seconds` is
+    the summed worker time spent on that file.
+    """
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        file_futures = []
+        for file_path in file_paths:
+            chunks = split_file_chunks(file_path, chunk_bytes)
+            if len(chunks) > 1:
+                subreddit_name, found_at = find_subreddit_offset(file_path)
+            else:
+                subreddit_name, found_at = "Unknown", 0
+            futures = []
+            for start, end in chunks:
+                # Chunks before the subreddit line must discover it themselves
+                initial = subreddit_name if found_at < start else "Unknown"
+                futures.append(pool.submit(_parse_chunk, file_path, start, end, initial, fast))
+            file_futures.append((file_path, futures))
+
+        for file_path, futures in file_futures:
+            posts, seconds = _merge_chunks(future.result() for future in futures)
+            yield file_path, posts, seconds
+
+def report_file(file_path, count, seconds):
+    metrics.registry.record_stage("parse", count, seconds, os.path.getsize(file_path))
+    rate = count / seconds if seconds > 0 else float("inf")
+    print(f"  -> Extracted {count} posts from {os.path.basename(file_path)} ({rate:,.0f} posts/sec)")
+
+# ==========================================
+# INCREMENTAL RE-PARSE
+# ==========================================
+def parser_version():
+    """sha256 over the source of PARSER_MODULES."""
+    digest = hashlib.sha256()
+    here = os.path.dirname(os.path.abspath(__file__))
+    for module in PARSER_MODULES:
+        with open(os.path.join(here, module), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+def load_manifest(manifest_file=MANIFEST_FILE):
+    version = parser_version()
+    if os.path.exists(manifest_file):
+        try:
+            with open(manifest_file, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except json.JSONDecodeError:
+            print(f"[Warning] {manifest_file} is corrupt, re-parsing everything.")
+        else:
+            if manifest.get("parser_version") == version:
+                return manifest
+            print(f"The parser changed since {manifest_file} was written, re-parsing everything.")
+    return {"parser_version": version, "files": {}}
+
+def save_manifest(manifest, manifest_file=MANIFEST_FILE):
+    tmp_file = manifest_file + ".tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_file, manifest_file)
+
+def hash_file(file_path, block_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def is_unchanged(file_path, entry, cache_dir=CACHE_DIR):
+    """
+    Size+mtime match is trusted without reading the file. Otherwise the
+    content hash decides, so a touched-but-identical file is not re-parsed.
+    """
+    if not entry or not os.path.exists(os.path.join(cache_dir, entry["cache"])):
+        return False
+    stat = os.stat(file_path)
+    if stat.st_size == entry["size"] and stat.st_mtime_ns == entry["mtime_ns"]:
+        return True
+    if stat.st_size != entry["size"]:
+        return False
+    if hash_file(file_path) == entry["sha256"]:
+        entry["mtime_ns"] = stat.st_mtime_ns
+        return True
+    return False
+
+def write_posts_json_array(posts, f_out):
+    """
+    Writes posts as a JSON array one element at a time. Byte-identical to
+    json.dump(list(posts), f_out, indent=4) without holding the list.
+    """
+    count = 0
+    for post in posts:
+        f_out.write("[\n" if count == 0 else ",\n")
+        f_out.write("    " + json.dumps(post, indent=4, default=encode_json).replace("\n", "\n    "))
+        count += 1
+    f_out.write("\n]" if count else "[]")
+    return count
+
+def iter_cached_posts(cache_path):
+    with open(cache_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            yield json.loads(line)
+
+def main_incremental(input_dir=INPUT_DIR, stream=False, workers=1, fast=False):
+    """
+    Incremental mode. Only files whose content changed since the last run
+    are parsed; everything else is served from the per-file cache recorded
+    in the manifest. Entries for deleted files are evicted.
+    """
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    manifest = load_manifest()
+    entries = manifest["files"]
+    file_paths = list_input_files(input_dir)
+    keys = {file_path: os.path.abspath(file_path) for file_path in file_paths}
+
+    # 1. Evict entries whose source file is gone
+    for key in set(entries) - set(keys.values()):
+        print(f"  -> Evicting deleted file {os.path.basename(key)}")
+        entries.pop(key)
+
+    # 2. Re-parse only what changed
+    changed = [p for p in file_paths if not is_unchanged(p, entries.get(keys[p]))]
+    print(f"{len(file_paths) - len(changed)} unchanged files, {len(changed)} to parse.")
+
+    if workers > 1:
+        parsed = iter_files_parallel(changed, workers, fast=fast)
+    else:
+        parsed = ((p, parse_reddit_text_file(p, fast), None) for p in changed)
+
+    for file_path, posts, seconds in parsed:
+        sha256 = hash_file(file_path)
+        cache_name = f"{sha256}.jsonl"
+        tmp_path = os.path.join(CACHE_DIR, cache_name + ".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f_cache:
+            write_posts_jsonl(posts, f_cache)
+        os.replace(tmp_path, os.path.join(CACHE_DIR, cache_name))
+        stat = os.stat(file_path)
+        entries[keys[file_path]] = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": sha256,
+            "cache": cache_name,
+            "posts": len(posts),
+        }
+        if seconds is None:
+            print(f"  -> Extracted {len(posts)} posts from {os.path.basename(file_path)}")
+        else:
+            report_file(file_path, len(posts), seconds)
+
+    # 3. Drop cache files no entry refers to any more
+    referenced = {entry["cache"] for entry in entries.values()}
+    for cache_name in os.listdir(CACHE_DIR):
+        if cache_name not in referenced:
+            os.remove(os.path.join(CACHE_DIR, cache_name))
+    save_manifest(manifest)
+
+    # 4. Assemble the combined output from the caches
+    output_file = OUTPUT_JSONL_FILE if stream else OUTPUT_FILE
+    cache_paths = [os.path.join(CACHE_DIR, entries[keys[p]]["cache"]) for p in file_paths]
+    with open(output_file, 'w', encoding='utf-8') as f_out:
+        if stream:
+            for cache_path in cache_paths:
+                with open(cache_path, 'r', encoding='utf-8') as f_cache:
+                    shutil.copyfileobj(f_cache, f_out)
+        else:
+            write_posts_json_array(
+                (post for cache_path in cache_paths for post in iter_cached_posts(cache_path)),
+                f_out,
+            )
+
+    total = sum(entries[keys[p]]["posts"] for p in file_paths)
+    print(f"\nSUCCESS: Successfully assembled {total} total threads into '{output_file}'")
+
+def iter_posts_incremental(file_paths, fast=False, manifest_file=MANIFEST_FILE, cache_dir=CACHE_DIR):
+    """
+    Streaming counterpart of main_incremental: yields the posts of every
+    file in order, serving unchanged files from the cache and filling the
+    cache of changed ones as their posts go by. The manifest is saved after
+    each file, so an interrupted run keeps every file it finished.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    manifest = load_manifest(manifest_file)
+    entries = manifest["files"]
+    keys = {file_path: os.path.abspath(file_path) for file_path in file_paths}
+    for key in set(entries) - set(keys.values()):
+        entries.pop(key)
+
+    for file_path in file_paths:
+        entry = entries.get(keys[file_path])
+        if is_unchanged(file_path, entry, cache_dir):
+            yield from iter_cached_posts(os.path.join(cache_dir, entry["cache"]))
+            continue
+        # Stat before parsing: a file modified mid-parse then fails is_unchanged next time
+        stat = os.stat(file_path)
+        tmp_path = os.path.join(cache_dir, os.path.basename(file_path) + ".tmp")
+        count = 0
+        with open(tmp_path, 'w', encoding='utf-8') as f_cache:
+            for post in iter_reddit_text_file(file_path, fast):
+                f_cache.write(json.dumps(post, default=encode_json))
+                f_cache.write('\n')
+                count += 1
+                yield post
+        sha256 = hash_file(file_path)
+        cache_name = f"{sha256}.jsonl"
+        os.replace(tmp_path, os.path.join(cache_dir, cache_name))
+        entries[keys[file_path]] = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": sha256,
+            "cache": cache_name,
+            "posts": count,
+        }
+        save_manifest(manifest, manifest_file)
+
+    referenced = {entry["cache"] for entry in entries.values()}
+    for cache_name in os.listdir(cache_dir):
+        if cache_name not in referenced:
+            os.remove(os.path.join(cache_dir, cache_name))
+    save_manifest(manifest, manifest_file)
+
+def list_input_files(input_dir):
+    """Sorted .txt dump paths, so output order does not depend on the filesystem."""
+    return [
+        os.path.join(input_dir, filename)
+        for filename in sorted(os.listdir(input_dir))
+        if filename.endswith(".txt")
+    ]
+
+def main(input_dir=INPUT_DIR, stream=False, workers=1, incremental=False, fast=False):
+    if incremental:
+        return main_incremental(input_dir, stream, workers, fast)
+    if workers > 1:
+        return main_parallel(input_dir, stream, workers, fast)
+    if stream:
+        return main_stream(input_dir, fast)
+
+    output_file = OUTPUT_FILE
     all_data = []
 
     # Iterate over all .txt files in the directory
-    for filename in os.listdir(input_dir):
-        if filename.endswith(".txt"):
-            file_path = os.path.join(input_dir, filename)
-            file_data = parse_reddit_text_file(file_path)
-            all_data.extend(file_data)
-            print(f"  -> Extracted {len(file_data)} posts from {filename}")
+    for file_path in list_input_files(input_dir):
+        file_data = parse_reddit_text_file(file_path, fast)
+        all_data.extend(file_data)
+        print(f"  -> Extracted {len(file_data)} posts from {os.path.basename(file_path)}")
 
     # Save to JSON
     with open(output_file, 'w', encoding='utf-8') as f:
@@ -139,5 +868,96 @@ def main():
 
     print(f"\nSUCCESS: Successfully parsed {len(all_data)} total threads into '{output_file}'")
 
+def main_stream(input_dir=INPUT_DIR, fast=False):
+    """
+    Streaming mode. Posts are written to a JSONL file as soon as they are
+    parsed, so peak memory is bounded by the largest single post.
+    """
+    output_file = OUTPUT_JSONL_FILE
+    total = 0
+
+    with open(output_file, 'w', encoding='utf-8') as f_out:
+        for file_path in list_input_files(input_dir):
+            count = write_posts_jsonl(iter_reddit_text_file(file_path, fast), f_out)
+            total += count
+            print(f"  -> Extracted {count} posts from {os.path.basename(file_path)}")
+
+    print(f"\nSUCCESS: Successfully streamed {total} total threads into '{output_file}'")
+
+def main_parallel(input_dir=INPUT_DIR, stream=False, workers=MAX_WORKERS, fast=False):
+    """
+    Parallel mode. Files (and chunks of large files) are parsed in worker
+    processes, then merged in sorted-filename order so the output is the
+    same as a sequential run.
+    """
+    output_file = OUTPUT_JSONL_FILE if stream else OUTPUT_FILE
+    file_paths = list_input_files(input_dir)
+    print(f"Parsing {len(file_paths)} files with {workers} workers...")
+    started = time.perf_counter()
+    total = 0
+    all_data = []
+
+    with open(output_file, 'w', encoding='utf-8') as f_out:
+        for file_path, posts, seconds in iter_files_parallel(file_paths, workers, fast=fast):
+            report_file(file_path, len(posts), seconds)
+            total += len(posts)
+            if stream:
+                write_posts_jsonl(posts, f_out)
+            else:
+                all_data.extend(posts)
+        if not stream:
+            json.dump(all_data, f_out, indent=4)
+
+    elapsed = time.perf_counter() - started
+    print(f"\nSUCCESS: Successfully parsed {total} total threads into '{output_file}' in {elapsed:.1f}s")
+
+def check_parity(input_dir=INPUT_DIR):
+    """
+    Parses every file with both the line parser and the mmap tokenizer and
+    compares the results. Returns True when every file matches.
+    """
+    all_match = True
+    for file_path in list_input_files(input_dir):
+        filename = os.path.basename(file_path)
+        with open(file_path, 'rb') as f:
+            line_count = sum(1 for _ in f)
+
+        started = time.perf_counter()
+        with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+            expected = list(iter_reddit_posts(f))
+        line_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        actual = list(iter_reddit_posts_mmap(file_path))
+        fast_seconds = max(time.perf_counter() - started, 1e-9)
+        line_seconds = max(line_seconds, 1e-9)
+
+        mismatches = sum(1 for a, b in zip(expected, actual) if a != b) + abs(len(expected) - len(actual))
+        all_match = all_match and mismatches == 0
+        status = "OK" if mismatches == 0 else f"MISMATCH ({mismatches} posts differ)"
+        print(
+            f"  {filename}: {status} | line parser {line_count / line_seconds:,.0f} lines/sec"
+            f" | mmap {line_count / fast_seconds:,.0f} lines/sec ({line_seconds / fast_seconds:.1f}x)"
+        )
+    return all_match
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Parse Reddit text dumps into structured threads.")
+    parser.add_argument("--input-dir", default=INPUT_DIR, help="Directory containing the .txt dumps")
+    parser.add_argument("--stream", action="store_true",
+                        help=f"Stream posts into {OUTPUT_JSONL_FILE} instead of building {OUTPUT_FILE} in memory")
+    parser.add_argument("--workers", type=int, default=1,
+                        help=f"Parse files in parallel with this many processes (this machine: {MAX_WORKERS})")
+    parser.add_argument("--incremental", action="store_true",
+                        help=f"Only re-parse files that changed since the last run (tracked in {MANIFEST_FILE})")
+    parser.add_argument("--fast", action="store_true",
+                        help="Use the mmap tokenizer (same output; about 2x the line parser on "
+                             "well-formed dumps, about the same on malformed ones)")
+    parser.add_argument("--check-parity", action="store_true",
+                        help="Compare the mmap tokenizer against the line parser on every file and exit")
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    if args.check_parity:
+        raise SystemExit(0 if check_parity(args.input_dir) else 1)
+    with metrics.session("parse", args.metrics_file, args.profile):
+        main(args.input_dir, stream=args.stream, workers=args.workers, incremental=args.incremental, fast=args.fast)
@@ -0,0 +1,427 @@
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import os
+import threading
+import time
+import dedup
+import extractor
+import metrics
+import parse
+import synthesizer
+from embedding_store import EmbeddingStore
+from failure_journal import FailureJournal
+from llm_cache import LLMCache, CACHE_FILE
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+# Items each queue holds before the stage feeding it blocks (backpressure)
+PARSE_QUEUE_SIZE = 256
+DEDUP_QUEUE_SIZE = extractor.MAX_CONCURRENT_REQUESTS * extractor.QUEUE_DEPTH_PER_WORKER
+EMBED_QUEUE_SIZE = 512
+# Extracted cases are embedded in groups of this many (or whatever
+# arrived within EMBED_FLUSH_SECONDS)
+EMBED_BATCH = 100
+EMBED_FLUSH_SECONDS = 5.0
+REPORT_EVERY_SECONDS = 10.0
+# How often the parse thread, blocked on a full queue, checks whether the
+# pipeline has stopped
+STOP_POLL_SECONDS = 0.5
+# ==========================================
+
+# Stages pass items through asyncio queues; None marks the end of a stream.
+#   parse      dump files -> posts        checkpoint: parse manifest + per-file cache
+#   dedup      posts -> unique posts      deterministic replay, output rewritten each run
+#                                         (posts below MIN_POST_SCORE are not extracted)
+#   extract    posts -> cases             checkpoint: output index + failure journal
+#   embed      cases -> embedding store   checkpoint: the store itself
+#   synthesize clustering + Pedia entries once every case is in
+# Every checkpoint is the one the stage's own script uses, under the same
+# file name inside the workdir, so a stage can also be resumed on its own
+# from there (parse.py --incremental, extractor.py --stream,
+# synthesizer.py --incremental).
+# Dedup matches dedup.py, which needs every post signed before any group
+# is known, so extraction starts once parsing is done. --streaming-dedup
+# lets extraction overlap parsing instead, at the cost of a different
+# (first-member-wins) result.
+
+
+class StageStats:
+    """Items in and out of one stage, and its active time span."""
+
+    def __init__(self, name):
+        self.name = name
+        self.received = 0
+        self.emitted = 0
+        self.skipped = 0
+        self.started = None
+        self.finished = None
+
+    def start(self):
+        if self.started is None:
+            self.started = time.perf_counter()
+
+    def finish(self):
+        self.finished = time.perf_counter()
+
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.perf_counter()) - self.started
+
+    def rate(self):
+        elapsed = self.elapsed()
+        return self.emitted / elapsed if elapsed > 0 else 0.0
+
+
+class QueueStats:
+    """Depth samples of a bounded queue, taken by the reporter."""
+
+    def __init__(self, name, queue):
+        self.name = name
+        self.queue = queue
+        self.samples = 0
+        self.total_depth = 0
+        self.max_depth = 0
+
+    def sample(self):
+        depth = self.queue.qsize()
+        self.samples += 1
+        self.total_depth += depth
+        self.max_depth = max(self.max_depth, depth)
+        return depth
+
+    def mean_depth(self):
+        return self.total_depth / self.samples if self.samples else 0.0
+
+
+class Pipeline:
+    def __init__(self, input_dir, fast=False, incremental=False, auto_k=False, taxonomy=False,
+                 index=True, synthesize=True, minibatch=False, workdir=".", streaming_dedup=False):
+        self.input_dir = input_dir
+        self.workdir = workdir
+        self.fast = fast
+        self.incremental = incremental
+        self.auto_k = auto_k
+        self.taxonomy = taxonomy
+        self.index = index
+        self.synthesize = synthesize
+        self.minibatch = minibatch
+        self.streaming_dedup = streaming_dedup
+        self.parsed = asyncio.Queue(maxsize=PARSE_QUEUE_SIZE)
+        self.unique = asyncio.Queue(maxsize=DEDUP_QUEUE_SIZE)
+        self.cases = asyncio.Queue(maxsize=EMBED_QUEUE_SIZE)
+        # Set once the run is over, so a parse thread blocked on a full queue gives up
+        self.stop = threading.Event()
+        self.stats = {name: StageStats(name) for name in ("parse", "dedup", "extract", "embed", "synthesize")}
+        self.queues = [
+            QueueStats("parse->dedup", self.parsed),
+            QueueStats("dedup->extract", self.unique),
+            QueueStats("extract->embed", self.cases),
+        ]
+
+    def path(self, name):
+        """A stage script's default file name, inside the workdir."""
+        return os.path.join(self.workdir, name)
+
+    # ------------------------------------------
+    # STAGES
+    # ------------------------------------------
+    def _put_parsed(self, item, loop):
+        """
+        Puts from the parse thread, waiting for room in the queue. Returns
+        False, without putting, once the pipeline has stopped.
+        """
+        if self.stop.is_set():
+            return False
+        future = asyncio.run_coroutine_threadsafe(self.parsed.put(item), loop)
+        while True:
+            try:
+                future.result(timeout=STOP_POLL_SECONDS)
+                return True
+            except concurrent.futures.TimeoutError:
+                if self.stop.is_set():
+                    future.cancel()
+                    return False
+
+    def _parse_files(self, loop):
+        """
+        Runs in a worker thread: parsing is synchronous. Each put waits for
+        room in the queue, so a slow extract stage throttles parsing too.
+        If the pipeline stops first, the thread returns and the previous
+        output is left in place.
+        """
+        stats = self.stats["parse"]
+        stats.start()
+        file_paths = parse.list_input_files(self.input_dir)
+        output_file = self.path(parse.OUTPUT_JSONL_FILE)
+        tmp_file = output_file + ".tmp"
+        posts = parse.iter_posts_incremental(file_paths, self.fast, self.path(parse.MANIFEST_FILE),
+                                             self.path(parse.CACHE_DIR))
+        with open(tmp_file, 'w', encoding='utf-8') as f_out:
+            for post in posts:
+                f_out.write(json.dumps(post, default=parse.encode_json))
+                f_out.write('\n')
+                stats.emitted += 1
+                if not self._put_parsed(post, loop):
+                    posts.close()
+                    return
+        os.replace(tmp_file, output_file)
+        self._put_parsed(None, loop)
+        stats.finish()
+
+    async def parse_stage(self):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._parse_files, loop)
+
+    async def dedup_stage(self):
+        """
+        dedup.py's result: every post is signed as it is parsed, then the
+        parse output is replayed with each near-duplicate group collapsed
+        into its highest-scored post, the others' comments merged in. The
+        output matches dedup.py's; posts below MIN_POST_SCORE are written
+        but, as in extractor.py, not extracted.
+        """
+        if self.streaming_dedup:
+            await self.streaming_dedup_stage()
+            return
+        stats = self.stats["dedup"]
+        index = dedup.DuplicateIndex()
+        while True:
+            post = await self.parsed.get()
+            if post is None:
+                break
+            stats.start()
+            stats.received += 1
+            index.add(post)
+
+        # Replayed from the parse output rather than held in memory
+        output_file = self.path(dedup.OUTPUT_FILE)
+        tmp_file = output_file + ".tmp"
+        posts = parse.iter_posts(self.path(parse.OUTPUT_JSONL_FILE))
+        with open(tmp_file, 'w', encoding='utf-8') as f_out:
+            for record in dedup.iter_deduped(posts, index.roots()):
+                f_out.write(json.dumps(record))
+                f_out.write('\n')
+                if record.get('score', 0) < extractor.MIN_POST_SCORE:
+                    continue
+                stats.emitted += 1
+                await self.unique.put(record)
+        os.replace(tmp_file, output_file)
+        stats.skipped = stats.received - stats.emitted
+        for _ in range(extractor.MAX_CONCURRENT_REQUESTS):
+            await self.unique.put(None)
+        stats.finish()
+
+    async def streaming_dedup_stage(self):
+        """
+        --streaming-dedup: the first post of a near-duplicate group goes on
+        to extraction at once and later members are dropped, comments and
+        all, so extraction overlaps parsing. Posts extraction would skip for
+        their score are dropped before they can claim a group.
+        """
+        stats = self.stats["dedup"]
+        index = dedup.DuplicateIndex()
+        output_file = self.path(dedup.OUTPUT_FILE)
+        tmp_file = output_file + ".tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f_out:
+            while True:
+                post = await self.parsed.get()
+                if post is None:
+                    break
+                stats.start()
+                stats.received += 1
+                if post.get('score', 0) < extractor.MIN_POST_SCORE:
+                    stats.skipped += 1
+                    continue
+                position = len(index)
+                if index.add(post) != position:
+                    stats.skipped += 1
+                    continue
+                f_out.write(json.dumps(post, default=parse.encode_json))
+                f_out.write('\n')
+                stats.emitted += 1
+                await self.unique.put(post)
+        os.replace(tmp_file, output_file)
+        for _ in range(extractor.MAX_CONCURRENT_REQUESTS):
+            await self.unique.put(None)
+        stats.finish()
+
+    async def extract_stage(self):
+        stats = self.stats["extract"]
+        checkpoint = extractor.open_checkpoint(self.path(extractor.OUTPUT_FILE))
+        processed_urls = set(checkpoint.done)
+        journaled_urls = set(extractor.get_failure_journal().pending)
+        limiter = extractor.make_rate_limiter()
+        print(f"Extract: {len(processed_urls)} threads already in {checkpoint.output_file}, "
+              f"{len(journaled_urls)} journaled failures left to --retry-failures.")
+
+        async def worker(writer):
+            while True:
+                post = await self.unique.get()
+                if post is None:
+                    return
+                stats.start()
+                stats.received += 1
+                url = post.get('url')
+                if url in processed_urls or url in journaled_urls:
+                    stats.skipped += 1
+                    continue
+                for result in await extractor.process_batch(limiter, [(post, None)]):
+                    if result:
+                        writer.write(result)
+                        stats.emitted += 1
+                        await self.cases.put(result)
+
+        async with extractor.open_writer(checkpoint) as writer:
+            await asyncio.gather(*(worker(writer) for _ in range(extractor.MAX_CONCURRENT_REQUESTS)))
+        await self.cases.put(None)
+        stats.finish()
+        self.extract_usage = limiter.summary()
+
+    async def embed_stage(self):
+        """
+        Embeds cases as extraction produces them, so synthesis later finds
+        them all in the store. Cases from earlier runs are picked up there.
+        """
+        stats = self.stats["embed"]
+        store = EmbeddingStore(self.path(synthesizer.EMBEDDING_STORE))
+        batch = []
+        deadline = None
+
+        async def flush():
+            nonlocal batch, deadline
+            if batch:
+                texts = [synthesizer.case_embedding_text(case) for case in batch]
+                await synthesizer.generate_embeddings_async(texts, progress=False, store=store)
+                stats.emitted += len(batch)
+            batch = []
+            deadline = None
+
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.perf_counter())
+            try:
+                case = await asyncio.wait_for(self.cases.get(), timeout)
+            except asyncio.TimeoutError:
+                await flush()
+                continue
+            if case is None:
+                break
+            stats.start()
+            stats.received += 1
+            batch.append(case)
+            deadline = deadline or time.perf_counter() + EMBED_FLUSH_SECONDS
+            if len(batch) >= EMBED_BATCH:
+                await flush()
+        await flush()
+        stats.finish()
+
+    async def synthesize_stage(self):
+        stats = self.stats["synthesize"]
+        stats.start()
+        await synthesizer.main(self.incremental, self.auto_k, self.taxonomy, self.index, minibatch=self.minibatch,
+                               input_file=self.path(extractor.OUTPUT_FILE), workdir=self.workdir)
+        stats.finish()
+
+    # ------------------------------------------
+    # REPORTING
+    # ------------------------------------------
+    def progress_line(self):
+        stages = " | ".join(
+            f"{s.name} {s.emitted:,} ({s.rate():,.1f}/s)" for s in self.stats.values() if s.started is not None
+        )
+        queues = " ".join(f"{q.name} {q.sample()}/{q.queue.maxsize}" for q in self.queues)
+        return f"[pipeline] {stages} || queues {queues}"
+
+    async def reporter(self):
+        while True:
+            await asyncio.sleep(REPORT_EVERY_SECONDS)
+            print(self.progress_line(), flush=True)
+
+    def print_summary(self):
+        print(f"\n{'stage':<11} {'in':>9} {'out':>9} {'skipped':>9} {'seconds':>9} {'out/s':>9}")
+        for s in self.stats.values():
+            if s.started is None:
+                continue
+            print(f"{s.name:<11} {s.received:>9,} {s.emitted:>9,} {s.skipped:>9,} {s.elapsed():>9.1f} {s.rate():>9.1f}")
+        print(f"\n{'queue':<15} {'capacity':>9} {'mean':>9} {'max':>9}")
+        for q in self.queues:
+            print(f"{q.name:<15} {q.queue.maxsize:>9} {q.mean_depth():>9.1f} {q.max_depth:>9}")
+
+    def record_metrics(self):
+        """Stage totals and queue depths, next to what each stage's own code recorded."""
+        for s in self.stats.values():
+            if s.started is not None:
+                metrics.registry.record_stage(f"pipeline_{s.name}", s.emitted, s.elapsed())
+                metrics.registry.inc("pipeline_skipped", s.skipped, stage=s.name)
+        for q in self.queues:
+            metrics.registry.set_gauge("queue_capacity", q.queue.maxsize, queue=q.name)
+            metrics.registry.set_gauge("queue_mean_depth", round(q.mean_depth(), 2), queue=q.name)
+            metrics.registry.set_gauge("queue_max_depth", q.max_depth, queue=q.name)
+
+    async def run(self):
+        # Sample queue depths well inside each report interval too
+        async def sampler():
+            while True:
+                await asyncio.sleep(0.5)
+                for q in self.queues:
+                    q.sample()
+
+        os.makedirs(self.workdir, exist_ok=True)
+        extractor.set_failure_journal(FailureJournal(self.path(extractor.FAILURE_JOURNAL_FILE)))
+        cache = LLMCache(self.path(CACHE_FILE))
+        extractor.set_response_cache(cache)
+        synthesizer.set_response_cache(cache)
+
+        background = [asyncio.create_task(self.reporter()), asyncio.create_task(sampler())]
+        stages = [asyncio.create_task(stage) for stage in
+                  (self.parse_stage(), self.dedup_stage(), self.extract_stage(), self.embed_stage())]
+        started = time.perf_counter()
+        try:
+            # The stages around a failed one would wait on its queue forever:
+            # cancel them and re-raise the failure
+            done, pending = await asyncio.wait(stages, return_when=asyncio.FIRST_EXCEPTION)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            for task in stages:
+                if task in done:
+                    task.result()
+            extractor.print_failure_summary()
+            print(f"Extraction API usage: {self.extract_usage}")
+            if self.synthesize:
+                await self.synthesize_stage()
+        finally:
+            self.stop.set()
+            for task in background + stages:
+                task.cancel()
+            self.record_metrics()
+        self.print_summary()
+        print(f"\nPipeline finished in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run parse -> dedup -> extract -> synthesize as one streaming pipeline.")
+    parser.add_argument("--input-dir", default=parse.INPUT_DIR, help="Directory containing the .txt dumps")
+    parser.add_argument("--workdir", default=".",
+                        help="Directory for every output and checkpoint (the stage scripts' default file names)")
+    parser.add_argument("--fast", action="store_true", help="Use the mmap tokenizer for parsing")
+    parser.add_argument("--streaming-dedup", action="store_true",
+                        help="Start extraction while parsing runs: keep the first post of each duplicate group "
+                             "instead of dedup.py's highest-scored post with merged comments")
+    parser.add_argument("--no-synthesize", action="store_true", help="Stop after extraction and embedding")
+    parser.add_argument("--incremental", action="store_true", help="Incremental synthesis (stable cluster ids)")
+    parser.add_argument("--auto-k", action="store_true", help="Choose the number of clusters by silhouette")
+    parser.add_argument("--taxonomy", action="store_true", help="Build categories -> failure modes")
+    parser.add_argument("--minibatch", action="store_true", help="Mini-batch k-means for fixed-K clustering")
+    parser.add_argument("--no-index", action="store_true", help="Skip exporting the search index")
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+
+    pipeline = Pipeline(args.input_dir, args.fast, args.incremental, args.auto_k, args.taxonomy,
+                        not args.no_index, not args.no_synthesize, args.minibatch, workdir=args.workdir,
+                        streaming_dedup=args.streaming_dedup)
+    with metrics.session("pipeline", args.metrics_file, args.profile):
+        asyncio.run(pipeline.run())
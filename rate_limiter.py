@@ -0,0 +1,211 @@
+import asyncio
+import collections
+import random
+import time
+from metrics import registry
+
+# ==========================================
+# RATE LIMITING FOR LLM CALLS
+# ==========================================
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    """Rough prompt size; Gemini averages about four characters per token."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def is_rate_limit_error(exc):
+    """
+    True for 429 / RESOURCE_EXHAUSTED errors from either Google client,
+    judged by the status the exception carries rather than its message.
+    """
+    for attribute in ("code", "status_code"):
+        if getattr(exc, attribute, None) == 429:
+            return True
+    if getattr(exc, "status", None) == "RESOURCE_EXHAUSTED":
+        return True
+    if type(exc).__name__ in ("ResourceExhausted", "TooManyRequests"):
+        return True
+    return "RESOURCE_EXHAUSTED" in str(exc)
+
+
+def usage_tokens(response):
+    """Total tokens the API reports for a response, if it reports any."""
+    usage = getattr(response, "usage_metadata", None)
+    return getattr(usage, "total_token_count", None) if usage else None
+
+
+def usage_split(response, estimated_prompt_tokens):
+    """(prompt, response) tokens the API reports, else the prompt estimate and 0."""
+    usage = getattr(response, "usage_metadata", None)
+    prompt = getattr(usage, "prompt_token_count", None) if usage else None
+    output = getattr(usage, "candidates_token_count", None) if usage else None
+    return (prompt if prompt is not None else estimated_prompt_tokens), (output or 0)
+
+
+class TokenBucket:
+    """A per-minute budget that refills continuously."""
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.level = per_minute
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        """Seconds until `amount` can be taken (0 if it can be taken now)."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount):
+        self._refill()
+        self.level -= amount
+
+
+class AdaptiveRateLimiter:
+    """
+    Gates LLM calls on three budgets at once: requests/min, tokens/min and
+    in-flight concurrency. Concurrency adapts AIMD-style: it halves on a 429
+    (at most once per backoff window) and grows by one after every
+    `increase_every` consecutive successes, up to `max_concurrency`.
+    Callers waiting for a concurrency slot are queued in arrival order and
+    woken only when a slot is handed to them. Every attempt is recorded in
+    the metrics registry under `name`.
+    """
+
+    def __init__(self, requests_per_minute, tokens_per_minute, max_concurrency,
+                 min_concurrency=1, increase_every=20, max_retries=6,
+                 base_backoff=1.0, max_backoff=60.0, name="llm"):
+        self.name = name
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.concurrency = max_concurrency
+        self.increase_every = increase_every
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+
+        self.in_flight = 0
+        # Futures of callers waiting for a slot, oldest first
+        self.waiters = collections.deque()
+        self.cooldown_until = 0.0
+        self.success_streak = 0
+        self.stats = {"requests": 0, "rate_limited": 0, "gave_up": 0, "tokens": 0}
+
+    async def acquire(self, tokens):
+        """
+        Takes a concurrency slot, then waits out any cooldown and the
+        RPM/TPM buckets while holding it, so only slot holders ever sleep.
+        """
+        await self._take_slot()
+        try:
+            while True:
+                now = time.monotonic()
+                if now < self.cooldown_until:
+                    await asyncio.sleep(self.cooldown_until - now)
+                    continue
+                wait = max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                    continue
+                self.requests.take(1)
+                self.tokens.take(tokens)
+                return
+        except BaseException:
+            self.release()
+            raise
+
+    async def _take_slot(self):
+        if self.in_flight < self.concurrency and not self.waiters:
+            self.in_flight += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        try:
+            # _hand_off counts the slot as ours before resolving the future
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            elif waiter in self.waiters:
+                self.waiters.remove(waiter)
+            raise
+
+    def _hand_off(self):
+        """Gives free slots to the oldest waiters, one each."""
+        while self.waiters and self.in_flight < self.concurrency:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def release(self):
+        self.in_flight -= 1
+        self._hand_off()
+
+    def on_success(self, estimated_tokens, response=None):
+        self.stats["requests"] += 1
+        # Settle the token estimate against what the API actually billed
+        actual = usage_tokens(response)
+        if actual is not None:
+            self.tokens.take(actual - estimated_tokens)
+        self.stats["tokens"] += actual if actual is not None else estimated_tokens
+
+        self.success_streak += 1
+        if self.success_streak >= self.increase_every and self.concurrency < self.max_concurrency:
+            self.concurrency += 1
+            self.success_streak = 0
+            self._hand_off()
+
+    def on_rate_limit(self, attempt):
+        """Shrinks concurrency and opens a jittered cooldown window. Returns its length."""
+        self.stats["rate_limited"] += 1
+        self.success_streak = 0
+        now = time.monotonic()
+        if now >= self.cooldown_until:
+            self.concurrency = max(self.min_concurrency, self.concurrency // 2)
+        backoff = min(self.max_backoff, self.base_backoff * 2 ** attempt) * random.uniform(0.5, 1.5)
+        self.cooldown_until = max(self.cooldown_until, now + backoff)
+        return backoff
+
+    async def call(self, func, *args, tokens=0, **kwargs):
+        """
+        Awaits func(*args, **kwargs) within the budgets. Rate-limit errors are
+        retried after the cooldown; any other exception propagates.
+        """
+        for attempt in range(self.max_retries):
+            await self.acquire(tokens)
+            started = time.perf_counter()
+            try:
+                response = await func(*args, **kwargs)
+            except Exception as e:
+                rate_limited = is_rate_limit_error(e)
+                registry.record_llm_call(self.name, time.perf_counter() - started,
+                                         "rate_limited" if rate_limited else "error")
+                if not rate_limited:
+                    raise
+                if attempt == self.max_retries - 1:
+                    self.stats["gave_up"] += 1
+                    raise
+                registry.record_retry(self.name, "rate_limit")
+                self.on_rate_limit(attempt)
+                continue
+            finally:
+                self.release()
+            registry.record_llm_call(self.name, time.perf_counter() - started, "ok", *usage_split(response, tokens))
+            self.on_success(tokens, response)
+            return response
+
+    def summary(self):
+        return (f"{self.stats['requests']} requests, ~{self.stats['tokens']:,} tokens, "
+                f"{self.stats['rate_limited']} rate-limited, {self.stats['gave_up']} gave up, "
+                f"final concurrency {self.concurrency}/{self.max_concurrency}")
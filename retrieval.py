@@ -0,0 +1,467 @@
+import argparse
+import asyncio
+import json
+import os
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+from cluster_state import nearest_centroids
+from sklearn.cluster import KMeans
+from llm_backend import GeminiBackend
+from synthesizer import GOOGLE_API_KEY, EMBEDDING_MODEL
+from vector_index import INDEX_PREFIX, load_index, normalize_rows
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+# Reads the index synthesizer.py exports (data/vector_index.*); the ANN
+# structure is built from it on first use and cached next to it
+ANN_SUFFIX = ".ivfpq.npz"
+QUERY_TASK_TYPE = "RETRIEVAL_QUERY"
+DEFAULT_K = 10
+# Coarse lists default to about sqrt(rows), within these bounds
+MIN_LISTS = 1
+MAX_LISTS = 4096
+# Lists scanned per query; more means better recall and slower queries
+NPROBE = 16
+# Product quantization: dim is split into this many subvectors, each
+# encoded as one byte (256 codewords)
+PQ_SUBVECTORS = 48
+PQ_CODEWORDS = 256
+# Compressed-distance candidates re-scored with the exact float32 rows
+RERANK_CANDIDATES = 100
+# Coarse centroids train on about this many rows per list (at most
+# TRAIN_SAMPLE); codebooks on PQ_TRAIN_SAMPLE residuals
+TRAIN_ROWS_PER_LIST = 64
+TRAIN_SAMPLE = 100_000
+PQ_TRAIN_SAMPLE = 10_000
+TRAIN_ITERATIONS = 25
+# Rows processed per step when assigning and encoding
+ENCODE_CHUNK = 8192
+# A filter that leaves at most this many rows is searched exactly instead
+EXACT_SEARCH_MAX_ROWS = 20_000
+EXACT_QUERY_BATCH = 32
+QUERY_CACHE_SIZE = 1024
+HOST = "127.0.0.1"
+PORT = 8765
+SEED = 42
+# ==========================================
+
+_backend = None
+
+def get_backend():
+    """The Gemini client, created on first use so another backend can be set first."""
+    global _backend
+    if _backend is None:
+        _backend = GeminiBackend(GOOGLE_API_KEY)
+    return _backend
+
+def set_backend(backend):
+    global _backend
+    _backend = backend
+
+
+def default_nlist(count):
+    return int(min(MAX_LISTS, max(MIN_LISTS, round(np.sqrt(count)))))
+
+
+def train_centroids(sample, k, seed=SEED):
+    """
+    Plain Lloyd's k-means from random starts. k-means++ seeding costs more
+    than the fit itself at these sizes, and a quantizer doesn't need it.
+    """
+    model = KMeans(n_clusters=k, init="random", n_init=1, max_iter=TRAIN_ITERATIONS, random_state=seed)
+    return model.fit(sample).cluster_centers_.astype(np.float32)
+
+
+def top_k(scores, k):
+    """Indices of the k highest scores, best first."""
+    if len(scores) <= k:
+        return np.argsort(-scores, kind='stable')
+    best = np.argpartition(-scores, k - 1)[:k]
+    return best[np.argsort(-scores[best], kind='stable')]
+
+
+def exact_search(vectors, queries, k, rows=None):
+    """
+    Brute-force cosine search over unit-length rows (optionally only `rows`).
+    Returns (row ids, scores), each (len(queries), k) and padded with -1/-inf.
+    """
+    queries = normalize_rows(np.atleast_2d(queries))
+    candidates = vectors if rows is None else vectors[rows]
+    ids = np.full((len(queries), k), -1, dtype=np.int64)
+    scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+    if len(candidates) == 0:
+        return ids, scores
+    # Queries in small groups keep the similarity matrix bounded
+    for start in range(0, len(queries), EXACT_QUERY_BATCH):
+        similarity = queries[start:start + EXACT_QUERY_BATCH] @ np.asarray(candidates).T
+        for offset, row_scores in enumerate(similarity):
+            best = top_k(row_scores, k)
+            ids[start + offset, :len(best)] = best if rows is None else rows[best]
+            scores[start + offset, :len(best)] = row_scores[best]
+    return ids, scores
+
+
+class IVFPQIndex:
+    """
+    Inverted file with product quantization. Rows are grouped under their
+    nearest coarse centroid; each row's residual from that centroid is
+    stored as PQ_SUBVECTORS one-byte codes. A query scans the NPROBE nearest
+    lists with per-list lookup tables, then re-scores the best candidates
+    against the exact float32 rows when they are available.
+    """
+
+    def __init__(self, coarse, codebooks, codes, order, offsets):
+        self.coarse = coarse        # (nlist, dim) float32
+        self.codebooks = codebooks  # (m, ksub, dim // m) float32
+        self.codes = codes          # (rows, m) uint8, grouped by list
+        self.order = order          # original row id of each code row
+        self.offsets = offsets      # list i holds code rows offsets[i]:offsets[i + 1]
+        self.codebook_sq = np.einsum('jcd,jcd->jc', codebooks, codebooks)
+        self.coarse_sq = np.einsum('ij,ij->i', coarse, coarse)
+
+    def __len__(self):
+        return len(self.order)
+
+    @property
+    def nlist(self):
+        return len(self.coarse)
+
+    @classmethod
+    def train(cls, vectors, nlist=None, subvectors=PQ_SUBVECTORS, seed=SEED):
+        count, dim = vectors.shape
+        if dim % subvectors:
+            raise ValueError(f"dim {dim} isn't divisible into {subvectors} subvectors")
+        nlist = min(nlist or default_nlist(count), count)
+        rng = np.random.default_rng(seed)
+
+        def sample_rows(size):
+            if count <= size:
+                return np.asarray(vectors, dtype=np.float32)
+            return np.asarray(vectors[np.sort(rng.choice(count, size, replace=False))], dtype=np.float32)
+
+        coarse = train_centroids(sample_rows(min(TRAIN_SAMPLE, TRAIN_ROWS_PER_LIST * nlist)), nlist, seed)
+        sample = sample_rows(PQ_TRAIN_SAMPLE)
+        residuals = sample - coarse[nearest_centroids(sample, coarse)[0]]
+        width = dim // subvectors
+        ksub = min(PQ_CODEWORDS, len(sample))
+        codebooks = np.stack([
+            train_centroids(residuals[:, j * width:(j + 1) * width], ksub, seed) for j in range(subvectors)
+        ])
+
+        index = cls(coarse, codebooks, np.empty((0, subvectors), dtype=np.uint8),
+                    np.empty(0, dtype=np.int64), np.zeros(nlist + 1, dtype=np.int64))
+        assignment = np.empty(count, dtype=np.int64)
+        codes = np.empty((count, subvectors), dtype=np.uint8)
+        for start in range(0, count, ENCODE_CHUNK):
+            chunk = np.asarray(vectors[start:start + ENCODE_CHUNK], dtype=np.float32)
+            lists, codes[start:start + len(chunk)] = index.encode(chunk)
+            assignment[start:start + len(chunk)] = lists
+        order = np.argsort(assignment, kind='stable')
+        index.codes = codes[order]
+        index.order = order
+        index.offsets = np.searchsorted(assignment[order], np.arange(nlist + 1))
+        return index
+
+    def encode(self, vectors):
+        """(coarse list, PQ codes) for each row."""
+        lists = nearest_centroids(vectors, self.coarse)[0]
+        residuals = vectors - self.coarse[lists]
+        width = self.codebooks.shape[2]
+        codes = np.empty((len(vectors), len(self.codebooks)), dtype=np.uint8)
+        for j, codebook in enumerate(self.codebooks):
+            codes[:, j] = nearest_centroids(residuals[:, j * width:(j + 1) * width], codebook)[0]
+        return lists, codes
+
+    def search(self, queries, k=DEFAULT_K, nprobe=NPROBE, mask=None, vectors=None, rerank=RERANK_CANDIDATES):
+        """
+        Approximate cosine search. `mask` (bool per row) restricts results;
+        with `vectors` the top `rerank` candidates are re-scored exactly.
+        Returns (row ids, scores) like exact_search.
+        """
+        queries = normalize_rows(np.atleast_2d(queries))
+        nprobe = min(nprobe, self.nlist)
+        coarse_distances = self.coarse_sq[None, :] - 2.0 * queries @ self.coarse.T
+        probes = np.argsort(coarse_distances, axis=1)[:, :nprobe]
+        subvectors, ksub, width = self.codebooks.shape
+        columns = np.arange(subvectors, dtype=np.int32)
+        shortlist = max(k, rerank if vectors is not None else k)
+
+        ids = np.full((len(queries), k), -1, dtype=np.int64)
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        for qi, query in enumerate(queries):
+            lists = probes[qi]
+            starts, stops = self.offsets[lists], self.offsets[lists + 1]
+            lengths = stops - starts
+            if not lengths.any():
+                continue
+            # Code rows of every probed list, and which probe each came from
+            probe_of = np.repeat(np.arange(len(lists)), lengths)
+            code_rows = np.arange(lengths.sum()) + np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+            rows = self.order[code_rows]
+            if mask is not None:
+                keep = mask[rows]
+                if not keep.any():
+                    continue
+                rows, code_rows, probe_of = rows[keep], code_rows[keep], probe_of[keep]
+            # tables[p, j, c] = |residual_pj - codeword_jc|^2, one table per probed list
+            residuals = (query[None, :] - self.coarse[lists]).reshape(len(lists), subvectors, width)
+            cross = np.matmul(residuals.transpose(1, 0, 2), self.codebooks.transpose(0, 2, 1)).transpose(1, 0, 2)
+            tables = (
+                np.einsum('pjd,pjd->pj', residuals, residuals)[:, :, None]
+                - 2.0 * cross
+                + self.codebook_sq[None]
+            )
+            flat = (probe_of.astype(np.int32)[:, None] * subvectors + columns) * ksub + self.codes[code_rows]
+            # For unit vectors |q - x|^2 = 2 - 2 cos(q, x)
+            similarity = 1.0 - 0.5 * tables.ravel()[flat].sum(axis=1)
+            best = top_k(similarity, shortlist)
+            rows, similarity = rows[best], similarity[best]
+            if vectors is not None:
+                by_row = np.argsort(rows)
+                exact = np.empty(len(rows), dtype=np.float32)
+                exact[by_row] = np.asarray(vectors[rows[by_row]]) @ query
+                similarity = exact
+            best = top_k(similarity, k)
+            ids[qi, :len(best)] = rows[best]
+            scores[qi, :len(best)] = similarity[best]
+        return ids, scores
+
+    def save(self, path, fingerprint):
+        with open(path + ".tmp", 'wb') as f:
+            np.savez(f, coarse=self.coarse, codebooks=self.codebooks, codes=self.codes,
+                     order=self.order, offsets=self.offsets, fingerprint=np.array(fingerprint))
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path, fingerprint):
+        """The saved index, or None if missing or built from a different export."""
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as saved:
+            if saved["fingerprint"].tolist() != list(fingerprint):
+                return None
+            return cls(saved["coarse"], saved["codebooks"], saved["codes"], saved["order"], saved["offsets"])
+
+
+class QueryEmbeddingCache:
+    """In-memory LRU of query text -> unit-length embedding."""
+
+    def __init__(self, capacity=QUERY_CACHE_SIZE):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, text):
+        with self.lock:
+            vector = self.entries.get(text)
+            if vector is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(text)
+            self.hits += 1
+            return vector
+
+    def put(self, text, vector):
+        with self.lock:
+            self.entries[text] = vector
+            self.entries.move_to_end(text)
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+
+    def summary(self):
+        lookups = self.hits + self.misses
+        rate = self.hits / lookups if lookups else 0.0
+        return f"{self.hits} hits, {self.misses} misses ({rate:.0%} hit rate), {len(self.entries)}/{self.capacity} cached"
+
+
+class Retriever:
+    """
+    Case and entry search over the exported index: query embedding through
+    an LRU cache, metadata filters as row masks, IVF-PQ for broad queries
+    and exact search when a filter leaves few rows.
+    """
+
+    def __init__(self, prefix=INDEX_PREFIX, nprobe=NPROBE, cache_size=QUERY_CACHE_SIZE, rebuild=False):
+        self.vectors, meta = load_index(prefix)
+        self.records = meta["records"]
+        self.nprobe = nprobe
+        self.query_cache = QueryEmbeddingCache(cache_size)
+
+        fingerprint = [meta["count"], meta["dim"], os.path.getmtime(prefix + ".f32") if meta["count"] else 0]
+        self.ann = None if rebuild else IVFPQIndex.load(prefix + ANN_SUFFIX, fingerprint)
+        # Small indexes are searched exactly unless an ANN index is asked for
+        if rebuild or (self.ann is None and len(self.vectors) > EXACT_SEARCH_MAX_ROWS):
+            print(f"Building IVF-PQ index over {len(self.vectors)} vectors...")
+            self.ann = IVFPQIndex.train(self.vectors)
+            self.ann.save(prefix + ANN_SUFFIX, fingerprint)
+
+        # Filter columns
+        self.kinds = np.array([record["kind"] for record in self.records])
+        metadata = [record["metadata"] for record in self.records]
+        self.subreddits = np.array([str(m.get("subreddit") or "").lower() for m in metadata])
+        self.scores = np.array([m.get("original_score") if isinstance(m.get("original_score"), (int, float)) else np.nan
+                                for m in metadata], dtype=np.float64)
+        self.tag_rows = {}
+        for row, m in enumerate(metadata):
+            for tag in m.get("tags") or []:
+                self.tag_rows.setdefault(str(tag).lower(), []).append(row)
+
+    def filter_mask(self, kind="case", subreddit=None, tags=None, min_score=None, max_score=None):
+        """
+        Rows passing every given filter, or None when nothing is filtered.
+        `subreddit` and `tags` accept a value or a list; a row matches tags
+        if it carries any of them.
+        """
+        mask = np.ones(len(self.records), dtype=bool)
+        filtered = False
+        if kind:
+            mask &= self.kinds == kind
+            filtered = True
+        if subreddit:
+            wanted = [subreddit] if isinstance(subreddit, str) else subreddit
+            mask &= np.isin(self.subreddits, [s.lower() for s in wanted])
+            filtered = True
+        if tags:
+            wanted = [tags] if isinstance(tags, str) else tags
+            tagged = np.zeros(len(self.records), dtype=bool)
+            for tag in wanted:
+                tagged[self.tag_rows.get(tag.lower(), [])] = True
+            mask &= tagged
+            filtered = True
+        if min_score is not None:
+            mask &= self.scores >= min_score
+            filtered = True
+        if max_score is not None:
+            mask &= self.scores <= max_score
+            filtered = True
+        return mask if filtered else None
+
+    def search_vectors(self, queries, k=DEFAULT_K, mask=None):
+        """(row ids, scores) for query vectors; exact when few rows qualify."""
+        allowed = len(self.records) if mask is None else int(mask.sum())
+        if self.ann is None or allowed <= EXACT_SEARCH_MAX_ROWS:
+            rows = None if mask is None else np.flatnonzero(mask)
+            return exact_search(self.vectors, queries, k, rows)
+        return self.ann.search(queries, k, self.nprobe, mask, self.vectors)
+
+    async def embed_queries(self, texts):
+        """Unit-length query embeddings; cache misses go to the API in one call."""
+        vectors = [self.query_cache.get(text) for text in texts]
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+        if missing:
+            result = await get_backend().embed(missing, model=EMBEDDING_MODEL, task_type=QUERY_TASK_TYPE)
+            fresh = dict(zip(missing, normalize_rows(result)))
+            for text, vector in fresh.items():
+                self.query_cache.put(text, vector)
+            vectors = [fresh[text] if vector is None else vector for text, vector in zip(texts, vectors)]
+        return np.stack(vectors) if vectors else np.empty((0, self.vectors.shape[1]), dtype=np.float32)
+
+    async def search(self, queries, k=DEFAULT_K, **filters):
+        """One result list per query text: [{"id", "kind", "score", "metadata"}, ...]."""
+        vectors = await self.embed_queries(queries)
+        mask = self.filter_mask(**filters)
+        ids, scores = await asyncio.to_thread(self.search_vectors, vectors, k, mask)
+        return [
+            [
+                {**{key: self.records[row][key] for key in ("id", "kind", "metadata")}, "score": float(score)}
+                for row, score in zip(row_ids, row_scores) if row >= 0
+            ]
+            for row_ids, row_scores in zip(ids, scores)
+        ]
+
+
+# ==========================================
+# HTTP SERVICE
+# ==========================================
+# POST /search {"queries": [...], "k": 10, "filters": {"subreddit": ..., "tags": [...],
+#               "min_score": ..., "max_score": ..., "kind": "case" | "entry" | null}}
+# GET  /health
+FILTER_KEYS = ("kind", "subreddit", "tags", "min_score", "max_score")
+
+
+def serve(retriever, host=HOST, port=PORT):
+    # One event loop owns the backend client; handler threads submit to it
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+
+    class Handler(BaseHTTPRequestHandler):
+        def send_json(self, status, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path != "/health":
+                return self.send_json(404, {"error": "not found"})
+            self.send_json(200, {
+                "rows": len(retriever.records),
+                "ann": retriever.ann is not None,
+                "query_cache": retriever.query_cache.summary(),
+            })
+
+        def do_POST(self):
+            if self.path != "/search":
+                return self.send_json(404, {"error": "not found"})
+            try:
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                queries = request.get("queries") or [request["query"]]
+                filters = {key: value for key, value in (request.get("filters") or {}).items() if key in FILTER_KEYS}
+                k = int(request.get("k", DEFAULT_K))
+            except (ValueError, KeyError, TypeError) as e:
+                return self.send_json(400, {"error": f"bad request: {e}"})
+            try:
+                future = asyncio.run_coroutine_threadsafe(retriever.search(queries, k, **filters), loop)
+                self.send_json(200, {"results": future.result()})
+            except Exception as e:
+                self.send_json(502, {"error": str(e)})
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    print(f"Serving {len(retriever.records)} vectors on http://{host}:{port} (POST /search, GET /health)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        loop.call_soon_threadsafe(loop.stop)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Search the exported case and entry index.")
+    parser.add_argument("--index", default=INDEX_PREFIX, help="Index path prefix")
+    parser.add_argument("--nprobe", type=int, default=NPROBE, help="IVF lists scanned per query")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    subcommands.add_parser("build", help="(Re)build the IVF-PQ index")
+    query_parser = subcommands.add_parser("query", help="Run queries and print results")
+    query_parser.add_argument("queries", nargs="+")
+    query_parser.add_argument("--k", type=int, default=DEFAULT_K)
+    query_parser.add_argument("--kind", default="case", help="case, entry, or '' for both")
+    query_parser.add_argument("--subreddit", action="append")
+    query_parser.add_argument("--tag", action="append", dest="tags")
+    query_parser.add_argument("--min-score", type=int)
+    query_parser.add_argument("--max-score", type=int)
+    serve_parser = subcommands.add_parser("serve", help="Run the HTTP service")
+    serve_parser.add_argument("--host", default=HOST)
+    serve_parser.add_argument("--port", type=int, default=PORT)
+    args = parser.parse_args()
+
+    retriever = Retriever(args.index, args.nprobe, rebuild=args.command == "build")
+    if args.command == "query":
+        results = asyncio.run(retriever.search(
+            args.queries, args.k, kind=args.kind or None, subreddit=args.subreddit, tags=args.tags,
+            min_score=args.min_score, max_score=args.max_score
+        ))
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+    elif args.command == "serve":
+        serve(retriever, args.host, args.port)
@@ -7,6 +7,10 @@ import { embedMany } from 'ai';
 
 dotenv.config({ path: '.env.local' });
 
+// Legacy: synthesizer.py now exports data/vector_index.{f32,json} (entries and
+// cases) from embeddings it already has, and lib/vector-store.ts prefers that.
+// This script is only needed for entries edited by hand after synthesis.
+
 const PEDIA_DIR = path.join(process.cwd(), 'pedia_entries');
 const OUTPUT_FILE = path.join(process.cwd(), 'data', 'vector_store.json');
 
@@ -1,12 +1,22 @@
 import json
 import os
 import numpy as np
-from sklearn.cluster import KMeans
-from google import genai
-from google.genai import types
 from tqdm.asyncio import tqdm_asyncio
 import asyncio
 import time
+import hashlib
+import argparse
+from rate_limiter import AdaptiveRateLimiter, estimate_tokens
+from llm_cache import LLMCache, make_cache_key
+from llm_backend import GeminiBackend
+from embedding_store import EmbeddingStore, make_embedding_key
+from cluster_state import ClusterState
+from clustering import fit_kmeans, cluster_auto, build_taxonomy
+from context_builder import CONTEXT_FIELDS, SIGNAL_FIELDS, build_context, score_columns
+from vector_index import CASE_METADATA_FIELDS, INDEX_PREFIX, case_record, export_index
+from case_store import CaseStore
+from failure_journal import classify_error
+import metrics
 
 # ==========================================
 # CONFIGURATION
@@ -16,13 +26,60 @@ INPUT_FILE = "extracted_failure_modes.jsonl"
 OUTPUT_DIR = "pedia_entries"
 
 EMBEDDING_MODEL = "text-embedding-004"
+EMBEDDING_TASK_TYPE = "CLUSTERING"
+EMBEDDING_DIM = 768
+# Embeddings persist here (.f32 matrix + .keys + .json) and are reused across runs
+EMBEDDING_STORE = "embedding_store"
+# Incremental mode: centroids, stable cluster ids and membership live here
+CLUSTER_STATE_DIR = "cluster_state"
+# Search index for the web app (binary matrix + JSON sidecar, see vector_index.py)
+VECTOR_INDEX_PREFIX = INDEX_PREFIX
+INDEX_TASK_TYPE = "RETRIEVAL_DOCUMENT"
+# Recorded in the index so the app and retrieval.py embed queries to match
+QUERY_TASK_TYPE = "RETRIEVAL_QUERY"
 GENERATION_MODEL = "gemini-2.5-flash-lite"
 NUM_CLUSTERS = 15
 MAX_CONCURRENT_REQUESTS = 5 
 MAX_RETRIES = 3              
+# Per-minute quotas, enforced by the shared rate limiter
+GENERATION_RPM = 4000
+GENERATION_TPM = 4_000_000
+EMBEDDING_RPM = 1500
+EMBEDDING_TPM = 1_000_000
+# Part of every response cache key; bump whenever the prompt template changes
+PEDIA_PROMPT_VERSION = "pedia-v2"
 # ==========================================
 
-client = genai.Client(api_key=GOOGLE_API_KEY)
+_backend = None
+
+def get_backend():
+    """The Gemini client, created on first use so another backend can be set first."""
+    global _backend
+    if _backend is None:
+        _backend = GeminiBackend(GOOGLE_API_KEY)
+    return _backend
+
+def set_backend(backend):
+    """Routes all embedding and generation calls through `backend` (e.g. a SimulatedBackend)."""
+    global _backend
+    _backend = backend
+
+generation_limiter = AdaptiveRateLimiter(GENERATION_RPM, GENERATION_TPM, MAX_CONCURRENT_REQUESTS, name="generate")
+embedding_limiter = AdaptiveRateLimiter(EMBEDDING_RPM, EMBEDDING_TPM, 10, name="embed")
+
+_response_cache = None
+
+def get_response_cache():
+    """The on-disk LLM response cache (shared with the extractor), opened on first use."""
+    global _response_cache
+    if _response_cache is None:
+        _response_cache = LLMCache()
+    return _response_cache
+
+def set_response_cache(cache):
+    """Uses `cache` (e.g. an LLMCache at another path) instead of the default one."""
+    global _response_cache
+    _response_cache = cache
 
 # ==========================================
 # HELPER: Numpy Safe JSON Encoder
@@ -44,123 +101,209 @@ class NumpyEncoder(json.JSONEncoder):
 # ==========================================
 # HELPER: Async Retry Logic
 # ==========================================
-async def retry_with_backoff(func, *args, **kwargs):
+async def retry_with_backoff(func, *args, limiter=None, tokens=0, **kwargs):
+    """
+    Retries transient errors with exponential backoff. With a limiter, the
+    call is also held to its RPM/TPM budgets and 429s are handled there
+    with jittered backoff and reduced concurrency; a 429 that still gets
+    out of limiter.call is final, not retried again here.
+    """
+    name = limiter.name if limiter is not None else "direct"
     for attempt in range(MAX_RETRIES):
         try:
+            if limiter is not None:
+                return await limiter.call(func, *args, tokens=tokens, **kwargs)
             return await func(*args, **kwargs)
         except Exception as e:
+            error_class = classify_error(e)
+            if limiter is not None and error_class == "rate_limit":
+                print(f"    [Error] Still rate-limited after {limiter.max_retries} attempts: {e}")
+                break
+            if attempt < MAX_RETRIES - 1:
+                metrics.registry.record_retry(name, error_class)
             wait_time = 2 ** attempt
             print(f"    [Warning] Error: {e}. Retrying in {wait_time}s...")
             await asyncio.sleep(wait_time)
-    print(f"    [Error] Failed after {MAX_RETRIES} attempts.")
+    else:
+        print(f"    [Error] Failed after {MAX_RETRIES} attempts.")
+    metrics.registry.record_failure(name, error_class)
     return None
 
 # ==========================================
 # CORE FUNCTIONS
 # ==========================================
 
-def load_data(filepath):
-    data = []
-    with open(filepath, 'r', encoding='utf-8') as f:
-        for line in f:
-            try:
-                data.append(json.loads(line))
-            except json.JSONDecodeError:
-                continue
-    return data
+def load_cases(filepath):
+    """
+    The columnar store of the cases in `filepath`, synced with it first.
+    Only lines appended since the last sync (normally none: the extractor
+    syncs after each commit) are decoded.
+    """
+    store = CaseStore.for_output(filepath)
+    added = store.sync()
+    print(f"Loaded {len(store)} cases ({added} new since the last sync) from {store.directory}")
+    return store
+
+def case_embedding_text(case):
+    """What a case is clustered by."""
+    return f"{case.get('trigger_event', '')} {case.get('fatal_mistake', '')}"
+
+def case_embedding_texts(store):
+    """case_embedding_text of every case in the store, read from its columns."""
+    triggers = store.texts("trigger_event", missing='')
+    mistakes = store.texts("fatal_mistake", missing='')
+    return [f"{trigger} {mistake}" for trigger, mistake in zip(triggers, mistakes)]
+
+async def generate_embeddings_async(text_list, task_type=None, progress=True, store=None):
+    """
+    Embeddings for text_list as a float32 (n, dim) array, for task_type
+    (EMBEDDING_TASK_TYPE unless given). Texts already in
+    the on-disk store are reused; only new ones go to the API, and each
+    finished batch is persisted straight away. When every text is stored
+    in order, the result is a zero-copy view of the memory-mapped matrix.
+    progress=False skips the console output, for callers embedding in
+    many small increments; they should also pass their own open `store`
+    (otherwise the one at EMBEDDING_STORE is opened and its keys read).
+    """
+    task_type = task_type or EMBEDDING_TASK_TYPE
+    if store is None:
+        store = EmbeddingStore(EMBEDDING_STORE)
+    keys = [make_embedding_key(EMBEDDING_MODEL, task_type, text) for text in text_list]
+    new = {}
+    for key, text in zip(keys, text_list):
+        if key not in store and key not in new:
+            new[key] = text
+    new_keys = list(new)
+    metrics.registry.record_cache("embedding_store", hits=len(text_list) - len(new_keys), misses=len(new_keys))
+    if progress:
+        print(f"Generating embeddings for {len(new_keys)} new items ({len(text_list) - len(new_keys)} reused from {store.matrix_file})...")
 
-async def generate_embeddings_async(text_list):
-    print(f"Generating embeddings for {len(text_list)} items...")
     batch_size = 100
-    batches = [text_list[i:i + batch_size] for i in range(0, len(text_list), batch_size)]
+    batches = [new_keys[i:i + batch_size] for i in range(0, len(new_keys), batch_size)]
     sem = asyncio.Semaphore(10)
 
-    async def process_batch(batch):
+    async def process_batch(batch_keys):
         async with sem:
+            batch = [new[key] for key in batch_keys]
             result = await retry_with_backoff(
-                client.aio.models.embed_content,
+                get_backend().embed,
+                batch,
+                limiter=embedding_limiter,
+                tokens=sum(estimate_tokens(text) for text in batch),
                 model=EMBEDDING_MODEL,
-                contents=batch,
-                config=types.EmbedContentConfig(task_type="CLUSTERING")
+                task_type=task_type
             )
+            # Failed batches aren't stored, so the next run asks again
             if result:
-                return [e.values for e in result.embeddings]
-            else:
-                return [[0.0]*768] * len(batch)
+                store.add(batch_keys, result)
 
     tasks = [process_batch(b) for b in batches]
-    results = await tqdm_asyncio.gather(*tasks, desc="Embedding Batches")
-    return np.array([item for sublist in results for item in sublist])
-
-def cluster_data(data, embeddings, n_clusters):
+    if progress:
+        await tqdm_asyncio.gather(*tasks, desc="Embedding Batches")
+    else:
+        await asyncio.gather(*tasks)
+
+    rows = store.lookup(keys)
+    if (rows >= 0).all():
+        return store.rows(rows)
+    found = rows >= 0
+    print(f"    [Warning] {int((~found).sum())} items have no embedding; using zero vectors for this run.")
+    embeddings = np.zeros((len(keys), store.dim or EMBEDDING_DIM), dtype=np.float32)
+    embeddings[found] = store.matrix()[rows[found]]
+    return embeddings
+
+def group_rows(labels):
+    """{label: row numbers}, labels as Python ints in order of first appearance."""
+    labels = np.asarray(labels)
+    if not len(labels):
+        return {}
+    order = np.argsort(labels, kind='stable')
+    values, starts = np.unique(labels[order], return_index=True)
+    groups = np.split(order, starts[1:])
+    firsts = [group[0] for group in groups]
+    return {int(values[i]): groups[i] for i in np.argsort(firsts, kind='stable')}
+
+def cluster_rows(embeddings, n_clusters, minibatch=False):
     """
-    Clusters data and sanitizes NumPy types to standard Python types.
+    Clusters the embeddings into {label: row numbers}.
+    With n_clusters=None the number of topics is chosen by silhouette;
+    otherwise the fit is exact k-means unless `minibatch`.
     """
-    print(f"Clustering into {n_clusters} topics...")
-    kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
-    labels = kmeans.fit_predict(embeddings)
-    
-    clusters = {}
-    for i, label in enumerate(labels):
-        # SAFETY FIX: Convert numpy int32 to python int
-        label = int(label)
-        if label not in clusters:
-            clusters[label] = []
-        clusters[label].append(data[i])
-        
-    return clusters
-
-async def generate_pedia_entry_async(cluster_id, cluster_items, semaphore):
+    if n_clusters is None:
+        print("Choosing the number of topics by silhouette...")
+        labels, centroids, scores = cluster_auto(embeddings)
+        print(f"Clustering into {len(centroids)} topics (silhouette {scores[len(centroids)]:.3f})...")
+    else:
+        print(f"Clustering into {n_clusters} topics...")
+        labels, _ = fit_kmeans(embeddings, n_clusters, minibatch=minibatch)
+    return group_rows(labels)
+
+def cluster_data(data, embeddings, n_clusters, minibatch=False):
+    """Clusters data into {label: items}; see cluster_rows."""
+    clusters = cluster_rows(embeddings, n_clusters, minibatch)
+    return {label: [data[row] for row in rows] for label, rows in clusters.items()}
+
+def case_key(case):
+    """Stable identity of a case across runs: its source URL, else a hash of its content."""
+    url = case.get('source_url')
+    if url:
+        return url
+    return hashlib.sha256(json.dumps(case, sort_keys=True).encode('utf-8')).hexdigest()
+
+def case_keys(store):
+    """case_key of every case: the URL column, and the full record only where it has no URL."""
+    urls = store.texts("source_url")
+    return [url if url else case_key(store.record(row)) for row, url in enumerate(urls)]
+
+def cluster_data_incremental(keys, embeddings, n_clusters, minibatch=False, state_dir=CLUSTER_STATE_DIR):
+    """
+    Assigns cases (by key) to the persisted clusters (refitting only past
+    the drift threshold) and returns ({stable cluster id: rows}, state).
+    """
+    state = ClusterState.load(state_dir)
+    rows_by_cluster = state.update(keys, embeddings, n_clusters, minibatch)
+    if state.refitted:
+        print(f"Refitted {len(state.cluster_ids)} clusters (stable ids kept where membership overlaps).")
+    else:
+        print(f"Assigned {len(keys)} cases to {len(state.cluster_ids)} existing clusters (drift {state.drift:+.1%}).")
+    clusters = {cid: np.asarray(rows, dtype=np.int64) for cid, rows in rows_by_cluster.items()}
+    return clusters, state
+
+# What each taxonomy level asks the editor to analyze
+ENTRY_SUBJECTS = {
+    "failure_mode": (
+        "You are analyzing a FAILURE MODE CLUSTER derived from real operator case studies.\n"
+        "Your job is to identify the *underlying mechanism* that causes this failure mode to repeat."
+    ),
+    "category": (
+        "You are analyzing a BROAD CATEGORY of related failure modes derived from real operator case studies.\n"
+        "Your job is to identify the *shared underlying mechanism* that makes the failures in this category repeat."
+    ),
+}
+
+async def generate_pedia_entry_async(cluster_id, cluster_items, semaphore, level="failure_mode", failure_modes=None,
+                                     embeddings=None, signal=None):
     """
     Generates a high-signal, mechanism-accurate Pedia entry for a cluster.
     Focuses on causality, operator failure modes, and repeatable patterns.
+    With level="category" the entry covers a broad taxonomy category, and
+    `failure_modes` (titles of its specific entries) is added to the context.
+    `embeddings` (the items' vectors, in order) let the context builder pick
+    central, diverse representatives; `signal` is their precomputed
+    field-completeness score.
     """
     async with semaphore:
 
         # --------------------------------------------------
-        # 1. SCORING + SIGNAL EXTRACTION
-        # --------------------------------------------------
-        def score_case(item):
-            score = 0
-            if item.get("financial_cost"): score += 4
-            if item.get("fatal_mistake"): score += 4
-            if item.get("escalation_timeline"): score += 3
-            if item.get("brutal_reality_quote"): score += 2
-            return score
-
-        ranked = sorted(cluster_items, key=score_case, reverse=True)
-
-        # Take top hard-signal cases, not arbitrary count
-        core_cases = ranked[:10]
-        supporting_cases = ranked[10:25]
-
-        def extract_field(items, field):
-            return [i.get(field) for i in items if i.get(field)]
-
-        triggers = extract_field(core_cases, "trigger_event")
-        mistakes = extract_field(core_cases, "fatal_mistake")
-        escalations = extract_field(core_cases, "escalation_timeline")
-        costs = extract_field(core_cases, "financial_cost")
-        quotes = extract_field(core_cases, "brutal_reality_quote")
-
-        # --------------------------------------------------
-        # 2. CONTEXT PACKET (FACT-ONLY)
+        # 1. CONTEXT PACKET (FACT-ONLY, TOKEN-BUDGETED)
         # --------------------------------------------------
-        context = {
-            "cluster_id": cluster_id,
-            "case_count": len(cluster_items),
-            "common_triggers": triggers[:7],
-            "common_fatal_mistakes": mistakes[:7],
-            "escalation_patterns": escalations[:7],
-            "financial_examples": costs[:5],
-            "operator_quotes": quotes[:5]
-        }
+        extra = {"failure_modes": failure_modes} if failure_modes else None
+        context = build_context(cluster_id, cluster_items, embeddings, extra, signal=signal)
 
         prompt = f"""
 You are the Editor-in-Chief of "Tenants & Landlords Pedia".
 
-You are analyzing a FAILURE MODE CLUSTER derived from real operator case studies.
-Your job is to identify the *underlying mechanism* that causes this failure mode to repeat.
+{ENTRY_SUBJECTS[level]}
 
 IMPORTANT RULES:
 - Do NOT invent facts.
@@ -192,23 +335,35 @@ OUTPUT MUST FOLLOW THIS EXACT JSON FORMAT:
 Respond ONLY with valid JSON.
 """
 
+        generation_config = {
+            "response_mime_type": "application/json",
+            "temperature": 0.15,
+            "top_p": 0.85
+        }
+        cache = get_response_cache()
+        cache_key = make_cache_key(GENERATION_MODEL, generation_config, PEDIA_PROMPT_VERSION, prompt)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cluster_id, json.loads(cached)
+
         response = await retry_with_backoff(
-            client.aio.models.generate_content,
+            get_backend().generate,
+            prompt,
+            limiter=generation_limiter,
+            tokens=estimate_tokens(prompt),
             model=GENERATION_MODEL,
-            contents=prompt,
-            config=types.GenerateContentConfig(
-                response_mime_type="application/json",
-                temperature=0.15,
-                top_p=0.85
-            )
+            config=generation_config
         )
 
         if response and response.text:
             try:
-                return cluster_id, json.loads(response.text)
+                entry = json.loads(response.text)
             except json.JSONDecodeError:
                 print(f"[Error] Cluster {cluster_id}: Invalid JSON returned.")
+                metrics.registry.record_failure("generate", "invalid_json")
                 return cluster_id, None
+            cache.put(cache_key, response.text)
+            return cluster_id, entry
 
         return cluster_id, None
 
@@ -217,29 +372,67 @@ Respond ONLY with valid JSON.
 # MAIN
 # ==========================================
 
-async def main():
-    if not os.path.exists(INPUT_FILE):
-        print(f"File {INPUT_FILE} not found!")
-        return
-    all_cases = load_data(INPUT_FILE)
-    
-    text_to_embed = [f"{c.get('trigger_event', '')} {c.get('fatal_mistake', '')}" for c in all_cases]
-    embeddings = await generate_embeddings_async(text_to_embed)
+def entry_index_text(entry):
+    """What an entry is searched by; matches scripts/generate-embeddings.ts."""
+    return f"""Title: {entry.get('title')}
+Summary: {entry.get('summary')}
+Trigger Event: {entry.get('the_trigger')}
+Fatal Mistake: {entry.get('the_fatal_mistake')}"""
 
-    # Use to_thread for CPU-bound clustering
-    clusters = await asyncio.to_thread(cluster_data, all_cases, embeddings, NUM_CLUSTERS)
+CASE_INDEX_FIELDS = ("trigger_event", "fatal_mistake", "financial_cost")
 
-    if not os.path.exists(OUTPUT_DIR):
-        os.makedirs(OUTPUT_DIR)
+def case_index_text(case):
+    return " ".join(str(case[field]) for field in CASE_INDEX_FIELDS if case.get(field))
 
-    print("Synthesizing Pedia Entries Concurrently...")
-    gen_semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
-    
-    tasks = []
-    for cluster_id, items in clusters.items():
-        task = generate_pedia_entry_async(cluster_id, items, gen_semaphore)
-        tasks.append(task)
+def case_index_texts(store):
+    """case_index_text of every case in the store, read from its columns."""
+    columns = [(store.texts(field), store.nonempty(field).tolist()) for field in CASE_INDEX_FIELDS]
+    return [
+        " ".join(str(values[row]) for values, filled in columns if filled[row])
+        for row in range(len(store))
+    ]
 
+async def export_vector_index(store, keys, entry_files, row_clusters=None, int8=False, output_dir=OUTPUT_DIR,
+                              prefix=VECTOR_INDEX_PREFIX, embedding_store=None):
+    """
+    Embeds the entry files named in `entry_files` (in output_dir) and every
+    case for retrieval and writes the binary index at `prefix`. Other files
+    in output_dir, left by earlier runs, are not exported. Embeddings come
+    from the persistent store, so only new or edited texts are sent to the
+    API. `keys` are the cases' case_keys; `row_clusters` (one cluster id
+    per case, -1 for none) is recorded in each case's metadata.
+    """
+    records = []
+    texts = []
+    for filename in entry_files:
+        with open(os.path.join(output_dir, filename), 'r', encoding='utf-8') as f:
+            entry = json.load(f)
+        text = entry_index_text(entry)
+        records.append({"id": filename, "kind": "entry", "content": text, "metadata": entry})
+        texts.append(text)
+    clusters = row_clusters.tolist() if row_clusters is not None else [-1] * len(store)
+    for row, text in enumerate(case_index_texts(store)):
+        if not text:
+            continue
+        cluster_id = clusters[row] if clusters[row] >= 0 else None
+        records.append(case_record(keys[row], store.case(row, CASE_METADATA_FIELDS), cluster_id))
+        texts.append(text)
+
+    print(f"Exporting search index: {len(entry_files)} entries, {len(records) - len(entry_files)} cases...")
+    vectors = await generate_embeddings_async(texts, task_type=INDEX_TASK_TYPE, store=embedding_store)
+    meta = export_index(vectors, records, prefix, int8=int8,
+                        embedding_model=EMBEDDING_MODEL, task_type=INDEX_TASK_TYPE,
+                        query_task_type=QUERY_TASK_TYPE)
+    sizes = ", ".join(f"{spec['path']} {spec['bytes'] / 2 ** 20:.1f} MB" for spec in meta["files"].values())
+    print(f"Wrote {prefix}.json ({meta['count']} x {meta['dim']}): {sizes}")
+
+async def write_entries(tasks, prefix, annotate=None, output_dir=OUTPUT_DIR):
+    """
+    Awaits entry tasks as they finish and writes each to
+    output_dir/<prefix>_<id>.json. `annotate(id)` may return extra fields
+    to store alongside the generated ones. Returns ({id: entry}, failed ids).
+    """
+    written = {}
     failed_clusters = []
     
     for finished_task in tqdm_asyncio.as_completed(tasks, desc="Generating Entries"):
@@ -247,19 +440,158 @@ async def main():
             cluster_id, entry = await finished_task
             
             if entry:
-                filename = f"{OUTPUT_DIR}/entry_{cluster_id}.json"
+                if annotate is not None:
+                    entry.update(annotate(cluster_id))
+                filename = f"{output_dir}/{prefix}_{cluster_id}.json"
                 # Safe writing using standard open (fast enough for small JSONs)
                 with open(filename, 'w', encoding='utf-8') as f:
                     # Use NumpyEncoder here just in case any other numpy types slipped through
                     json.dump(entry, f, indent=4, cls=NumpyEncoder)
+                written[cluster_id] = entry
             else:
                 failed_clusters.append(cluster_id)
         except Exception as e:
             print(f"Error saving task: {e}")
+    return written, failed_clusters
+
+async def main(incremental=False, auto_k=False, taxonomy=False, index=True, int8=False, minibatch=False,
+               input_file=INPUT_FILE, workdir="."):
+    """
+    Synthesizes entries from the cases in input_file. OUTPUT_DIR,
+    EMBEDDING_STORE, CLUSTER_STATE_DIR and the search index live under
+    workdir.
+    """
+    output_dir = os.path.join(workdir, OUTPUT_DIR)
+    state_dir = os.path.join(workdir, CLUSTER_STATE_DIR)
+    index_prefix = os.path.join(workdir, VECTOR_INDEX_PREFIX)
+    if not os.path.exists(input_file):
+        print(f"File {input_file} not found!")
+        return
+    with metrics.registry.stage("synthesize_load", bytes=os.path.getsize(input_file)) as timer:
+        store = load_cases(input_file)
+        keys = case_keys(store)
+        # Field completeness of every case, scored once from the columns
+        signal = score_columns({field: store.nonempty(field) for field in SIGNAL_FIELDS})
+        timer.items = len(store)
+    
+    with metrics.registry.stage("synthesize_embed", items=len(store)):
+        embedding_store = EmbeddingStore(os.path.join(workdir, EMBEDDING_STORE))
+        embeddings = await generate_embeddings_async(case_embedding_texts(store), store=embedding_store)
+
+    # Use to_thread for CPU-bound clustering
+    n_clusters = None if auto_k else NUM_CLUSTERS
+    state = None
+    tree = None
+    started = time.perf_counter()
+    if taxonomy:
+        print("Building a two-level taxonomy (categories -> failure modes)...")
+        tree = await asyncio.to_thread(build_taxonomy, embeddings)
+        clusters = group_rows(tree.mode_labels)
+        print(f"{len(tree.categories())} categories, {len(clusters)} failure modes.")
+        to_synthesize = list(clusters)
+    elif incremental:
+        clusters, state = await asyncio.to_thread(cluster_data_incremental, keys, embeddings, n_clusters,
+                                                  minibatch, state_dir)
+        to_synthesize = state.changed_clusters()
+    else:
+        clusters = await asyncio.to_thread(cluster_rows, embeddings, n_clusters, minibatch)
+        to_synthesize = list(clusters)
+    metrics.registry.record_stage("synthesize_cluster", len(store), time.perf_counter() - started)
+
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    if state is not None:
+        for cluster_id in state.retired_clusters():
+            filename = f"{output_dir}/entry_{cluster_id}.json"
+            if os.path.exists(filename):
+                os.remove(filename)
+            state.forget(cluster_id)
+            print(f"Removed entry {cluster_id}: its cluster no longer exists.")
+        print(f"{len(to_synthesize)} of {len(clusters)} clusters changed enough to re-synthesize.")
+
+    print("Synthesizing Pedia Entries Concurrently...")
+    started = time.perf_counter()
+    gen_semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    
+    # Clusters are row numbers into the store: cases are read only as the context builder samples them
+    tasks = []
+    for cluster_id in to_synthesize:
+        rows = clusters[cluster_id]
+        task = generate_pedia_entry_async(cluster_id, store.view(rows, CONTEXT_FIELDS), gen_semaphore,
+                                          embeddings=embeddings[rows], signal=signal[rows])
+        tasks.append(task)
+
+    annotate = (lambda mode: {"category_id": tree.mode_parent[mode]}) if tree is not None else None
+    written, failed_clusters = await write_entries(tasks, "entry", annotate, output_dir)
+    written_count = len(written)
+
+    if state is not None:
+        for cluster_id in written:
+            state.mark_synthesized(cluster_id)
+        # Clusters that failed keep their old membership snapshot, so they're retried next run
+        state.save()
+
+    if tree is not None:
+        # Categories go second so their context can name the failure modes beneath them
+        print("Synthesizing Category Entries...")
+        tasks = []
+        for category in tree.categories():
+            rows = np.flatnonzero(tree.category_labels == category)
+            titles = [written[mode].get("title") for mode in tree.modes_of(category) if mode in written]
+            tasks.append(generate_pedia_entry_async(
+                category, store.view(rows, CONTEXT_FIELDS), gen_semaphore,
+                level="category", failure_modes=[title for title in titles if title],
+                embeddings=embeddings[rows], signal=signal[rows]
+            ))
+        written_categories, failed_categories = await write_entries(
+            tasks, "category", lambda category: {"failure_mode_ids": tree.modes_of(category)}, output_dir
+        )
+        failed_clusters += [f"category {category}" for category in failed_categories]
+        written_count += len(tree.categories()) - len(failed_categories)
+    metrics.registry.record_stage("synthesize_generate", written_count, time.perf_counter() - started)
+
+    if index:
+        with metrics.registry.stage("synthesize_index", items=len(store)):
+            row_clusters = np.full(len(store), -1, dtype=np.int64)
+            for cluster_id, rows in clusters.items():
+                row_clusters[rows] = cluster_id
+            # Only this run's entries: files of clusters (or categories) that no
+            # longer exist stay on disk after a full run
+            entry_files = [f"entry_{cluster_id}.json" for cluster_id in written]
+            if state is not None:
+                # Unchanged clusters keep the entry an earlier run wrote
+                entry_files += [f"entry_{cluster_id}.json" for cluster_id in clusters if cluster_id not in written
+                                and os.path.exists(f"{output_dir}/entry_{cluster_id}.json")]
+            if tree is not None:
+                entry_files += [f"category_{category}.json" for category in written_categories]
+            await export_vector_index(store, keys, sorted(entry_files), row_clusters, int8, output_dir,
+                                      index_prefix, embedding_store)
 
     print(f"\nSynthesis Complete.")
+    print(f"Embedding API usage: {embedding_limiter.summary()}")
+    print(f"Generation API usage: {generation_limiter.summary()}")
+    print(f"Response cache: {get_response_cache().summary()}")
     if failed_clusters:
         print(f"Failed clusters: {failed_clusters}")
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Cluster extracted cases and synthesize Pedia entries.")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--incremental", action="store_true",
+                      help="Reuse persisted clusters and only re-synthesize clusters whose membership changed")
+    mode.add_argument("--taxonomy", action="store_true",
+                      help="Build categories -> failure modes and write entries for both levels")
+    parser.add_argument("--auto-k", action="store_true",
+                        help=f"Choose the number of clusters by silhouette instead of NUM_CLUSTERS ({NUM_CLUSTERS})")
+    parser.add_argument("--minibatch", action="store_true",
+                        help="Fit fixed-K clusters with mini-batch k-means (much faster on large corpora, "
+                             "but memberships differ from the default exact fit)")
+    parser.add_argument("--no-index", action="store_true",
+                        help=f"Skip exporting the search index ({VECTOR_INDEX_PREFIX}.*)")
+    parser.add_argument("--int8", action="store_true",
+                        help="Also write an int8-quantized copy of the search index")
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    with metrics.session("synthesizer", args.metrics_file, args.profile):
+        asyncio.run(main(args.incremental, args.auto_k, args.taxonomy, not args.no_index, args.int8, args.minibatch))
@@ -0,0 +1,69 @@
+import asyncio
+import json
+
+from failure_journal import RETRY_POLICIES, classify_error
+from llm_backend import SafetyBlockError, SimulatedError, check_blocked
+
+
+class StatusError(Exception):
+    """Stands in for a google.genai APIError: an HTTP code plus the RPC status name."""
+
+    def __init__(self, code, status, message):
+        super().__init__(message)
+        self.code = code
+        self.status = status
+
+
+class Feedback:
+    def __init__(self, block_reason):
+        self.block_reason = block_reason
+
+
+class Candidate:
+    def __init__(self, finish_reason):
+        self.finish_reason = finish_reason
+
+
+class Response:
+    def __init__(self, block_reason=None, finish_reason=None):
+        self.prompt_feedback = Feedback(block_reason)
+        self.candidates = [Candidate(finish_reason)]
+
+
+def test_message_mentioning_blocked_stays_retryable():
+    for exc in (RuntimeError("proxy: connection blocked"),
+                ValueError("post https://reddit.com/r/Landlord/blocked_drain failed"),
+                Exception("SAFETY inspection overdue")):
+        error_class = classify_error(exc)
+        assert error_class == "other"
+        assert RETRY_POLICIES[error_class]["max_attempts"] > 1
+
+
+def test_message_text_does_not_pick_the_class():
+    assert classify_error(RuntimeError("upstream said 504")) == "other"
+    assert classify_error(RuntimeError("INTERNAL UNAVAILABLE")) == "other"
+    assert classify_error(SimulatedError(429, "gateway 504, blocked")) == "rate_limit"
+
+
+def test_safety_block_from_response():
+    for response in (Response(block_reason="SAFETY"), Response(finish_reason="PROHIBITED_CONTENT")):
+        try:
+            check_blocked(response)
+        except SafetyBlockError as exc:
+            assert classify_error(exc) == "safety_block"
+        else:
+            raise AssertionError("blocked response was not reported")
+
+
+def test_unblocked_response_passes():
+    for response in (Response(), Response("BLOCKED_REASON_UNSPECIFIED", "STOP"), Response(0, "MAX_TOKENS")):
+        assert check_blocked(response) is response
+
+
+def test_status_and_type():
+    assert classify_error(StatusError(504, "DEADLINE_EXCEEDED", "deadline")) == "timeout"
+    assert classify_error(StatusError(503, "UNAVAILABLE", "try later")) == "server_error"
+    assert classify_error(SimulatedError(500, "oops")) == "server_error"
+    assert classify_error(asyncio.TimeoutError()) == "timeout"
+    assert classify_error(json.JSONDecodeError("bad", "x", 0)) == "invalid_json"
+    assert classify_error(StatusError(400, "INVALID_ARGUMENT", "blocked")) == "other"
@@ -0,0 +1,116 @@
+import json
+import os
+import numpy as np
+
+# ==========================================
+# BINARY VECTOR INDEX (read by lib/vector-store.ts)
+# ==========================================
+# Files sharing a path prefix:
+#   <prefix>.f32        row-major float32 (count, dim), rows L2-normalized,
+#                       so cosine similarity is a plain dot product
+#   <prefix>.i8         optional int8 codes of the same rows...
+#   <prefix>.scale.f32  ...with one float32 scale per row (value = code * scale)
+#   <prefix>.json       sidecar: dim, count, files, and per row its id, kind
+#                       ("entry" or "case") and display metadata
+# The sidecar is written last, so a reader that finds it also finds the
+# matrices it describes; its byte counts let a reader detect a mismatch.
+INDEX_PREFIX = os.path.join("data", "vector_index")
+FORMAT_VERSION = 1
+# Case rows carry only these fields, to keep the sidecar small
+CASE_METADATA_FIELDS = (
+    "source_url", "subreddit", "original_score", "tags", "trigger_event", "fatal_mistake", "financial_cost"
+)
+
+
+def normalize_rows(vectors):
+    """float32 copy with every row scaled to unit length; all-zero rows stay zero."""
+    vectors = np.array(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.divide(vectors, norms, out=vectors, where=norms > 0)
+    return vectors
+
+
+def quantize_int8(vectors):
+    """Symmetric per-row int8 quantization. Returns (codes, float32 scales)."""
+    peaks = np.abs(vectors).max(axis=1) if len(vectors) else np.zeros(0, dtype=np.float32)
+    scales = (peaks / 127.0).astype(np.float32)
+    safe = np.where(scales > 0, scales, 1.0).astype(np.float32)
+    codes = np.clip(np.rint(vectors / safe[:, None]), -127, 127).astype(np.int8)
+    return codes, scales
+
+
+def _write_atomic(path, data):
+    with open(path + ".tmp", 'wb') as f:
+        f.write(data)
+    os.replace(path + ".tmp", path)
+
+
+def export_index(vectors, records, prefix=INDEX_PREFIX, int8=False, embedding_model=None, task_type=None,
+                 query_task_type=None):
+    """
+    Writes the index for `vectors` (one row per record, any float dtype).
+    Each record is {"id", "kind", "metadata"} plus optional "content".
+    `query_task_type` is what searchers should embed their queries with.
+    Returns the sidecar dict.
+    """
+    if len(vectors) != len(records):
+        raise ValueError(f"{len(records)} records for {len(vectors)} vectors")
+    unit = normalize_rows(vectors)
+    count, dim = unit.shape
+    directory = os.path.dirname(prefix)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    files = {"f32": {"path": os.path.basename(prefix) + ".f32", "bytes": unit.nbytes}}
+    _write_atomic(prefix + ".f32", unit.tobytes())
+    if int8:
+        codes, scales = quantize_int8(unit)
+        files["i8"] = {"path": os.path.basename(prefix) + ".i8", "bytes": codes.nbytes}
+        files["scale"] = {"path": os.path.basename(prefix) + ".scale.f32", "bytes": scales.nbytes}
+        _write_atomic(prefix + ".i8", codes.tobytes())
+        _write_atomic(prefix + ".scale.f32", scales.tobytes())
+    else:
+        # A stale quantized copy would no longer match the sidecar
+        for suffix in (".i8", ".scale.f32"):
+            if os.path.exists(prefix + suffix):
+                os.remove(prefix + suffix)
+
+    meta = {
+        "version": FORMAT_VERSION,
+        "dim": dim,
+        "count": count,
+        "normalized": True,
+        "embedding_model": embedding_model,
+        "task_type": task_type,
+        "query_task_type": query_task_type,
+        "files": files,
+        "records": records,
+    }
+    _write_atomic(prefix + ".json", json.dumps(meta, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+    return meta
+
+
+def load_index(prefix=INDEX_PREFIX, int8=False):
+    """
+    (matrix, sidecar) for an exported index. The matrix is the memory-mapped
+    unit-row float32 file, or with int8=True the dequantized int8 copy.
+    """
+    with open(prefix + ".json", 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    shape = (meta["count"], meta["dim"])
+    if int8:
+        if "i8" not in meta["files"]:
+            raise ValueError(f"{prefix} was exported without an int8 copy")
+        codes = np.memmap(prefix + ".i8", dtype=np.int8, mode='r', shape=shape)
+        scales = np.fromfile(prefix + ".scale.f32", dtype=np.float32, count=meta["count"])
+        return codes.astype(np.float32) * scales[:, None], meta
+    if meta["count"] == 0:
+        return np.empty(shape, dtype=np.float32), meta
+    return np.memmap(prefix + ".f32", dtype=np.float32, mode='r', shape=shape), meta
+
+
+def case_record(case_id, case, cluster_id=None):
+    metadata = {field: case[field] for field in CASE_METADATA_FIELDS if case.get(field) not in (None, "", [])}
+    if cluster_id is not None:
+        metadata["cluster_id"] = cluster_id
+    return {"id": case_id, "kind": "case", "metadata": metadata}